@@ -1,15 +1,22 @@
-import sqlite3
-from urllib.parse import urlparse
-import database  # <-- ¡NUEVA IMPORTACIÓN!
+"""
+Alta de productos desde la consola.
 
+    python add_product.py                                  # interactivo, una URL
+    python add_product.py --archivo urls.txt [--objetivo 2500] [--procesar]
+    cat urls.txt | python add_product.py --archivo -       # en bloque desde stdin
 
-def detect_store(url):
-    domain = urlparse(url).netloc.lower()
-    if 'mercadolibre' in domain: return 'MercadoLibre'
-    if 'lacuracao' in domain: return 'LaCuracao'
-    if 'falabella' in domain: return 'Falabella'
-    if 'ripley' in domain: return 'Ripley'
-    return None
+En bloque, las URLs pueden venir una por línea o mezcladas con texto. El primer scraping
+de las nuevas queda encolado: lo hace el tracker o, con --procesar, este mismo proceso.
+"""
+import sys
+import time
+import asyncio
+import sqlite3
+import argparse
+import database  # <-- ¡NUEVA IMPORTACIÓN!
+import job_queue
+import product_import
+import stores
 
 
 def add_new_product():
@@ -22,7 +29,8 @@ def add_new_product():
         print("Error: La URL no puede estar vacía.")
         return
 
-    tienda = detect_store(url)
+    identity = stores.canonicalize(url)
+    tienda = identity.tienda
     if not tienda:
         print(f"No se pudo detectar la tienda para: {url}")
         tienda = input("Por favor, ingresa el nombre de la tienda (ej. MercadoLibre): ").strip()
@@ -45,9 +53,16 @@ def add_new_product():
     cursor = conn.cursor()
 
     try:
+        if identity.tienda:
+            # Mismo ítem con otra URL (tracking, host móvil, otro slug...): no se duplica
+            existing = product_import.find_existing(conn, [identity])
+            if existing:
+                print(f"\nEste producto ya está registrado (ID: {existing[identity.key]}).")
+                return
+            url = identity.url
         cursor.execute(
-            "INSERT INTO Productos (url, nombre, tienda, precio_inicial, precio_objetivo) VALUES (?, ?, ?, ?, ?)",
-            (url, None, tienda, None, precio_objetivo)
+            "INSERT INTO Productos (url, nombre, tienda, item_id, precio_inicial, precio_objetivo) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, None, tienda, identity.item_id, None, precio_objetivo)
         )
         conn.commit()
         print(f"\n¡Éxito! Producto añadido.")
@@ -61,5 +76,65 @@ def add_new_product():
         conn.close()
 
 
+def _print_progress(grupo):
+    with database.db_pool.get_conn() as conn:
+        progress = job_queue.group_progress(conn, grupo)
+    for tienda, p in sorted(progress.items()):
+        print(f"  {tienda}: {p['hecho']} ok, {p['fallido']} fallidos, "
+              f"{p['pendiente'] + p['en_curso']} pendientes de {p['total']}")
+
+
+def import_file(path, precio_objetivo=None, process=False):
+    """Importa las URLs de un archivo ('-' = stdin) y, con process=True, hace su primer scraping."""
+    database.setup_database()
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    urls = product_import.extract_urls(text)
+    if not urls:
+        print("No se encontraron URLs.")
+        return
+
+    grupo = int(time.time() * 1000)
+    with database.db_pool.get_conn() as conn:
+        result = product_import.import_urls(conn, urls, grupo, precio_objetivo)
+
+    print(f"---[ Importación #{grupo}: {len(urls)} URLs ]---")
+    print(f"Nuevos: {len(result.added)} {dict(result.added_by_store())}")
+    print(f"Ya registrados: {len(result.existing)} | Repetidos en el archivo: {result.repeated}")
+    for url in result.unknown:
+        print(f"Tienda no reconocida: {url}")
+    if not result.added:
+        return
+
+    with database.db_pool.get_conn() as conn:
+        worker_running = job_queue.worker_alive(conn)
+    if not process:
+        print("El primer scraping quedó encolado." + ("" if worker_running else
+              " No hay un tracker activo: se hará al iniciarlo (o usa --procesar)."))
+        return
+
+    # Este proceso consume la cola (junto al tracker, si está corriendo) hasta que no quedan trabajos de esta importación
+    worker = job_queue.JobWorker()
+    asyncio.run(worker.run(on_batch=lambda _: _print_progress(grupo), grupo=grupo))
+    print("Primer scraping terminado:")
+    _print_progress(grupo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Añade productos al tracker.")
+    parser.add_argument("--archivo", help="archivo con URLs para importar en bloque ('-' = stdin)")
+    parser.add_argument("--objetivo", type=float, help="precio objetivo para todos los productos importados")
+    parser.add_argument("--procesar", action="store_true",
+                        help="hacer el primer scraping de los importados en este proceso")
+    args = parser.parse_args()
+    if args.archivo:
+        import_file(args.archivo, args.objetivo, args.procesar)
+    else:
+        add_new_product()
+
+
 if __name__ == "__main__":
-    add_new_product()
\ No newline at end of file
+    main()
\ No newline at end of file
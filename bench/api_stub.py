@@ -0,0 +1,115 @@
+"""
+Stub local de la API de ítems de MercadoLibre: reproduce las respuestas grabadas en
+bench/fixtures/mercadolibre_items.json sin salir a la red.
+
+    with ItemsApiStub() as stub:      # apunta mercadolibre_api.API_BASE_URL al stub
+        ...                           # el motor consulta http://127.0.0.1:<puerto>/items
+        stub.calls                    # llamadas multi-get recibidas
+
+Imita lo que usa el motor: GET /items?ids=A,B,...&attributes=... responde una lista
+[{code, body}] en el orden de los IDs (404 para los que no están grabados) y rechaza
+más de MULTIGET_MAX IDs con 400, como la API real. Con cycle=True cualquier ID numérico
+se responde con una de las grabaciones (para medir con cientos de ítems distintos).
+
+También se puede levantar a mano: python bench/api_stub.py [--port 8765]
+y correr el tracker con ML_API_URL=http://127.0.0.1:8765.
+"""
+import json
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import harness
+from scrapers import mercadolibre_api  # noqa: E402
+
+RECORDED_ITEMS = harness.FIXTURES_DIR / "mercadolibre_items.json"
+
+
+def load_recorded_items():
+    return json.loads(RECORDED_ITEMS.read_text(encoding="utf-8"))
+
+
+def _not_found(item_id):
+    return {"code": 404, "body": {"error": "not_found", "message": f"Item with id {item_id} not found",
+                                  "status": 404, "cause": []}}
+
+
+class ItemsApiStub:
+    """Servidor HTTP en un hilo que responde /items con las grabaciones."""
+
+    def __init__(self, items=None, cycle=False, port=0):
+        self.items = load_recorded_items() if items is None else items
+        self.cycle = cycle
+        self.port = port
+        self.calls = 0
+        self.url = None
+        self._server = None
+        self._saved_url = None
+        self._records = list(self.items.values())
+
+    def lookup(self, item_id, attributes=None):
+        body = self.items.get(item_id)
+        if body is None and self.cycle and item_id[3:].isdigit():
+            body = dict(self._records[int(item_id[3:]) % len(self._records)], id=item_id)
+        if body is None:
+            return _not_found(item_id)
+        if attributes:
+            body = {k: v for k, v in body.items() if k in attributes}
+        return {"code": 200, "body": body}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlparse(self.path)
+                query = parse_qs(parts.query)
+                if parts.path.rstrip("/") != "/items" or "ids" not in query:
+                    return self._send(404, {"message": "resource not found", "status": 404})
+                ids = [i for i in query["ids"][0].split(",") if i]
+                if len(ids) > mercadolibre_api.MULTIGET_MAX:
+                    return self._send(400, {"message": f"Max {mercadolibre_api.MULTIGET_MAX} ids", "status": 400})
+                attributes = set(query["attributes"][0].split(",")) if "attributes" in query else None
+                stub.calls += 1
+                self._send(200, [stub.lookup(i, attributes) for i in ids])
+
+            def _send(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, name="items-api-stub", daemon=True).start()
+        self._saved_url = mercadolibre_api.API_BASE_URL
+        mercadolibre_api.API_BASE_URL = self.url
+        return self
+
+    def __exit__(self, *exc):
+        mercadolibre_api.API_BASE_URL = self._saved_url
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de la API de ítems de MercadoLibre.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cycle", action="store_true", help="responder cualquier ID con una grabación")
+    args = parser.parse_args()
+    with ItemsApiStub(cycle=args.cycle, port=args.port) as stub:
+        print(f"Stub de la API de ítems en {stub.url}/items (Ctrl+C para salir)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
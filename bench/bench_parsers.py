@@ -0,0 +1,100 @@
+"""
+Benchmark del parseo de páginas de producto guardadas: árbol completo (html.parser,
+el comportamiento anterior) contra el parseo dirigido de scrapers/parsing.py.
+
+Uso:
+    python bench/bench_parsers.py [pagina.html ...] [--repeat N] [--json salida.json]
+
+El scraper se elige por el prefijo del archivo (mercadolibre_*.html, lacuracao_*.html).
+Sin argumentos usa bench/fixtures/*.html.
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+from contextlib import redirect_stdout
+
+BENCH_DIR = Path(__file__).parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from scrapers import parsing, mercadolibre_scraper, lacuracao_scraper  # noqa: E402
+
+SCRAPERS = {
+    "mercadolibre": mercadolibre_scraper,
+    "lacuracao": lacuracao_scraper,
+}
+
+
+def scraper_for(path):
+    prefix = path.name.split("_")[0].lower()
+    return SCRAPERS.get(prefix)
+
+
+def time_parse(scraper, html, repeat, full_tree):
+    """Devuelve (resultado, [segundos por corrida])."""
+    original = parsing.parse_targeted
+    if full_tree:
+        parsing.parse_targeted = lambda markup, strainer: parsing.parse_full(markup)
+    try:
+        timings = []
+        result = None
+        for _ in range(repeat):
+            with redirect_stdout(io.StringIO()):  # Los scrapers imprimen su progreso
+                t0 = time.perf_counter()
+                result = scraper.parse_html(html)
+                timings.append(time.perf_counter() - t0)
+        return result, timings
+    finally:
+        parsing.parse_targeted = original
+
+
+def bench_file(path, repeat):
+    scraper = scraper_for(path)
+    if scraper is None:
+        return None
+    html = path.read_text(encoding="utf-8")
+    full_result, full_t = time_parse(scraper, html, repeat, full_tree=True)
+    fast_result, fast_t = time_parse(scraper, html, repeat, full_tree=False)
+    full_ms = statistics.median(full_t) * 1000
+    fast_ms = statistics.median(fast_t) * 1000
+    return {
+        "page": path.name,
+        "kb": round(len(html.encode("utf-8")) / 1024, 1),
+        "full_ms": round(full_ms, 3),
+        "targeted_ms": round(fast_ms, 3),
+        "speedup": round(full_ms / fast_ms, 2) if fast_ms else None,
+        "same_result": list(full_result) == list(fast_result),
+        "result": list(fast_result),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", type=Path, help="Escribe los resultados en este archivo")
+    args = parser.parse_args(argv)
+
+    pages = args.pages or sorted((BENCH_DIR / "fixtures").glob("*.html"))
+    if not pages:
+        print("No hay páginas para medir (pasa rutas o agrega bench/fixtures/*.html).")
+        return 1
+
+    rows = [r for r in (bench_file(p, args.repeat) for p in pages) if r]
+    print(f"Parser dirigido: {parsing.PARSER}  (repeticiones: {args.repeat}, mediana)")
+    print(f"{'página':<40} {'KB':>7} {'completo ms':>12} {'dirigido ms':>12} {'x':>6}  igual")
+    for r in rows:
+        print(f"{r['page']:<40} {r['kb']:>7} {r['full_ms']:>12} {r['targeted_ms']:>12} {r['speedup']:>6}  "
+              f"{'sí' if r['same_result'] else 'NO'}")
+
+    if args.json:
+        args.json.write_text(json.dumps({"parser": parsing.PARSER, "pages": rows}, indent=2, ensure_ascii=False),
+                             encoding="utf-8")
+    return 0 if all(r["same_result"] for r in rows) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Utilidades compartidas por los benchmarks offline: fixtures HTML grabadas, un driver
+falso que sirve page_source sin navegador y BDs SQLite desechables (en memoria, o en un
+archivo temporal con fsync real para medir escrituras).
+"""
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+import itertools
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import soupsieve as sv  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+from selenium.webdriver.common.by import By  # noqa: E402
+from selenium.common.exceptions import NoSuchElementException  # noqa: E402
+
+import database  # noqa: E402
+
+STORE_BY_PREFIX = {"mercadolibre": "MercadoLibre", "lacuracao": "LaCuracao"}
+
+_db_counter = itertools.count(1)
+
+
+def load_fixtures():
+    """Devuelve {nombre_archivo: html} de bench/fixtures/*.html."""
+    return {p.name: p.read_text(encoding="utf-8") for p in sorted(FIXTURES_DIR.glob("*.html"))}
+
+
+def load_expected():
+    """Resultado (titulo, precio, status) esperado por fixture."""
+    path = FIXTURES_DIR / "expected.json"
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def store_for(fixture_name):
+    return STORE_BY_PREFIX.get(fixture_name.split("_")[0].lower())
+
+
+def fixture_url(fixture_name):
+    return f"https://bench.local/{fixture_name}"
+
+
+class FakeDriver:
+    """
+    Sustituto mínimo de un WebDriver: get(url) carga la fixture correspondiente en
+    page_source y find_element responde a los WebDriverWait de los scrapers.
+    La presencia de cada selector se calcula una vez y se cachea, para que el costo
+    medido sea el del scraper y no el del driver falso.
+    """
+
+    def __init__(self, pages_by_url):
+        self.pages_by_url = pages_by_url
+        self.current_url = "about:blank"
+        self.page_source = ""
+        self.profile_name = "default"
+        self._presence = {}
+
+    def get(self, url):
+        self.current_url = url
+        self.page_source = self.pages_by_url[url]
+
+    def find_element(self, by=By.ID, value=None):
+        key = (self.current_url, by, value)
+        if key not in self._presence:
+            if by == By.CLASS_NAME:
+                css = f".{value}"
+            elif by == By.ID:
+                css = f"#{value}"
+            else:
+                css = value
+            soup = BeautifulSoup(self.page_source, "html.parser")
+            self._presence[key] = sv.select_one(css, soup) is not None
+        if not self._presence[key]:
+            raise NoSuchElementException(f"{by}={value}")
+        return object()
+
+    def execute_script(self, script, *args):
+        return [len(self.page_source.encode("utf-8")), 0]
+
+    def quit(self):
+        pass
+
+
+class FakeLease:
+    """Imita driver_pool.DriverLease con un FakeDriver fijo."""
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __call__(self):
+        return self.driver
+
+    def invalidate(self):
+        pass
+
+    def release(self):
+        pass
+
+
+class MemoryDatabase:
+    """
+    BD SQLite en memoria compartida entre hilos ('file:...?mode=memory&cache=shared').
+    Reemplaza database.DB_PATH y database.db_pool mientras está activa.
+    """
+
+    def __init__(self):
+        self.uri = f"file:bench_{next(_db_counter)}?mode=memory&cache=shared"
+        self._anchor = None
+        self._saved = None
+
+    def __enter__(self):
+        self._saved = (database.DB_PATH, database.db_pool)
+        # La BD en memoria vive mientras haya al menos una conexión abierta
+        self._anchor = sqlite3.connect(self.uri, uri=True)
+        database.DB_PATH = self.uri
+        database.db_pool = database.SQLiteConnectionPool(self.uri)
+        database.setup_database()
+        return self
+
+    def __exit__(self, *exc):
+        database.db_pool.close_all()
+        database.DB_PATH, database.db_pool = self._saved
+        self._anchor.close()
+
+    def add_products(self, rows):
+        """rows: [(url, tienda)]. Devuelve [(id, url, tienda)]."""
+        with database.db_pool.get_conn() as conn:
+            conn.executemany("INSERT INTO Productos (url, tienda) VALUES (?, ?)", rows)
+            conn.commit()
+            return conn.execute("SELECT id, url, tienda FROM Productos ORDER BY id").fetchall()
+
+    def count(self, table):
+        with database.db_pool.get_conn() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class _SynchronousPool(database.SQLiteConnectionPool):
+    """Pool del proyecto con un nivel de PRAGMA synchronous fijo en cada conexión."""
+
+    def __init__(self, db_path, synchronous):
+        super().__init__(db_path)
+        self.synchronous = synchronous
+
+    def _connect(self):
+        conn = super()._connect()
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        return conn
+
+
+class FileDatabase(MemoryDatabase):
+    """
+    BD en un archivo temporal (WAL, como precios.db) con synchronous FULL o NORMAL: cada
+    COMMIT paga su fsync, así el costo por transacción es el real. Se borra al salir.
+    """
+
+    def __init__(self, synchronous="FULL"):
+        super().__init__()
+        self.synchronous = synchronous
+        self._dir = None
+
+    def __enter__(self):
+        self._saved = (database.DB_PATH, database.db_pool)
+        self._dir = tempfile.mkdtemp(prefix="bench_db_")
+        path = str(Path(self._dir) / "bench.db")
+        database.DB_PATH = path
+        database.db_pool = _SynchronousPool(path, self.synchronous)
+        database.setup_database()
+        return self
+
+    def __exit__(self, *exc):
+        database.db_pool.close_all()
+        database.DB_PATH, database.db_pool = self._saved
+        shutil.rmtree(self._dir, ignore_errors=True)
@@ -0,0 +1,286 @@
+"""
+Suite de benchmarks offline (sin red, sin Chrome, sin tocar precios.db).
+
+Mide:
+  - parse_latency: latencia de parse(driver) de cada scraper sobre las fixtures grabadas
+  - scrape_and_save: throughput de scraper_engine._scrape_and_save con un driver falso
+  - db_write: costo de escritura por producto (transacción por producto vs. group commit)
+    y COMMITs por producto, sobre una BD en archivo temporal con synchronous=FULL (en WAL,
+    un fsync por COMMIT)
+  - items_api: productos de MercadoLibre resueltos por la API de ítems (multi-get) contra
+    el stub local que reproduce JSON grabado (bench/api_stub.py)
+
+Uso:
+    python bench/run_benchmarks.py [--json bench/results.json] [--baseline anterior.json]
+                                   [--products 300] [--repeat 30] [--tolerance 0.25]
+
+Con --baseline compara contra una corrida anterior y termina con código 1 si alguna
+métrica empeoró más que --tolerance (25% por defecto).
+"""
+import io
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import datetime
+import statistics
+from contextlib import redirect_stdout
+
+import harness
+from harness import FakeDriver, FakeLease, MemoryDatabase, FileDatabase
+from api_stub import ItemsApiStub
+
+import scraper_engine  # noqa: E402
+from scrapers import parsing  # noqa: E402
+
+# Los benchmarks miden, no registran: silenciar el log por producto
+for name in ("scraper_engine", "database", "scheduler", "http_fetcher", "driver_pool", "product_stats",
+             "scrapers.mercadolibre_api"):
+    logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "runs": len(samples),
+    }
+
+
+def bench_parse_latency(fixtures, expected, repeat):
+    pages = {harness.fixture_url(name): html for name, html in fixtures.items()}
+    driver = FakeDriver(pages)
+    results, mismatches = {}, []
+    for name in fixtures:
+        scraper = scraper_engine.SCRAPER_DISPATCH[harness.store_for(name)]
+        driver.get(harness.fixture_url(name))
+        samples = []
+        for _ in range(repeat):
+            with redirect_stdout(io.StringIO()):
+                t0 = time.perf_counter()
+                result = scraper.parse(driver)
+                samples.append(time.perf_counter() - t0)
+        results[name] = _summary(samples)
+        if name in expected and list(result) != expected[name]:
+            mismatches.append({"page": name, "got": list(result), "expected": expected[name]})
+    return results, mismatches
+
+
+def bench_scrape_and_save(fixtures, n_products, group_commit):
+    names = list(fixtures)
+    pages = {harness.fixture_url(name): html for name, html in fixtures.items()}
+    lease = FakeLease(FakeDriver(pages))
+
+    scraper_engine.GROUP_COMMIT = group_commit
+    scraper_engine._writer = None
+    with FileDatabase() as db:
+        rows = [(f"{harness.fixture_url(names[i % len(names)])}", harness.store_for(names[i % len(names)]))
+                for i in range(n_products)]
+        products = db.add_products([(f"{url}?n={i}", tienda) for i, (url, tienda) in enumerate(rows)])
+        # Todas las variantes de URL sirven la misma fixture
+        lease.driver.pages_by_url.update({url: pages[url.split("?")[0]] for _, url, _ in products})
+
+        with redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            for p_id, url, tienda in products:
+                scraper_engine._scrape_and_save(p_id, url, tienda, lease)
+            scraper_engine.flush_writes()
+            elapsed = time.perf_counter() - t0
+
+        history_rows = db.count("HistorialPrecios")
+        writer = scraper_engine._writer
+        commits = writer.batches if writer else n_products
+        if writer:
+            writer.stop()
+        scraper_engine._writer = None
+
+    return {
+        "products": n_products,
+        "history_rows": history_rows,
+        "commits_per_product": round(commits / n_products, 3),
+        "total_s": round(elapsed, 3),
+        "ms_per_product": round(elapsed / n_products * 1000, 3),
+        "products_per_s": round(n_products / elapsed, 1),
+    }
+
+
+def bench_db_write(n_products, group_commit):
+    """
+    Escritura de n resultados en una BD en archivo (synchronous=FULL). flush() cierra el
+    último lote sin esperar WRITER_MAX_DELAY, así no se cuenta la espera de agrupación.
+    """
+    scraper_engine.GROUP_COMMIT = group_commit
+    scraper_engine._writer = None
+    with FileDatabase() as db:
+        with harness.database.db_pool.get_conn() as conn:
+            synchronous = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}[conn.execute("PRAGMA synchronous").fetchone()[0]]
+        products = db.add_products([(f"https://bench.local/p/{i}", "LaCuracao") for i in range(n_products)])
+        results = [scraper_engine.ScrapeResult(p_id, url, f"Producto {p_id}", 100 + p_id % 7, "disponible")
+                   for p_id, url, _ in products]
+        t0 = time.perf_counter()
+        for result in results:
+            scraper_engine.persist_scrape_result(result)
+        scraper_engine.flush_writes()
+        elapsed = time.perf_counter() - t0
+        writer = scraper_engine._writer
+        batches = writer.batches if writer else n_products
+        if writer:
+            writer.stop()
+        scraper_engine._writer = None
+    return {
+        "products": n_products,
+        "synchronous": synchronous,
+        "transactions": batches,
+        "commits_per_product": round(batches / n_products, 3),
+        "ms_per_product": round(elapsed / n_products * 1000, 4),
+    }
+
+
+def bench_items_api(n_products, expected):
+    """
+    Rastrea n productos de MercadoLibre (ítems distintos) por la API de ítems contra el
+    stub local: mide el costo por producto y las llamadas multi-get, y compara los
+    productos grabados con expected.json ('api:<item_id>').
+    """
+    scraper_engine.GROUP_COMMIT = False
+    scraper_engine._writer = None
+    scraper_engine.ITEMS_API_ENABLED = True
+    with MemoryDatabase() as db, ItemsApiStub(cycle=True) as stub:
+        recorded = list(stub.items)
+        first = int(recorded[0][3:])
+        products = db.add_products([(f"https://articulo.mercadolibre.com.pe/MPE-{first + i}-producto-bench-_JM",
+                                     "MercadoLibre") for i in range(n_products)])
+        t0 = time.perf_counter()
+        outcomes = scraper_engine._scrape_api("MercadoLibre", products)
+        scraper_engine.flush_writes()
+        elapsed = time.perf_counter() - t0
+
+        mismatches = []
+        with harness.database.db_pool.get_conn() as conn:
+            for item in recorded:
+                key = f"api:{item}"
+                row = conn.execute("SELECT nombre, ultimo_precio, status FROM Productos WHERE url LIKE ?",
+                                   (f"%/{item[:3]}-{item[3:]}-%",)).fetchone()
+                got = [row[0], int(row[1]), row[2]] if row and row[1] is not None else list(row or [])
+                if key in expected and got != expected[key]:
+                    mismatches.append({"page": key, "got": got, "expected": expected[key]})
+
+    return {
+        "products": n_products,
+        "resolved": sum(1 for o in outcomes.values() if o == scraper_engine.OUTCOME_OK),
+        "calls": stub.calls,
+        "total_s": round(elapsed, 3),
+        "ms_per_product": round(elapsed / n_products * 1000, 3),
+        "products_per_s": round(n_products / elapsed, 1),
+    }, mismatches
+
+
+# Métricas comparadas contra el baseline (menor es mejor)
+def _comparable(results):
+    out = {}
+    for page, r in results["parse_latency"].items():
+        out[f"parse_latency.{page}.median_ms"] = r["median_ms"]
+    for mode, r in results["scrape_and_save"].items():
+        out[f"scrape_and_save.{mode}.ms_per_product"] = r["ms_per_product"]
+    for mode, r in results["db_write"].items():
+        out[f"db_write.{mode}.ms_per_product"] = r["ms_per_product"]
+    if "items_api" in results:
+        out["items_api.ms_per_product"] = results["items_api"]["ms_per_product"]
+    return out
+
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    base = _comparable(baseline)
+    for key, value in _comparable(current).items():
+        old = base.get(key)
+        if old and value > old * (1 + tolerance):
+            regressions.append({"metric": key, "baseline": old, "current": value,
+                                "change": f"+{(value / old - 1) * 100:.0f}%"})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", type=harness.Path, default=harness.BENCH_DIR / "results.json")
+    parser.add_argument("--baseline", type=harness.Path)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    fixtures = harness.load_fixtures()
+    expected = harness.load_expected()
+    if not fixtures:
+        print("No hay fixtures en bench/fixtures/.")
+        return 1
+
+    # Sin red: el motor debe ir directo al driver (falso)
+    scraper_engine.STATIC_FETCH_ENABLED = False
+    notifications = []
+    scraper_engine.send_telegram_notification = notifications.append
+
+    parse_latency, mismatches = bench_parse_latency(fixtures, expected, args.repeat)
+    items_api, api_mismatches = bench_items_api(args.products, expected)
+    mismatches += api_mismatches
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parser": parsing.PARSER,
+        "parse_latency": parse_latency,
+        "parse_mismatches": mismatches,
+        "scrape_and_save": {
+            "per_product_tx": bench_scrape_and_save(fixtures, args.products, group_commit=False),
+            "group_commit": bench_scrape_and_save(fixtures, args.products, group_commit=True),
+        },
+        "db_write": {
+            "per_product_tx": bench_db_write(args.products, group_commit=False),
+            "group_commit": bench_db_write(args.products, group_commit=True),
+        },
+        "items_api": items_api,
+    }
+
+    print(f"Parser: {results['parser']}  |  Python {results['python']}")
+    print("\nparse(driver) por fixture:")
+    for page, r in parse_latency.items():
+        print(f"  {page:<32} mediana {r['median_ms']:>8} ms   p95 {r['p95_ms']:>8} ms")
+    print("\n_scrape_and_save:")
+    for mode, r in results["scrape_and_save"].items():
+        print(f"  {mode:<16} {r['products_per_s']:>8} prod/s   {r['ms_per_product']:>8} ms/prod")
+    print("\nEscritura en BD:")
+    for mode, r in results["db_write"].items():
+        print(f"  {mode:<16} {r['ms_per_product']:>8} ms/prod   {r['transactions']} transacciones "
+              f"({r['commits_per_product']} COMMIT/fsync por producto, synchronous={r['synchronous']})")
+    print("\nAPI de ítems (stub local):")
+    print(f"  {items_api['products_per_s']:>8} prod/s   {items_api['ms_per_product']:>8} ms/prod   "
+          f"{items_api['resolved']}/{items_api['products']} resueltos en {items_api['calls']} llamadas")
+
+    exit_code = 0
+    if mismatches:
+        print(f"\n¡{len(mismatches)} fixtures con resultado distinto al esperado!")
+        for m in mismatches:
+            print(f"  {m['page']}: {m['got']} != {m['expected']}")
+        exit_code = 1
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        results["regressions"] = compare(results, baseline, args.tolerance)
+        if results["regressions"]:
+            print(f"\nRegresiones (> {args.tolerance:.0%}) contra {args.baseline}:")
+            for r in results["regressions"]:
+                print(f"  {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']})")
+            exit_code = 1
+        else:
+            print(f"\nSin regresiones contra {args.baseline}.")
+
+    args.json.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nResultados en {args.json}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,6 @@ import os
 import asyncio
 import time
 import socket
-from urllib.parse import urlparse
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import NetworkError, TimedOut
@@ -15,9 +14,14 @@ from telegram.ext import (
 import logging
 
 # --- Importar módulos del proyecto ---
-import scraper_engine
 import database
+import http_fetcher
 import log_setup
+import metrics
+import product_import
+import repository
+from job_manager import JobManager
+from stores import detect_store
 
 # --- Configurar Logger ---
 log = log_setup.setup_logging('bot_manager')
@@ -27,9 +31,35 @@ load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 CHAT_ID = os.getenv("CHAT_ID")
 
+# --- Trabajos de actualización masiva (uno a la vez) ---
+job_manager = JobManager()
+
 # --- Estados para la conversación ---
 (STATE_SET_TARGET) = range(1)
 
+# --- /lista paginada ---
+LIST_PAGE_SIZE = 10  # Productos por mensaje
+LIST_NAME_MAX_CHARS = 45  # Los nombres largos se recortan en la vista compacta
+
+PROGRESS_EDIT_INTERVAL = 3  # Segundos entre ediciones de los mensajes de progreso
+
+# --- Importación en bloque ---
+IMPORT_MAX_BYTES = 1024 * 1024  # Tamaño máx. del .txt con URLs
+IMPORT_LIST_MAX = 10  # URLs rechazadas que se listan en la respuesta
+
+DB_BUSY_MESSAGE = "⏳ La base de datos está ocupada (rastreo en curso). Intenta de nuevo en unos segundos."
+
+# Motivos de fallo de scraping (scraper_engine.FAIL_*) tal como se muestran al usuario
+FAILURE_LABELS = {
+    "timeout": "la página no cargó a tiempo",
+    "bloqueo": "la tienda está bloqueando las visitas (captcha)",
+    "parse": "no se encontró el precio en la página",
+    "no_encontrado": "la publicación ya no existe",
+    "driver": "el navegador falló",
+    "sin_scraper": "la tienda aún no está soportada",
+    "circuito_abierto": "la tienda viene fallando; se pausó temporalmente",
+}
+
 
 # ==========================================================
 # --- Funciones de Resiliencia ---
@@ -54,22 +84,14 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         raise context.error
     except (NetworkError, TimedOut):
         log.warning("⚠️ Error de red/timeout con Telegram. El bot reintentará automáticamente.")
+    except repository.RepositoryTimeout as e:
+        log.warning(f"⚠️ BD ocupada: {e}")
+        if isinstance(update, Update) and update.effective_chat:
+            await context.bot.send_message(chat_id=update.effective_chat.id, text=DB_BUSY_MESSAGE)
     except Exception as e:
         log.error(f"🔥 Excepción no controlada: {e}", exc_info=True)
 
 
-# ==========================================================
-# --- Lógica de Tienda ---
-# ==========================================================
-def detect_store(url):
-    domain = urlparse(url).netloc.lower()
-    if 'mercadolibre' in domain: return 'MercadoLibre'
-    if 'lacuracao' in domain: return 'LaCuracao'
-    if 'falabella' in domain: return 'Falabella'
-    if 'ripley' in domain: return 'Ripley'
-    return None
-
-
 # ==========================================================
 # --- FUNCIONES AUXILIARES ---
 # ==========================================================
@@ -78,33 +100,21 @@ async def show_single_product(context: ContextTypes.DEFAULT_TYPE, chat_id, produ
     """
     Función reutilizable para mostrar la tarjeta de UN solo producto.
     """
-    conn = database.get_db_conn()
-    cursor = conn.cursor()
-
-    query = """
-    SELECT
-        P.id, P.nombre, P.precio_objetivo, P.status, P.precio_mas_bajo, P.url,
-        (SELECT H.precio FROM HistorialPrecios H
-         WHERE H.producto_id = P.id
-         ORDER BY H.fecha DESC
-         LIMIT 1) AS ultimo_precio
-    FROM Productos P
-    WHERE P.id = ?
-    """
-    cursor.execute(query, (product_id,))
-    prod = cursor.fetchone()
-    conn.close()
+    prod = await repository.get_product_card(product_id)
+    ultimos = await repository.recent_prices(product_id)
 
     if not prod:
         await context.bot.send_message(chat_id=chat_id, text=f"⚠️ No se encontraron datos para el ID {product_id}.")
         return
 
-    pid, nombre, objetivo, status, precio_mas_bajo, url, ultimo_precio = prod
+    pid, nombre, objetivo, status, precio_mas_bajo, url, ultimo_precio, minimo_30d, promedio_30d = prod
 
     nombre_str = nombre if nombre else "(Pendiente de rastrear)"
     objetivo_str = f"S/ {objetivo}" if objetivo else "No fijado"
     precio_str = f"S/ {ultimo_precio}" if ultimo_precio else "Aún no trackeado"
     precio_mas_bajo_str = f"S/ {precio_mas_bajo}" if precio_mas_bajo else "N/A"
+    rango_30d_str = f"S/ {minimo_30d} (prom. S/ {promedio_30d:,.2f})" if promedio_30d else "N/A"
+    ultimos_str = " → ".join(f"{p:g}" for p in ultimos) if ultimos else "N/A"
     status_str = status.capitalize() if status else "Ninguno"
 
     status_icon = "🟢" if status == "disponible" else "🔴" if status == "no disponible" else "⚪"
@@ -115,6 +125,8 @@ async def show_single_product(context: ContextTypes.DEFAULT_TYPE, chat_id, produ
         f"{status_icon} *Status:* {status_str}\n\n"
         f"💰 *Precio Actual:* {precio_str}\n"
         f"📉 *Mínimo Histórico:* {precio_mas_bajo_str}\n"
+        f"📊 *Mínimo 30 días:* {rango_30d_str}\n"
+        f"📈 *Últimos cambios:* {ultimos_str}\n"
         f"🎯 *Meta:* {objetivo_str}"
     )
 
@@ -142,38 +154,102 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "¡Hola! Soy tu bot de seguimiento de precios.\n"
         "Usa /lista para ver productos.\n"
-        "Usa /agregar <URL> para añadir uno nuevo.\n"
+        "Usa /agregar <URL> para añadir uno nuevo (con varias URLs, o enviando un .txt, se importan en bloque).\n"
         "Usa /actualizar para forzar revisión masiva."
     )
 
 
+def _md_escape(text):
+    """Escapa los caracteres especiales del Markdown (legacy) de Telegram."""
+    for char in ("_", "*", "`", "["):
+        text = text.replace(char, f"\\{char}")
+    return text
+
+
+async def render_list_page(page):
+    """
+    Construye el texto y los botones de una página de /lista con una sola consulta
+    (los productos visibles y el total vía COUNT(*) OVER ()).
+    Devuelve (texto, markup) o (None, None) si no hay productos.
+    """
+    rows, total = await repository.list_page(page, LIST_PAGE_SIZE)
+    if total == 0:
+        return None, None
+
+    total_pages = (total + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+    if not rows:
+        # Volver a la última página existente
+        page = total_pages - 1
+        rows, total = await repository.list_page(page, LIST_PAGE_SIZE)
+
+    lines = [f"📦 *Productos* ({total}) — página {page + 1}/{total_pages}\n"]
+    for pid, nombre, tienda, status, ultimo_precio, objetivo, _ in rows:
+        status_icon = "🟢" if status == "disponible" else "🔴" if status == "no disponible" else "⚪"
+        nombre_str = nombre or "(Pendiente de rastrear)"
+        if len(nombre_str) > LIST_NAME_MAX_CHARS:
+            nombre_str = nombre_str[:LIST_NAME_MAX_CHARS - 1] + "…"
+        precio_str = f"S/ {ultimo_precio}" if ultimo_precio else "—"
+        objetivo_str = f" · 🎯 S/ {objetivo}" if objetivo else ""
+        lines.append(f"{status_icon} `{pid}` {_md_escape(nombre_str)} ({tienda})\n      💰 {precio_str}{objetivo_str}")
+
+    # Un botón por producto para abrir su tarjeta completa (bajo demanda)
+    card_buttons = [InlineKeyboardButton(f"🔎 {row[0]}", callback_data=f"card_{row[0]}") for row in rows]
+    keyboard = [card_buttons[i:i + 5] for i in range(0, len(card_buttons), 5)]
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Anterior", callback_data=f"page_{page - 1}"))
+    if page < total_pages - 1:
+        nav.append(InlineKeyboardButton("Siguiente ➡️", callback_data=f"page_{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+
 async def list_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     log.info("Comando /lista recibido.")
 
     try:
-        conn = database.get_db_conn()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM Productos")
-        rows = cursor.fetchall()
-        conn.close()
-
-        if not rows:
+        text, markup = await render_list_page(0)
+        if text is None:
             await update.message.reply_text("No hay productos en la base de datos.")
             return
 
-        await update.message.reply_text(f"--- 📦 LISTA DE {len(rows)} PRODUCTOS ---")
-
-        for row in rows:
-            await show_single_product(context, update.effective_chat.id, row[0])
-            await asyncio.sleep(0.2)
+        await update.message.reply_text(text, reply_markup=markup, parse_mode='Markdown')
 
+    except repository.RepositoryTimeout:
+        await update.message.reply_text(DB_BUSY_MESSAGE)
     except Exception as e:
         log.error(f"Error en /lista: {e}")
         await update.message.reply_text("Ocurrió un error al obtener la lista.")
 
 
+async def _scrape_now(message, product_id):
+    """
+    Pide el scraping de un producto a la cola Jobs con prioridad interactiva y espera
+    el resultado. Lo ejecuta el tracker (o el worker del bot si no hay tracker), sin
+    abrir navegadores extra.
+    """
+    status = await job_manager.run_interactive(product_id)
+    if status is None or status["estado"] == "hecho":
+        return
+    if status["estado"] in ("pendiente", "en_curso") and not status["intentos"]:
+        await message.reply_text("⏳ La cola está ocupada; el producto se actualizará en cuanto llegue su turno.")
+    else:
+        motivo = FAILURE_LABELS.get(status["error"], status["error"] or status["estado"])
+        if status["estado"] == "fallido":
+            await message.reply_text(f"⚠️ No se pudo actualizar: {motivo}.")
+        else:
+            await message.reply_text(f"⚠️ No se pudo actualizar ahora ({motivo}). Se reintentará automáticamente.")
+
+
 async def add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
     log.info(f"Comando /agregar recibido con args: {context.args}")
+    urls = product_import.extract_urls(update.message.text)
+    if len(urls) > 1:
+        await _import_urls(update, context, urls)
+        return
     if not context.args or len(context.args) != 1:
         await update.message.reply_text("Usa /agregar <URL_COMPLETA>")
         return
@@ -184,53 +260,179 @@ async def add_product(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Tienda no reconocida.")
         return
 
-    conn = database.get_db_conn()
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO Productos (url, tienda, status, notificacion_objetivo_enviada) VALUES (?, ?, 'ninguno', 0)",
-            (url, tienda)
-        )
-        conn.commit()
-        product_id = cursor.lastrowid
+        product_id = await repository.add_product(url)
 
         await update.message.reply_text(f"✅ Producto añadido (ID: {product_id}). Procesando...")
 
-        await asyncio.to_thread(scraper_engine.track_single_product, product_id)
+        await _scrape_now(update.message, product_id)
 
         await update.message.reply_text("✅ Proceso finalizado. Aquí tienes el resultado:")
         await show_single_product(context, update.effective_chat.id, product_id)
 
+    except repository.DuplicateProduct as e:
+        await update.message.reply_text(f"Ese producto ya está registrado (ID: {e.product_id}).")
+        await show_single_product(context, update.effective_chat.id, e.product_id)
     except sqlite3.IntegrityError:
         await update.message.reply_text("Error: URL ya registrada.")
+    except repository.RepositoryTimeout:
+        await update.message.reply_text(DB_BUSY_MESSAGE)
     except Exception as e:
         log.error(f"Error en /agregar: {e}", exc_info=True)
         await update.message.reply_text("Error interno.")
-    finally:
-        conn.close()
+
+
+async def _import_urls(update, context, urls):
+    """Importa URLs en bloque y sigue el primer scraping de las nuevas con el progreso por tienda."""
+    try:
+        result, job = await job_manager.start_import(urls)
+    except repository.RepositoryTimeout:
+        await update.message.reply_text(DB_BUSY_MESSAGE)
+        return
+
+    lines = [f"📥 Importación: {len(result.added)} productos nuevos."]
+    lines += [f"  • {tienda}: {n}" for tienda, n in result.added_by_store().most_common()]
+    if result.existing:
+        lines.append(f"↩️ {len(result.existing)} ya estaban registrados.")
+    if result.repeated:
+        lines.append(f"🔁 {result.repeated} repetidos en el mensaje.")
+    if result.unknown:
+        lines.append(f"❓ {len(result.unknown)} de tiendas no soportadas:")
+        lines += [f"  {url}" for url in result.unknown[:IMPORT_LIST_MAX]]
+        if len(result.unknown) > IMPORT_LIST_MAX:
+            lines.append(f"  ... y {len(result.unknown) - IMPORT_LIST_MAX} más")
+    if job:
+        lines.append(f"Primer scraping estimado: ~{_format_duration(job.eta_seconds())}. Te avisaré al terminar.")
+    # Sin Markdown: las URLs suelen tener '_'
+    await update.message.reply_text("\n".join(lines), disable_web_page_preview=True)
+
+    if job:
+        await _start_progress_report(context, update.effective_chat.id, job)
+
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Un .txt adjunto con URLs (una por línea o mezcladas con texto) se importa en bloque."""
+    document = update.message.document
+    log.info(f"Archivo recibido para importar: {document.file_name} ({document.file_size} bytes)")
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text(f"El archivo es muy grande (máx. {IMPORT_MAX_BYTES // 1024} KB).")
+        return
+    try:
+        telegram_file = await document.get_file()
+        data = await telegram_file.download_as_bytearray()
+    except (NetworkError, TimedOut):
+        await update.message.reply_text("No se pudo descargar el archivo. Intenta de nuevo.")
+        return
+
+    urls = product_import.extract_urls(bytes(data).decode("utf-8", errors="replace"))
+    if not urls:
+        await update.message.reply_text("No encontré URLs en el archivo.")
+        return
+    await _import_urls(update, context, urls)
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "calculando..."
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    return f"{seconds // 60} min {seconds % 60:02d}s"
+
+
+def _render_store_progress(job, store):
+    progress = job.stores[store]
+    filled = int(10 * progress.done / progress.total) if progress.total else 10
+    bar = "▓" * filled + "░" * (10 - filled)
+    text = (
+        f"🏬 *{store}* — trabajo #{job.id}\n"
+        f"{bar} {progress.done}/{progress.total}\n"
+        f"✅ {progress.ok}  ❌ {progress.failed}"
+    )
+    if job.state == "running" and progress.remaining:
+        text += f"\n⏱ Restante: ~{_format_duration(job.eta_seconds(store))}"
+    elif not progress.remaining:
+        text += "\n🏁 Tienda completada."
+    return text
+
+
+def _cancel_markup(job):
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⛔ Cancelar", callback_data=f"jobcancel_{job.id}")]])
+
+
+async def _report_job_progress(context, chat_id, job, message_ids):
+    """Edita un mensaje por tienda mientras el trabajo avanza (sin pasar el límite de ediciones)."""
+    last_texts = {}
+
+    async def refresh(final=False):
+        for store, message_id in message_ids.items():
+            text = _render_store_progress(job, store)
+            if last_texts.get(store) == text:
+                continue
+            markup = _cancel_markup(job) if not final and job.stores[store].remaining else None
+            try:
+                await context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text,
+                                                    reply_markup=markup, parse_mode='Markdown')
+                last_texts[store] = text
+            except Exception as e:
+                log.debug(f"No se pudo editar el progreso de {store}: {e}")
+
+    while job.state == "running":
+        await refresh()
+        await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+        try:
+            await job_manager.refresh(job)
+        except repository.RepositoryTimeout:
+            continue  # BD ocupada: se reintenta en la próxima vuelta
+    await refresh(final=True)
+
+    elapsed = _format_duration(job.finished - job.started)
+    title = "Importación" if job.origen == "importacion" else "Actualización masiva"
+    summary = {
+        "done": f"✅ {title} completa: {job.done}/{job.total} productos en {elapsed}.",
+        "cancelled": f"⛔ {title} cancelada: {job.done}/{job.total} productos procesados.",
+    }[job.state]
+    await context.bot.send_message(chat_id=chat_id, text=summary)
 
 
 async def update_all_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Fuerza el tracking de todos los productos.
+    Fuerza el tracking de todos los productos como trabajo en segundo plano,
+    con un mensaje de progreso por tienda y opción de cancelar.
     """
     log.info("Comando /actualizar recibido.")
-    count = scraper_engine.get_product_count()
-    if count == 0:
-        await update.message.reply_text("No hay productos.")
+    running = job_manager.current()
+    if running:
+        await update.message.reply_text(
+            f"Ya hay una actualización en curso (#{running.id}, {running.done}/{running.total}).",
+            reply_markup=_cancel_markup(running)
+        )
         return
 
-    total_seconds = count * (scraper_engine.SCRAPING_WAIT_TIME + scraper_engine.POST_SCRAPE_SLEEP)
-    minutes = total_seconds // 60
+    products = await repository.all_products()
+    if not products:
+        await update.message.reply_text("No hay productos.")
+        return
 
+    job = await job_manager.start(products)
     await update.message.reply_text(
-        f"Actualizando {count} productos.\nEstimado: ~{minutes} min.\nTe avisaré al terminar."
+        f"Actualizando {job.total} productos en {len(job.stores)} tiendas.\n"
+        f"Estimado: ~{_format_duration(job.eta_seconds())}. Te avisaré al terminar."
     )
 
-    # --- CORRECCIÓN AQUÍ: Llamamos a track_all_products sin argumentos ---
-    await asyncio.to_thread(scraper_engine.track_all_products)
+    await _start_progress_report(context, update.effective_chat.id, job)
+
+
+async def _start_progress_report(context, chat_id, job):
+    """Envía un mensaje de progreso por tienda y los sigue editando en segundo plano."""
+    message_ids = {}
+    for store in job.stores:
+        message = await context.bot.send_message(chat_id=chat_id, text=_render_store_progress(job, store),
+                                                 reply_markup=_cancel_markup(job), parse_mode='Markdown')
+        message_ids[store] = message.message_id
 
-    await update.message.reply_text("✅ Actualización masiva completa.")
+    # El handler vuelve de inmediato; el reporte sigue en segundo plano
+    context.application.create_task(_report_job_progress(context, chat_id, job, message_ids))
 
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -248,12 +450,10 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data.startswith("del_confirm_"):
         try:
             product_id = int(data.split('_')[2])
-            conn = database.get_db_conn()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM Productos WHERE id = ?", (product_id,))
-            conn.commit()
-            conn.close()
+            await repository.delete_product(product_id)
             await query.edit_message_text(f"🗑 Producto ID {product_id} eliminado.")
+        except repository.RepositoryTimeout:
+            await query.message.reply_text(DB_BUSY_MESSAGE)
         except Exception as e:
             log.error(f"Error eliminando: {e}")
         return
@@ -264,7 +464,25 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except:
         return
 
-    if action == "del":
+    if action == "jobcancel":
+        job = job_manager.get(product_id)
+        if job and await job_manager.cancel(job):
+            await query.message.reply_text(f"⛔ Cancelando trabajo #{job.id}... (terminan los productos en curso)")
+        else:
+            await query.message.reply_text("Ese trabajo ya no está en curso.")
+
+    elif action == "page":
+        # Navegación de /lista: se edita el mismo mensaje
+        text, markup = await render_list_page(max(0, product_id))
+        if text is None:
+            await query.edit_message_text("No hay productos en la base de datos.")
+        else:
+            await query.edit_message_text(text, reply_markup=markup, parse_mode='Markdown')
+
+    elif action == "card":
+        await show_single_product(context, update.effective_chat.id, product_id)
+
+    elif action == "del":
         keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("❌ SÍ, Eliminar definitivamente", callback_data=f"del_confirm_{product_id}")],
             [InlineKeyboardButton("Cancelar", callback_data="cancel_delete")]
@@ -278,7 +496,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif action == "update":
         await query.message.reply_text(f"⏳ Actualizando ID {product_id}...")
-        await asyncio.to_thread(scraper_engine.track_single_product, product_id)
+        await _scrape_now(query.message, product_id)
         await show_single_product(context, update.effective_chat.id, product_id)
 
 
@@ -287,14 +505,7 @@ async def receive_target_price(update: Update, context: ContextTypes.DEFAULT_TYP
         new_price = float(update.message.text)
         product_id = context.user_data['product_id_to_set']
 
-        conn = database.get_db_conn()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE Productos SET precio_objetivo = ?, notificacion_objetivo_enviada = 0 WHERE id = ?",
-            (new_price, product_id)
-        )
-        conn.commit()
-        conn.close()
+        await repository.set_target_price(product_id, new_price)
 
         await update.message.reply_text(f"✅ Meta actualizada.")
         await show_single_product(context, update.effective_chat.id, product_id)
@@ -302,6 +513,8 @@ async def receive_target_price(update: Update, context: ContextTypes.DEFAULT_TYP
     except ValueError:
         await update.message.reply_text("Debe ser un número.")
         return STATE_SET_TARGET
+    except repository.RepositoryTimeout:
+        await update.message.reply_text(DB_BUSY_MESSAGE)
     except Exception as e:
         log.error(f"Error setting price: {e}")
     finally:
@@ -347,11 +560,18 @@ def main():
     application.add_handler(CommandHandler("lista", list_products, filters=user_filter))
     application.add_handler(CommandHandler("agregar", add_product, filters=user_filter))
     application.add_handler(CommandHandler("actualizar", update_all_products, filters=user_filter))
+    application.add_handler(MessageHandler(filters.Document.TXT & user_filter, import_document))
 
-    application.add_handler(CallbackQueryHandler(button_handler, pattern='^(del_|cancel_delete|update_)'))
+    application.add_handler(CallbackQueryHandler(button_handler, pattern='^(del_|cancel_delete|update_|page_|card_|jobcancel_)'))
+
+    # Métricas del worker local del bot (solo procesa la cola si no hay tracker)
+    metrics.serve(int(os.getenv("BOT_METRICS_PORT", "0")))
 
     log.info("Bot escuchando...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    try:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+    finally:
+        http_fetcher.close_session()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+import time
+import threading
+import logging
+
+import metrics
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Valores por defecto ---
+DEFAULT_FAILURE_THRESHOLD = 5  # Fallos seguidos (de los que cuentan) que abren el circuito
+DEFAULT_COOLDOWN = 120  # Segundos con el circuito abierto antes de la primera prueba
+DEFAULT_MAX_COOLDOWN = 30 * 60  # Tope del cooldown (se duplica cada vez que una prueba falla)
+
+CLOSED = "cerrado"
+OPEN = "abierto"
+HALF_OPEN = "semiabierto"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por tienda.
+
+    Cerrado: todo pasa. Tras 'failure_threshold' fallos seguidos se abre y los productos de
+    la tienda se saltan sin gastar navegador ni esperas. Pasado el cooldown queda semiabierto
+    y deja pasar UNA petición de prueba: si sale bien se cierra; si falla vuelve a abrirse
+    con el doble de cooldown (hasta max_cooldown).
+    """
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, cooldown=DEFAULT_COOLDOWN,
+                 max_cooldown=DEFAULT_MAX_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.last_failure = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def retry_at(self):
+        """Epoch en que el circuito admitirá la próxima prueba (None si está cerrado)."""
+        if self.state == CLOSED or self.opened_at is None:
+            return None
+        return self.opened_at + self.cooldown
+
+    def allow(self):
+        """True si la petición puede hacerse. En semiabierto solo pasa una prueba a la vez."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.time() < self.opened_at + self.cooldown:
+                    return False
+                self.state = HALF_OPEN
+                log.info(f"[Circuito: {self.name}] Semiabierto: probando con una petición.")
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, ok, kind=None):
+        """
+        Registra el resultado de una petición que pasó por allow().
+        kind: tipo de fallo (para el log y el estado); solo se llama con fallos que cuentan.
+        """
+        with self._lock:
+            was_probe = self._probing
+            self._probing = False
+            if ok:
+                if self.state != CLOSED:
+                    log.info(f"[Circuito: {self.name}] Prueba exitosa: circuito cerrado.")
+                self.state = CLOSED
+                self.failures = 0
+                self.cooldown = self.base_cooldown
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            self.last_failure = kind
+            if self.state == HALF_OPEN and was_probe:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def release(self):
+        """Libera la prueba en curso sin resultado (p. ej. el fallo no era atribuible a la tienda)."""
+        with self._lock:
+            self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        metrics.inc("circuito_aperturas", tienda=self.name)
+        log.warning(f"[Circuito: {self.name}] ABIERTO tras {self.failures} fallos seguidos "
+                    f"(último: {self.last_failure}). Próxima prueba en {self.cooldown:.0f}s.")
+
+    def snapshot(self):
+        """Estado actual para el resumen del ciclo."""
+        return {"estado": self.state, "fallos": self.failures, "ultimo_fallo": self.last_failure,
+                "reintento": self.retry_at}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **config):
+    """Devuelve el circuit breaker de una tienda (se conserva entre ciclos y lotes)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **config)
+        return breaker
+
+
+def snapshot_all():
+    """{tienda: snapshot()} de los circuitos creados en este proceso (resumen de fin de ciclo)."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
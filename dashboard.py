@@ -1,75 +1,158 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import sqlite3
-from pathlib import Path
-import database  # <-- ¡NUEVA IMPORTACIÓN!
+import database
+import downsampling
+import retention
+import timestamps
 
 # --- Configuración de la Página (¡Debe ser lo primero!) ---
 st.set_page_config(page_title="Tracker de Precios", layout="wide")
 
 # --- Constantes ---
 ITEMS_PER_PAGE = 10  # Productos por página
+CARD_POINT_BUDGET = 150  # Puntos por gráfico en la lista
+DETAIL_POINT_BUDGET = downsampling.DEFAULT_POINT_BUDGET * 2  # Puntos en el gráfico de detalle
+DOWNSAMPLE_METHOD = "lttb"  # "lttb" o "minmax"
+HISTORY_TABLE_ROWS = 500  # Filas más recientes en la tabla de detalle
+# Rangos del gráfico de detalle (días; None = todo, incluido el archivo Parquet)
+DETAIL_RANGES = {"90 días": retention.FULL_RESOLUTION_DAYS, "1 año": 365, "Todo": None}
+CARD_RANGE_DAYS = retention.DAILY_RETENTION_DAYS  # Las tarjetas no leen el archivo
 
 
 # --- Carga de Datos (con caché) ---
+# Cada consulta trae solo lo que se dibuja: la página visible o un único producto.
+# El historial está guardado por tramos de precio (fecha .. fecha_ultima): cada tramo se
+# dibuja con su inicio y su fin en una línea escalonada, y se reduce aquí antes de enviarse.
+# Lo más viejo está agregado por día (HistorialDiario) o archivado en Parquet (retention.py):
+# cada día aporta su apertura y su cierre.
+def _read_sql(query, params=()):
+    with database.db_pool.get_conn() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+
+def _prepare_series(df, columns=('fecha',)):
+    # Las fechas son epoch ms: conversión vectorizada a hora local, sin parsear texto
+    for column in columns:
+        df[column] = (pd.to_datetime(df[column], unit='ms', utc=True)
+                      .dt.tz_convert(timestamps.LOCAL_TZ).dt.tz_localize(None))
+    return df
+
+
 @st.cache_data(ttl=600)
-def load_data():
-    """
-    Carga todos los datos de la base de datos (con producto_id)
-    y los devuelve como un DataFrame de Pandas.
-    """
-    print("Cargando datos desde la base de datos...")
-    try:
-        # ¡OPTIMIZADO! Usa la ruta centralizada
-        conn = sqlite3.connect(database.DB_PATH)
-        query = """
-        SELECT
-            P.id as producto_id, 
-            P.nombre,
-            P.tienda,
-            H.precio,
-            H.fecha
-        FROM HistorialPrecios H
-        JOIN Productos P ON H.producto_id = P.id
-        ORDER BY H.fecha ASC
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-
-        df['fecha'] = pd.to_datetime(df['fecha'], format='mixed')
-
-        if 'nombre' in df.columns:
-            df['producto_display'] = df['nombre'] + " (" + df['tienda'] + ")"
+def count_products():
+    """Número de productos con al menos un precio registrado."""
+    with database.db_pool.get_conn() as conn:
+        return conn.execute("SELECT COUNT(*) FROM Productos WHERE ultimo_precio IS NOT NULL").fetchone()[0]
+
 
+@st.cache_data(ttl=600)
+def load_page(page):
+    """Productos de una página (solo ITEMS_PER_PAGE filas de Productos)."""
+    print(f"Cargando página {page} desde la base de datos...")
+    try:
+        df = _read_sql("""
+            SELECT id as producto_id, nombre, tienda, ultimo_precio
+            FROM Productos
+            WHERE ultimo_precio IS NOT NULL
+            ORDER BY id
+            LIMIT ? OFFSET ?
+        """, (ITEMS_PER_PAGE, (page - 1) * ITEMS_PER_PAGE))
+        df['producto_display'] = df['nombre'] + " (" + df['tienda'] + ")"
         return df
     except Exception as e:
         st.error(f"Error al cargar datos: {e}")
         return pd.DataFrame()
 
 
+@st.cache_data(ttl=600)
+def load_series(product_id, budget, days=None, tienda=None):
+    """
+    Serie de precios de un producto en los últimos 'days' días (None = toda), reducida a
+    'budget' puntos. Devuelve (DataFrame, puntos antes de reducir).
+    El archivo Parquet solo se lee si el rango va más allá del nivel diario y se pasa la tienda.
+    """
+    since = retention.day_cutoff(days) if days else None
+    since_ms = timestamps.day_start_ms(since) if since else 0
+    df = _read_sql("""
+        SELECT desde as fecha, apertura as precio FROM HistorialDiario
+        WHERE producto_id = ? AND hasta >= ?
+        UNION ALL
+        SELECT hasta, cierre FROM HistorialDiario
+        WHERE producto_id = ? AND hasta >= ? AND hasta > desde
+        UNION ALL
+        SELECT fecha, precio FROM HistorialPrecios
+        WHERE producto_id = ? AND COALESCE(fecha_ultima, fecha) >= ?
+        UNION ALL
+        SELECT fecha_ultima, precio FROM HistorialPrecios
+        WHERE producto_id = ? AND fecha_ultima >= ? AND fecha_ultima > fecha
+        ORDER BY fecha ASC
+    """, (product_id, since_ms) * 4)
+
+    if tienda and (days is None or days > retention.DAILY_RETENTION_DAYS):
+        archived = retention.read_archive(tienda, product_id, since)
+        if not archived.empty:
+            archived = pd.concat([
+                archived[['desde', 'apertura']].set_axis(['fecha', 'precio'], axis=1),
+                archived.loc[archived['hasta'] > archived['desde'], ['hasta', 'cierre']].set_axis(['fecha', 'precio'], axis=1),
+            ])
+            df = pd.concat([archived, df], ignore_index=True).sort_values('fecha', kind='stable')
+
+    df = _prepare_series(df)
+    total = len(df)
+    return downsampling.downsample_frame(df, 'fecha', 'precio', budget, DOWNSAMPLE_METHOD), total
+
+
+@st.cache_data(ttl=600)
+def load_product_summary(product_id):
+    """Nombre, tienda y estadísticas de un producto leídas de ProductStats (sin tocar el historial)."""
+    df = _read_sql("""
+        SELECT P.nombre, P.tienda, S.ultimo as ultimo_precio,
+               S.minimo, S.maximo, S.suma / NULLIF(S.registros, 0) as promedio,
+               COALESCE(S.registros, 0) as registros, S.minimo_30d, S.maximo_30d, S.suma_30d / NULLIF(S.registros_30d, 0) as promedio_30d,
+               (SELECT COUNT(*) FROM HistorialPrecios H WHERE H.producto_id = P.id) as tramos
+        FROM Productos P
+        LEFT JOIN ProductStats S ON S.producto_id = P.id
+        WHERE P.id = ?
+    """, (product_id,))
+    return None if df.empty else df.iloc[0]
+
+
+@st.cache_data(ttl=600)
+def load_recent_history(product_id, limit=HISTORY_TABLE_ROWS):
+    """Últimos 'limit' tramos de precio de un producto para la tabla de detalle."""
+    df = _read_sql("""
+        SELECT fecha as desde, COALESCE(fecha_ultima, fecha) as hasta, precio, observaciones
+        FROM HistorialPrecios
+        WHERE producto_id = ?
+        ORDER BY fecha DESC
+        LIMIT ?
+    """, (product_id, limit))
+    return _prepare_series(df, ('desde', 'hasta'))
+
+
 # ==================================================================
 # --- VISTA 1: PÁGINA DE DETALLE DE PRODUCTO ---
 # ==================================================================
-def show_detail_page(df, product_id):
+def show_detail_page(product_id):
     """
     Muestra la página de detalles (métricas y gráfico) para UN producto.
     """
     try:
-        product_data = df[df['producto_id'] == product_id]
+        summary = load_product_summary(product_id)
 
-        if product_data.empty:
+        if summary is None or not summary['registros']:
             st.warning("No se encontraron datos para este producto.")
             st.markdown("<a href='/' target='_self'>&larr; Volver a la lista</a>", unsafe_allow_html=True)
             return
 
-        display_name = product_data.iloc[0]['producto_display']
+        display_name = f"{summary['nombre']} ({summary['tienda']})"
         st.title(display_name)
 
-        latest_price = product_data.iloc[-1]['precio']
-        lowest_price = product_data['precio'].min()
-        highest_price = product_data['precio'].max()
-        avg_price = product_data['precio'].mean()
+        latest_price = summary['ultimo_precio']
+        lowest_price = summary['minimo']
+        highest_price = summary['maximo']
+        avg_price = summary['promedio']
 
         st.header("Estadísticas Clave")
         col1, col2, col3, col4 = st.columns(4)
@@ -78,22 +161,35 @@ def show_detail_page(df, product_id):
         col3.metric("Precio Más Alto", f"S/ {highest_price:,.2f}")
         col4.metric("Precio Promedio", f"S/ {avg_price:,.2f}")
 
+        col1, col2, col3, _ = st.columns(4)
+        col1.metric("Mínimo 30 días", f"S/ {summary['minimo_30d']:,.2f}")
+        col2.metric("Máximo 30 días", f"S/ {summary['maximo_30d']:,.2f}")
+        col3.metric("Promedio 30 días", f"S/ {summary['promedio_30d']:,.2f}")
+
         st.header("Historial de Precios")
+        rango = st.radio("Rango", list(DETAIL_RANGES), index=len(DETAIL_RANGES) - 1, horizontal=True)
+        product_data, total_points = load_series(product_id, DETAIL_POINT_BUDGET, DETAIL_RANGES[rango], summary['tienda'])
         fig = px.line(
             product_data,
             x='fecha',
             y='precio',
             title=f"Evolución del precio de {display_name}",
-            markers=True
+            markers=True,
+            line_shape='hv'
         )
-        min_price = product_data['precio'].min()
-        max_price = product_data['precio'].max()
-        fig.update_yaxes(range=[min_price * 0.98, max_price * 1.02])
+        fig.update_yaxes(range=[lowest_price * 0.98, highest_price * 1.02])
         st.plotly_chart(fig, use_container_width=True)
+        if total_points > len(product_data):
+            st.caption(f"Gráfico reducido a {len(product_data)} de {total_points} puntos.")
 
         st.header("Tabla de Historial")
-        st.dataframe(product_data[['fecha', 'precio']].sort_values(by='fecha', ascending=False),
-                     use_container_width=True)
+        recent = load_recent_history(product_id)
+        st.caption(f"{summary['tramos']} tramos de precio con resolución completa "
+                   f"(últimos {retention.FULL_RESOLUTION_DAYS} días; lo anterior está agregado por día). "
+                   f"{summary['registros']} observaciones en total.")
+        if summary['tramos'] > len(recent):
+            st.caption(f"Mostrando los {len(recent)} tramos más recientes.")
+        st.dataframe(recent, use_container_width=True)
 
         st.divider()
         st.markdown("<a href='/' target='_self'>&larr; Volver a la lista</a>", unsafe_allow_html=True)
@@ -106,20 +202,19 @@ def show_detail_page(df, product_id):
 # ==================================================================
 # --- VISTA 2: PÁGINA PRINCIPAL (LISTA DE PRODUCTOS) ---
 # ==================================================================
-def show_main_page(df):
+def show_main_page():
     """
     Muestra la lista paginada de productos, cada uno con su gráfico.
     """
     st.title("📊 Dashboard de Historial de Precios")
 
-    product_list = df.drop_duplicates(subset=['producto_id'])
+    total_products = count_products()
 
-    if product_list.empty:
+    if total_products == 0:
         st.warning("No hay productos en la base de datos.")
         st.info("Ejecuta 'python tracker.py' para empezar a recolectar datos.")
         return
 
-    total_products = len(product_list)
     total_pages = max(1, (total_products + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
 
     pagination_container = st.container()
@@ -134,9 +229,7 @@ def show_main_page(df):
             label_visibility="collapsed"
         )
 
-    start_index = (current_page - 1) * ITEMS_PER_PAGE
-    end_index = start_index + ITEMS_PER_PAGE
-    products_to_show = product_list.iloc[start_index:end_index]
+    products_to_show = load_page(int(current_page))
 
     for _, product in products_to_show.iterrows():
         product_id = product['producto_id']
@@ -147,7 +240,7 @@ def show_main_page(df):
                 f"## <a href='/?producto_id={product_id}' target='_self' style='text-decoration:none; color:inherit;'>{display_name}</a>",
                 unsafe_allow_html=True
             )
-            product_data = df[df['producto_id'] == product_id]
+            product_data, _ = load_series(int(product_id), CARD_POINT_BUDGET, CARD_RANGE_DAYS)
 
             if product_data.empty or product_data.shape[0] < 2:
                 st.info("Este producto necesita al menos dos registros para mostrar un gráfico.")
@@ -156,7 +249,8 @@ def show_main_page(df):
                     product_data,
                     x='fecha',
                     y='precio',
-                    markers=True
+                    markers=True,
+                    line_shape='hv'
                 )
                 min_price = product_data['precio'].min()
                 max_price = product_data['precio'].max()
@@ -171,19 +265,16 @@ def show_main_page(df):
 # 1. Asegurar que la BD exista
 database.setup_database()
 
-# 2. Cargar los datos
-data = load_data()
-
-# 3. Obtener parámetros de la URL
+# 2. Obtener parámetros de la URL
 query_params = st.query_params
 
-# 4. Decidir qué página mostrar
+# 3. Decidir qué página mostrar
 if "producto_id" in query_params:
     try:
         product_id = int(query_params.get("producto_id"))
-        show_detail_page(data, product_id)
+        show_detail_page(product_id)
     except ValueError:
         st.error("ID de producto no válido.")
         st.markdown("<a href='/' target='_self'>&larr; Volver a la lista</a>", unsafe_allow_html=True)
 else:
-    show_main_page(data)
\ No newline at end of file
+    show_main_page()
\ No newline at end of file
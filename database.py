@@ -1,9 +1,17 @@
 import sqlite3
 from pathlib import Path
 import logging
+import threading
+import time
 import queue
+from concurrent.futures import Future
 from contextlib import contextmanager
 
+import metrics
+import product_stats
+import stores
+import timestamps
+
 # Configurar un logger para este módulo
 log = logging.getLogger(__name__)
 
@@ -13,20 +21,231 @@ BASE_DIR = Path(__file__).parent
 DB_PATH = BASE_DIR / DB_NAME
 DB_TIMEOUT = 60  # Timeout alto para evitar bloqueos en cargas pesadas
 
+# --- Parámetros del Pool ---
+POOL_MAX_CONNECTIONS = 10
+POOL_WAIT_TIMEOUT = 120  # Espera máx 2 mins por un slot libre
+STATEMENT_CACHE_SIZE = 256  # Sentencias preparadas que sqlite3 mantiene por conexión
+CONN_MAX_USES = 5000  # Reciclar la conexión tras N préstamos
+CONN_MAX_AGE = 30 * 60  # ... o tras M segundos de vida
+HEALTH_CHECK_INTERVAL = 30  # Segundos entre "SELECT 1" de verificación
+
+# Índice cubriente para "último precio de X" y el historial de un producto:
+# evita escanear y ordenar toda la tabla.
+HISTORY_INDEX_SQL = '''
+CREATE INDEX IF NOT EXISTS idx_historial_producto_fecha
+ON HistorialPrecios (producto_id, fecha, precio)
+'''
+
+# Productos que son el mismo ítem de la tienda (ver stores.py) se buscan por (tienda, item_id)
+PRODUCT_ITEM_INDEX_SQL = '''
+CREATE INDEX IF NOT EXISTS idx_productos_item
+ON Productos (tienda, item_id) WHERE item_id IS NOT NULL
+'''
+# Condición "es el producto principal de su ítem" (el de menor id) para un alias de tabla {p}.
+# Los alias no se programan ni se encolan: los actualiza el scraping del principal.
+PRIMARY_PRODUCT_SQL = (
+    "{p}.item_id IS NULL OR {p}.id = (SELECT MIN(A.id) FROM Productos A "
+    "WHERE A.tienda = {p}.tienda AND A.item_id = {p}.item_id)"
+)
+
+# --- Parámetros del Escritor con Group Commit ---
+WRITER_MAX_BATCH = 50  # Máximo de unidades de trabajo por transacción
+WRITER_MAX_DELAY = 0.5  # Segundos que se espera para juntar un lote
+
+
+class PooledConnection:
+    """
+    Envoltura de una conexión prestada por el pool.
+    Se comporta como un sqlite3.Connection, pero close() la devuelve al pool
+    en lugar de cerrarla, para que el código existente (conn.close()) siga funcionando.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    @property
+    def raw(self):
+        """La conexión sqlite3 subyacente (para librerías que exigen el tipo real, ej. pandas)."""
+        return self._conn
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._checkin()
+
 
 class SQLiteConnectionPool:
     """
-    Gestiona un pool de conexiones para SQLite.
-    Permite que múltiples hilos soliciten conexiones sin bloquear el archivo
-    indefinidamente, controlando la concurrencia.
+    Gestiona un pool de conexiones persistentes para SQLite.
+
+    Cada hilo mantiene su propia conexión de larga duración (SQLite no permite
+    compartir una conexión activa entre hilos de forma segura). Los PRAGMAs se
+    aplican una sola vez al crearla y sqlite3 conserva la caché de sentencias
+    preparadas entre usos. Un semáforo limita cuántos hilos usan la BD a la vez.
+
+    Las conexiones se verifican periódicamente ("SELECT 1") y se reciclan tras
+    CONN_MAX_USES préstamos, CONN_MAX_AGE segundos o un error de BD.
     """
 
-    def __init__(self, db_path, max_connections=10):
+    def __init__(self, db_path, max_connections=POOL_MAX_CONNECTIONS, max_uses=CONN_MAX_USES,
+                 max_age=CONN_MAX_AGE, health_check_interval=HEALTH_CHECK_INTERVAL):
         self.db_path = db_path
-        # Usamos una cola para limitar la concurrencia
-        self.slots = queue.Queue(maxsize=max_connections)
-        for _ in range(max_connections):
-            self.slots.put(None)
+        self.max_connections = max_connections
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = {}  # id(conn) -> (hilo dueño, conn)
+        self._stats = {
+            "checkouts": 0, "wait_total": 0.0, "wait_max": 0.0,
+            "hold_total": 0.0, "hold_max": 0.0,
+            "created": 0, "recycled": 0, "health_failures": 0,
+        }
+
+    # --- Ciclo de vida de las conexiones ---
+
+    def _connect(self):
+        # 'file:' => URI (permite BDs en memoria compartidas, ej. 'file:bench?mode=memory&cache=shared')
+        uri = str(self.db_path).startswith("file:")
+        conn = sqlite3.connect(self.db_path, timeout=DB_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE,
+                               check_same_thread=False, uri=uri)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA foreign_keys = ON;")
+
+        state = self._local
+        state.conn = conn
+        state.created_at = time.monotonic()
+        state.last_check = state.created_at
+        state.uses = 0
+        state.broken = False
+
+        with self._lock:
+            self._stats["created"] += 1
+            self._open[id(conn)] = (threading.current_thread(), conn)
+            self._reap_dead_threads()
+        return conn
+
+    def _discard(self, reason):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is None:
+            return
+        log.debug(f"Reciclando conexión de BD ({reason}).")
+        with self._lock:
+            self._open.pop(id(conn), None)
+            self._stats["recycled"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _reap_dead_threads(self):
+        """Cierra conexiones de hilos que ya terminaron. Llamar con self._lock tomado."""
+        for key, (owner, conn) in list(self._open.items()):
+            if not owner.is_alive():
+                del self._open[key]
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def _thread_conn(self):
+        """Devuelve la conexión del hilo actual, reciclándola o verificándola si hace falta."""
+        state = self._local
+        conn = getattr(state, "conn", None)
+        now = time.monotonic()
+
+        if conn is not None:
+            if state.broken:
+                self._discard("error previo")
+            elif state.uses >= self.max_uses:
+                self._discard("máximo de usos")
+            elif now - state.created_at >= self.max_age:
+                self._discard("antigüedad")
+            elif now - state.last_check >= self.health_check_interval:
+                try:
+                    conn.execute("SELECT 1").fetchone()
+                    state.last_check = now
+                except sqlite3.Error as e:
+                    log.warning(f"Conexión de BD no saludable, se reemplaza: {e}")
+                    with self._lock:
+                        self._stats["health_failures"] += 1
+                    self._discard("health check")
+
+        if getattr(state, "conn", None) is None:
+            conn = self._connect()
+        state.uses += 1
+        return state.conn
+
+    # --- Préstamo / devolución ---
+
+    def _checkout(self):
+        state = self._local
+        depth = getattr(state, "depth", 0)
+        if depth > 0:
+            # Uso reentrante en el mismo hilo: misma conexión, sin consumir otro slot
+            state.depth = depth + 1
+            return state.conn
+
+        t0 = time.perf_counter()
+        if not self.slots.acquire(timeout=POOL_WAIT_TIMEOUT):
+            raise sqlite3.OperationalError(f"Timeout esperando una conexión libre del pool ({POOL_WAIT_TIMEOUT}s)")
+        waited = time.perf_counter() - t0
+
+        try:
+            conn = self._thread_conn()
+        except Exception:
+            self.slots.release()
+            raise
+
+        state.depth = 1
+        state.acquired_at = time.perf_counter()
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_total"] += waited
+            self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+        return conn
+
+    def _checkin(self, error=None):
+        state = self._local
+        state.depth -= 1
+        if state.depth > 0:
+            return
+
+        conn = state.conn
+        held = time.perf_counter() - state.acquired_at
+        try:
+            if error is not None and isinstance(error, sqlite3.Error) \
+                    and not isinstance(error, sqlite3.IntegrityError):
+                state.broken = True
+            if conn is not None and conn.in_transaction:
+                # Antes la conexión se cerraba y SQLite descartaba lo no confirmado.
+                # Con conexiones persistentes hay que hacerlo explícito para no retener el lock.
+                log.warning("Transacción sin commit al devolver la conexión al pool. Haciendo rollback.")
+                conn.rollback()
+        except sqlite3.Error:
+            state.broken = True
+        finally:
+            with self._lock:
+                self._stats["hold_total"] += held
+                self._stats["hold_max"] = max(self._stats["hold_max"], held)
+            self.slots.release()
 
     @contextmanager
     def get_conn(self):
@@ -37,39 +256,75 @@ class SQLiteConnectionPool:
                 cursor = conn.cursor()
                 ...
         """
-        token = self.slots.get(timeout=120)  # Espera máx 2 mins por un slot libre
-        conn = None
+        conn = self._checkout()
+        error = None
         try:
-            # En SQLite es mejor crear conexiones nuevas por hilo que compartir objetos
-            conn = sqlite3.connect(self.db_path, timeout=DB_TIMEOUT)
-            conn.execute("PRAGMA journal_mode=WAL;")
-            conn.execute("PRAGMA foreign_keys = ON;")
             yield conn
         except Exception as e:
             log.error(f"Error de BD en el pool: {e}")
-            raise e
+            error = e
+            raise
         finally:
-            if conn:
+            # También con KeyboardInterrupt/GeneratorExit: si no, el slot y la transacción quedan tomados
+            self._checkin(error)
+
+    def acquire(self):
+        """
+        Presta una conexión fuera de un bloque 'with'.
+        Devuelve un PooledConnection: llamar a close() la devuelve al pool.
+        """
+        return PooledConnection(self, self._checkout())
+
+    # --- Observabilidad / mantenimiento ---
+
+    def stats(self):
+        """Estadísticas de espera y retención del pool (tiempos en ms)."""
+        with self._lock:
+            s = dict(self._stats)
+            open_conns = len(self._open)
+        checkouts = s["checkouts"] or 1
+        return {
+            "checkouts": s["checkouts"],
+            "open_connections": open_conns,
+            "created": s["created"],
+            "recycled": s["recycled"],
+            "health_failures": s["health_failures"],
+            "wait_avg_ms": round(s["wait_total"] / checkouts * 1000, 3),
+            "wait_max_ms": round(s["wait_max"] * 1000, 3),
+            "hold_avg_ms": round(s["hold_total"] / checkouts * 1000, 3),
+            "hold_max_ms": round(s["hold_max"] * 1000, 3),
+        }
+
+    def close_all(self):
+        """Cierra todas las conexiones abiertas (ej. al apagar el proceso)."""
+        with self._lock:
+            conns = list(self._open.values())
+            self._open.clear()
+        for _, conn in conns:
+            try:
                 conn.close()
-            self.slots.put(token)  # Liberar el slot
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
 
 
 # --- INSTANCIA GLOBAL DEL POOL ---
-# Esta es la variable que scraper_engine.py estaba buscando y no encontraba
+# Compartida por scraper_engine, bot_manager y cualquier llamador de get_db_conn()
 db_pool = SQLiteConnectionPool(DB_PATH)
 
 
 def setup_database():
     """
-    Configura la BD. Esta función crea las tablas si no existen.
+    Configura la BD. Esta función crea las tablas si no existen y aplica las
+    migraciones versionadas pendientes (ver MIGRATIONS).
     """
     if log.hasHandlers():
         log.info("Asegurando que la base de datos exista y esté actualizada...")
     else:
         print("[Database] Asegurando que la base de datos exista...")
 
-    # Usamos una conexión directa para el setup
-    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
+    # Usamos una conexión directa para el setup ('file:...' => URI, ej. BD en memoria del benchmark)
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT, uri=str(DB_PATH).startswith("file:"))
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA foreign_keys = ON;")
 
@@ -86,32 +341,468 @@ def setup_database():
         precio_objetivo REAL,
         notificacion_objetivo_enviada BOOLEAN DEFAULT 0,
         status TEXT DEFAULT 'ninguno',
-        precio_mas_bajo REAL
+        precio_mas_bajo REAL,
+        ultimo_precio REAL,
+        precio_anterior REAL,
+        ultima_actualizacion INTEGER,
+        volatilidad REAL DEFAULT 0,
+        fallos_consecutivos INTEGER DEFAULT 0,
+        proxima_revision INTEGER
     )
     ''')
-    # Tabla de Historial
+    # Tabla de Historial: una fila por tramo de precio sin cambios (run-length encoding).
+    # fecha = primera vez que se vio el precio, fecha_ultima = última, observaciones = scrapes del tramo.
+    # Todas las fechas de la BD son epoch ms (ver timestamps.py y la migración 1).
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS HistorialPrecios (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         producto_id INTEGER,
         precio REAL,
-        fecha DATETIME,
+        fecha INTEGER,
+        fecha_ultima INTEGER,
+        observaciones INTEGER NOT NULL DEFAULT 1,
         FOREIGN KEY (producto_id) REFERENCES Productos (id) ON DELETE CASCADE
     )
     ''')
+    cursor.execute(HISTORY_INDEX_SQL)
+
+    _migrate_latest_price_columns(cursor)
+    _migrate_scheduling_columns(cursor)
+    _migrate_history_rle(cursor)
+    _migrate_daily_history(cursor)
+    stats_created = _migrate_product_stats(cursor)
+    _migrate_jobs(cursor)
     conn.commit()
+
+    _run_migrations(conn)
+    if stats_created:
+        # Después de las migraciones versionadas: rebuild() lee el historial en el formato actual
+        product_stats.rebuild(cursor)
+        conn.commit()
     conn.close()
 
     if log.hasHandlers():
         log.info(f"Base de datos '{DB_NAME}' lista y optimizada (WAL).")
 
 
+def _ensure_columns(cursor, table, columns):
+    """Añade (ALTER TABLE) las columnas que falten. Devuelve los nombres añadidos."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    added = []
+    for name, decl in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+            added.append(name)
+    return added
+
+
+def _migrate_latest_price_columns(cursor):
+    """
+    Migración: columnas desnormalizadas ultimo_precio / precio_anterior / ultima_actualizacion
+    en Productos. Si se acaban de crear, se rellenan una sola vez desde el historial.
+    """
+    added = _ensure_columns(cursor, "Productos", [
+        ("ultimo_precio", "REAL"),
+        ("precio_anterior", "REAL"),
+        ("ultima_actualizacion", "INTEGER"),
+    ])
+    if not added:
+        return
+
+    log.info(f"Migrando Productos: nuevas columnas {added}. Rellenando desde HistorialPrecios...")
+    cursor.execute('''
+    UPDATE Productos SET
+        ultimo_precio = (SELECT H.precio FROM HistorialPrecios H WHERE H.producto_id = Productos.id
+                         ORDER BY H.fecha DESC LIMIT 1),
+        precio_anterior = (SELECT H.precio FROM HistorialPrecios H WHERE H.producto_id = Productos.id
+                           ORDER BY H.fecha DESC LIMIT 1 OFFSET 1),
+        ultima_actualizacion = (SELECT MAX(H.fecha) FROM HistorialPrecios H WHERE H.producto_id = Productos.id)
+    ''')
+
+
+def _migrate_scheduling_columns(cursor):
+    """
+    Migración: columnas del scheduler adaptativo (volatilidad, fallos_consecutivos,
+    proxima_revision) e índice para sacar los productos vencidos en orden.
+    Los productos existentes quedan con proxima_revision NULL = revisar de inmediato.
+    """
+    _ensure_columns(cursor, "Productos", [
+        ("volatilidad", "REAL DEFAULT 0"),
+        ("fallos_consecutivos", "INTEGER DEFAULT 0"),
+        ("proxima_revision", "INTEGER"),
+    ])
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_productos_proxima_revision
+    ON Productos (proxima_revision)
+    ''')
+
+
+def _migrate_history_rle(cursor):
+    """
+    Migración: historial como tramos de precio (fecha_ultima / observaciones).
+    Si las columnas se acaban de crear, compacta el historial existente: cada serie de
+    registros consecutivos con el mismo precio queda en su primera fila.
+    """
+    added = _ensure_columns(cursor, "HistorialPrecios", [
+        ("fecha_ultima", "INTEGER"),
+        ("observaciones", "INTEGER NOT NULL DEFAULT 1"),
+    ])
+    if not added:
+        return
+
+    antes = cursor.execute("SELECT COUNT(*) FROM HistorialPrecios").fetchone()[0]
+    log.info(f"Migrando HistorialPrecios a tramos de precio ({antes} registros)...")
+    # Un tramo nuevo empieza cada vez que el precio difiere del registro anterior del producto
+    cursor.execute('''
+    CREATE TEMP TABLE _tramos AS
+    WITH ordenado AS (
+        SELECT id, producto_id, precio, fecha,
+               LAG(precio) OVER (PARTITION BY producto_id ORDER BY fecha, id) AS precio_previo
+        FROM HistorialPrecios
+    ),
+    numerado AS (
+        SELECT id, producto_id, fecha,
+               SUM(CASE WHEN precio IS precio_previo THEN 0 ELSE 1 END)
+                   OVER (PARTITION BY producto_id ORDER BY fecha, id ROWS UNBOUNDED PRECEDING) AS tramo
+        FROM ordenado
+    )
+    SELECT producto_id, tramo, MIN(id) AS id, MAX(fecha) AS fecha_ultima, COUNT(*) AS observaciones
+    FROM numerado
+    GROUP BY producto_id, tramo
+    ''')
+    cursor.execute("CREATE UNIQUE INDEX temp._tramos_id ON _tramos (id)")
+    cursor.execute('''
+    UPDATE HistorialPrecios SET
+        fecha_ultima = (SELECT T.fecha_ultima FROM _tramos T WHERE T.id = HistorialPrecios.id),
+        observaciones = (SELECT T.observaciones FROM _tramos T WHERE T.id = HistorialPrecios.id)
+    WHERE id IN (SELECT id FROM _tramos)
+    ''')
+    cursor.execute("DELETE FROM HistorialPrecios WHERE id NOT IN (SELECT id FROM _tramos)")
+    cursor.execute("DROP TABLE _tramos")
+    despues = cursor.execute("SELECT COUNT(*) FROM HistorialPrecios").fetchone()[0]
+    log.info(f"HistorialPrecios compactado: {antes} -> {despues} filas (un VACUUM libera el espacio en disco).")
+
+
+def _migrate_daily_history(cursor):
+    """
+    Migración: nivel diario del historial (ver retention.py). Los tramos viejos de
+    HistorialPrecios se agregan aquí como apertura / mínimo / máximo / cierre por día.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS HistorialDiario (
+        producto_id INTEGER NOT NULL,
+        dia TEXT NOT NULL,
+        apertura REAL,
+        minimo REAL,
+        maximo REAL,
+        cierre REAL,
+        observaciones INTEGER NOT NULL DEFAULT 0,
+        desde INTEGER,
+        hasta INTEGER,
+        PRIMARY KEY (producto_id, dia),
+        FOREIGN KEY (producto_id) REFERENCES Productos (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    ''')
+
+
+def _migrate_product_stats(cursor):
+    """
+    Migración: tablas de estadísticas incrementales por producto (ver product_stats.py).
+    ProductStatsDiario guarda un bucket por producto y día para las ventanas de 7/30 días
+    (solo los últimos 30 días: ver product_stats.expire_rolling).
+    Devuelve True si ProductStats no existía: setup_database la rellena una sola vez
+    desde el historial, ya con las migraciones versionadas aplicadas.
+    """
+    existed = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ProductStats'").fetchone()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ProductStats (
+        producto_id INTEGER PRIMARY KEY,
+        registros INTEGER NOT NULL DEFAULT 0,
+        suma REAL NOT NULL DEFAULT 0,
+        minimo REAL,
+        maximo REAL,
+        ultimo REAL,
+        primera_fecha INTEGER,
+        ultima_fecha INTEGER,
+        ultimo_cambio INTEGER,
+        registros_7d INTEGER DEFAULT 0,
+        suma_7d REAL,
+        minimo_7d REAL,
+        maximo_7d REAL,
+        registros_30d INTEGER DEFAULT 0,
+        suma_30d REAL,
+        minimo_30d REAL,
+        maximo_30d REAL,
+        FOREIGN KEY (producto_id) REFERENCES Productos (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ProductStatsDiario (
+        producto_id INTEGER NOT NULL,
+        dia TEXT NOT NULL,
+        registros INTEGER NOT NULL,
+        suma REAL NOT NULL,
+        minimo REAL,
+        maximo REAL,
+        PRIMARY KEY (producto_id, dia),
+        FOREIGN KEY (producto_id) REFERENCES Productos (id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    ''')
+    return not existed
+
+
+def _migrate_jobs(cursor):
+    """
+    Migración: cola de trabajos de scraping compartida por tracker y bot (ver job_queue.py),
+    con prioridad, lease y reintentos, y registro de workers vivos. Reemplaza tracker.lock.
+    Los tiempos son epoch (REAL) para comparar leases sin parsear fechas.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        producto_id INTEGER NOT NULL,
+        origen TEXT NOT NULL,
+        prioridad INTEGER NOT NULL DEFAULT 0,
+        estado TEXT NOT NULL DEFAULT 'pendiente',
+        intentos INTEGER NOT NULL DEFAULT 0,
+        max_intentos INTEGER NOT NULL DEFAULT 1,
+        grupo INTEGER,
+        creado REAL NOT NULL,
+        disponible_desde REAL NOT NULL,
+        iniciado REAL,
+        terminado REAL,
+        lease_owner TEXT,
+        lease_expira REAL,
+        heartbeat REAL,
+        error TEXT,
+        FOREIGN KEY (producto_id) REFERENCES Productos (id) ON DELETE CASCADE
+    )
+    ''')
+    # Un solo trabajo activo por producto: encolar dos veces no duplica navegadores
+    cursor.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_activo
+    ON Jobs (producto_id) WHERE estado IN ('pendiente', 'en_curso')
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_jobs_cola
+    ON Jobs (estado, prioridad DESC, id)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_jobs_grupo
+    ON Jobs (grupo) WHERE grupo IS NOT NULL
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Workers (
+        nombre TEXT PRIMARY KEY,
+        pid INTEGER,
+        host TEXT,
+        iniciado REAL,
+        heartbeat REAL
+    )
+    ''')
+
+
+# ==========================================================
+# --- Migraciones versionadas (PRAGMA user_version) ---
+# ==========================================================
+# Las _migrate_* de arriba son idempotentes y corren en cada arranque (esquema base).
+# Los cambios de formato de datos, que no se pueden detectar mirando el esquema, van
+# aquí: la migración N se aplica una sola vez y deja user_version = N.
+
+def _migration_epoch_ms(cursor):
+    """Fechas ISO en texto -> epoch ms (INTEGER)."""
+    # DATETIME tiene afinidad NUMERIC: los enteros se guardan como enteros, no hace falta
+    # reconstruir las tablas. El índice se rehace al final (más rápido que actualizarlo fila a fila).
+    to_ms = timestamps.sql_from_iso
+    cursor.execute("DROP INDEX IF EXISTS idx_historial_producto_fecha")
+    cursor.execute(f"""
+    UPDATE HistorialPrecios SET
+        fecha = {to_ms('fecha')},
+        fecha_ultima = {to_ms('COALESCE(fecha_ultima, fecha)')}
+    """)
+    log.info(f"HistorialPrecios: {cursor.rowcount} tramos convertidos a epoch ms.")
+    cursor.execute(HISTORY_INDEX_SQL)
+    cursor.execute(f"UPDATE HistorialDiario SET desde = {to_ms('desde')}, hasta = {to_ms('hasta')}")
+    cursor.execute(f"""
+    UPDATE ProductStats SET
+        primera_fecha = {to_ms('primera_fecha')},
+        ultima_fecha = {to_ms('ultima_fecha')},
+        ultimo_cambio = {to_ms('ultimo_cambio')}
+    """)
+    cursor.execute(f"""
+    UPDATE Productos SET
+        ultima_actualizacion = {to_ms('ultima_actualizacion')},
+        proxima_revision = {to_ms('proxima_revision')}
+    """)
+
+
+def _migration_item_ids(cursor):
+    """Identidad de los productos: item_id de la tienda (ver stores.canonicalize)."""
+    # Las URLs guardadas no se reescriben (siguen funcionando); los productos que resultan
+    # ser el mismo ítem quedan como alias: se revisa solo el de menor id y el resultado
+    # se aplica a todos (scraper_engine._apply_with_aliases)
+    _ensure_columns(cursor, "Productos", [("item_id", "TEXT")])
+    cursor.execute(PRODUCT_ITEM_INDEX_SQL)
+    rows = cursor.execute("SELECT id, url FROM Productos").fetchall()
+    cursor.executemany("UPDATE Productos SET item_id = ? WHERE id = ?",
+                       [(stores.canonicalize(url).item_id, p_id) for p_id, url in rows])
+    primary = PRIMARY_PRODUCT_SQL.format(p="P")
+    aliases = cursor.execute(f"SELECT COUNT(*) FROM Productos P WHERE NOT ({primary})").fetchone()[0]
+    log.info(f"item_id asignado a {len(rows)} productos; {aliases} son alias de otro producto.")
+
+
+# En orden: la versión de la BD es cuántas se aplicaron. Solo se agregan al final.
+MIGRATIONS = [
+    _migration_epoch_ms,
+    _migration_item_ids,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _run_migrations(conn):
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción junto con el
+    nuevo user_version (si falla, la BD queda en la versión anterior). Tracker, bot y
+    dashboard pueden arrancar a la vez: la versión se relee con el lock de escritura tomado.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"La BD está en la versión {version} y este código solo conoce hasta la "
+                           f"{SCHEMA_VERSION}. Actualiza el código antes de usarla.")
+    while version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                migration = MIGRATIONS[version]
+                log.info(f"Aplicando migración {version + 1} ({migration.__name__}): {migration.__doc__}")
+                t0 = time.perf_counter()
+                migration(conn.cursor())
+                version += 1
+                conn.execute(f"PRAGMA user_version = {version}")
+                log.info(f"Migración {version} aplicada en {time.perf_counter() - t0:.1f}s.")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
 def get_db_conn():
     """
-    Establece conexión directa con la BD.
-    Mantenida para compatibilidad con bot_manager.py y funciones simples.
+    Presta una conexión persistente del pool.
+    Mantenida para compatibilidad con bot_manager.py y funciones simples:
+    conn.close() devuelve la conexión al pool en lugar de cerrarla.
     """
-    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA foreign_keys = ON")
-    return conn
\ No newline at end of file
+    return db_pool.acquire()
+
+def run_in_transaction(apply_fn, *args):
+    """
+    Ejecuta apply_fn(cursor, *args) dentro de UNA transacción (BEGIN IMMEDIATE ... COMMIT).
+    Si algo falla se hace rollback completo. Devuelve lo que devuelva apply_fn.
+    """
+    with db_pool.get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = apply_fn(conn.cursor(), *args)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return result
+
+
+class GroupCommitWriter:
+    """
+    Hilo escritor en segundo plano que agrupa unidades de trabajo de varios
+    hilos en una sola transacción (group commit): un fsync por lote en lugar
+    de uno por producto.
+
+    submit(item) devuelve un concurrent.futures.Future con el resultado de
+    apply_fn(cursor, item), resuelto solo después del COMMIT del lote.
+    """
+
+    _STOP = object()
+
+    def __init__(self, apply_fn, max_batch=WRITER_MAX_BATCH, max_delay=WRITER_MAX_DELAY, name="db-writer"):
+        self.apply_fn = apply_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, item):
+        future = Future()
+        self.start()
+        self._queue.put((item, future))
+        return future
+
+    def flush(self, timeout=None):
+        """Bloquea hasta que todo lo encolado hasta ahora esté confirmado en la BD."""
+        return self.submit(None).result(timeout=timeout)
+
+    def stop(self, timeout=None):
+        """Procesa lo pendiente y detiene el hilo."""
+        if self._thread is None:
+            return
+        self._queue.put((self._STOP, None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        # Un flush() (None) o un stop cierran el lote ya: quien espera no paga max_delay
+        while len(batch) < self.max_batch and batch[-1][0] is not self._STOP and batch[-1][0] is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply(self, cursor, item):
+        # None es un marcador de flush(): no escribe nada
+        return None if item is None else self.apply_fn(cursor, item)
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            stop = batch[-1][0] is self._STOP
+            work = [(item, fut) for item, fut in batch if item is not self._STOP]
+            if work:
+                self._write_batch(work)
+            if stop:
+                return
+
+    def _write_batch(self, work):
+        try:
+            with metrics.timed("bd_lote"):
+                results = run_in_transaction(lambda cur: [self._apply(cur, item) for item, _ in work])
+        except Exception as e:
+            # Un elemento malo no debe tumbar el lote: reintentar uno por uno
+            log.error(f"Fallo el lote de {len(work)} escrituras ({e}). Reintentando individualmente...")
+            for item, fut in work:
+                try:
+                    fut.set_result(run_in_transaction(self._apply, item))
+                except Exception as item_error:
+                    fut.set_exception(item_error)
+            return
+
+        self.batches += 1
+        self.items += len(work)
+        for (_, fut), result in zip(work, results):
+            fut.set_result(result)
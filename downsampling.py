@@ -0,0 +1,79 @@
+import numpy as np
+
+# Puntos por serie que se envían al navegador (el gráfico no distingue más)
+DEFAULT_POINT_BUDGET = 300
+
+
+def lttb(x, y, threshold=DEFAULT_POINT_BUDGET):
+    """
+    Largest-Triangle-Three-Buckets: reduce una serie a 'threshold' puntos conservando
+    su forma (picos y caídas). Conserva siempre el primer y el último punto.
+
+    x, y: secuencias numéricas de igual largo, con x ordenado ascendentemente.
+    Devuelve los índices elegidos (np.ndarray), para poder recortar cualquier columna.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Buckets interiores (sin el primer y el último punto)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Promedio del bucket siguiente (o el último punto si no hay más)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Punto del bucket actual que forma el triángulo más grande con 'a' y el promedio
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax_buckets(x, y, n_buckets=DEFAULT_POINT_BUDGET // 2):
+    """
+    Divide el rango de x en intervalos iguales y conserva el mínimo y el máximo de cada uno.
+    Más barato que LTTB y garantiza que ningún precio extremo desaparece del gráfico.
+    Devuelve los índices elegidos en orden.
+    """
+    n = len(x)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    bucket = np.minimum(((x - x[0]) / max(x[-1] - x[0], 1e-9) * n_buckets).astype(int), n_buckets - 1)
+    bounds = np.flatnonzero(np.diff(bucket)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [n]))
+
+    keep = set()
+    for start, end in zip(starts, ends):
+        segment = y[start:end]
+        keep.add(start + int(segment.argmin()))
+        keep.add(start + int(segment.argmax()))
+    keep.update((0, n - 1))
+    return np.array(sorted(keep))
+
+
+def downsample_frame(df, x_col, y_col, budget=DEFAULT_POINT_BUDGET, method="lttb"):
+    """Aplica lttb / minmax a un DataFrame ordenado por x_col y devuelve las filas elegidas."""
+    if len(df) <= budget:
+        return df
+    x = df[x_col]
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("int64")
+    if method == "minmax":
+        idx = minmax_buckets(x.to_numpy(), df[y_col].to_numpy(), budget // 2)
+    else:
+        idx = lttb(x.to_numpy(), df[y_col].to_numpy(), budget)
+    return df.iloc[idx]
@@ -0,0 +1,293 @@
+import os
+import time
+import logging
+import threading
+from webdriver_manager.chrome import ChromeDriverManager
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Constantes del Pool ---
+MAX_PAGE_LOADS = 200  # Reciclar un Chrome tras N cargas de página (fugas de memoria del navegador)
+DRIVER_MAX_AGE = 45 * 60  # ... o tras M segundos de vida
+MAX_IDLE_PER_KEY = 2  # Drivers "calientes" que se conservan por tienda entre ciclos
+
+_chromedriver_path = None
+_resolve_lock = threading.Lock()
+
+
+def resolve_chromedriver_path():
+    """
+    Resuelve la ruta del binario de chromedriver UNA sola vez por proceso.
+    CHROMEDRIVER_PATH en el entorno evita por completo la consulta de red de webdriver-manager.
+    """
+    global _chromedriver_path
+    with _resolve_lock:
+        if _chromedriver_path:
+            return _chromedriver_path
+
+        env_path = os.getenv("CHROMEDRIVER_PATH")
+        if env_path and os.path.exists(env_path):
+            _chromedriver_path = env_path
+        else:
+            try:
+                _chromedriver_path = ChromeDriverManager().install()
+            except Exception as e:
+                log.warning(f"Fallo al resolver chromedriver (red). Reintentando en 5s... Error: {e}")
+                time.sleep(5)
+                _chromedriver_path = ChromeDriverManager().install()
+
+        log.info(f"chromedriver resuelto en: {_chromedriver_path}")
+        return _chromedriver_path
+
+
+class _PooledDriver:
+    """Metadatos de un Chrome del pool."""
+
+    def __init__(self, driver, key):
+        self.driver = driver
+        self.key = key
+        self.created_at = time.monotonic()
+        self.page_loads = 0
+
+
+class DriverPool:
+    """
+    Pool de WebDrivers reutilizables entre ciclos del tracker.
+
+    Los drivers se agrupan por clave (normalmente la tienda) porque cada tienda puede
+    usar un perfil de navegador distinto. Al devolverlos quedan "calientes" para el
+    siguiente ciclo; se reciclan tras MAX_PAGE_LOADS cargas o DRIVER_MAX_AGE segundos
+    y las sesiones caídas se reemplazan al vuelo.
+    """
+
+    def __init__(self, factory, max_page_loads=MAX_PAGE_LOADS, max_age=DRIVER_MAX_AGE,
+                 max_idle_per_key=MAX_IDLE_PER_KEY):
+        self.factory = factory  # factory(key) -> driver o None
+        self.max_page_loads = max_page_loads
+        self.max_age = max_age
+        self.max_idle_per_key = max_idle_per_key
+
+        self._lock = threading.Lock()
+        self._idle = {}  # key -> [_PooledDriver]
+        self._in_use = {}  # id(driver) -> _PooledDriver
+        self._stats = {
+            "created": 0, "creation_failures": 0, "creation_total": 0.0, "creation_max": 0.0,
+            "acquired": 0, "reused": 0, "recycled": 0, "crashed": 0,
+        }
+
+    # --- Préstamo / devolución ---
+
+    def acquire(self, key="default"):
+        """Devuelve un driver vivo para 'key' (reutilizado si hay uno caliente) o None si no se pudo crear."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key) or []
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                break
+            if self._expired(pooled):
+                self._quit(pooled, "recycled")
+                continue
+            if not self._is_alive(pooled):
+                self._quit(pooled, "crashed")
+                continue
+            with self._lock:
+                self._in_use[id(pooled.driver)] = pooled
+                self._stats["acquired"] += 1
+                self._stats["reused"] += 1
+            return pooled.driver
+
+        pooled = self._create(key)
+        if pooled is None:
+            return None
+        with self._lock:
+            self._in_use[id(pooled.driver)] = pooled
+            self._stats["acquired"] += 1
+        return pooled.driver
+
+    def release(self, driver, broken=False):
+        """Devuelve un driver al pool. broken=True (sesión caída) lo descarta."""
+        with self._lock:
+            pooled = self._in_use.pop(id(driver), None)
+        if pooled is None:
+            return
+        if broken:
+            self._quit(pooled, "crashed")
+            return
+        if self._expired(pooled):
+            self._quit(pooled, "recycled")
+            return
+        with self._lock:
+            idle = self._idle.setdefault(pooled.key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(pooled)
+                return
+        self._quit(pooled, None)
+
+    def record_page_load(self, driver):
+        with self._lock:
+            pooled = self._in_use.get(id(driver))
+            if pooled:
+                pooled.page_loads += 1
+
+    # --- Internos ---
+
+    def _create(self, key):
+        t0 = time.perf_counter()
+        driver = self.factory(key)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            if driver is None:
+                self._stats["creation_failures"] += 1
+                return None
+            self._stats["created"] += 1
+            self._stats["creation_total"] += elapsed
+            self._stats["creation_max"] = max(self._stats["creation_max"], elapsed)
+        log.info(f"Nuevo Chrome para '{key}' creado en {elapsed:.1f}s.")
+        return _PooledDriver(driver, key)
+
+    def _expired(self, pooled):
+        return (pooled.page_loads >= self.max_page_loads
+                or time.monotonic() - pooled.created_at >= self.max_age)
+
+    @staticmethod
+    def _is_alive(pooled):
+        try:
+            pooled.driver.current_url  # Falla si la sesión o el proceso de Chrome murieron
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, pooled, reason):
+        if reason:
+            with self._lock:
+                self._stats[reason] += 1
+            log.info(f"Cerrando Chrome de '{pooled.key}' ({reason}, {pooled.page_loads} cargas).")
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    # --- Observabilidad / mantenimiento ---
+
+    def stats(self):
+        """Ocupación del pool y latencia de creación de drivers (ms)."""
+        with self._lock:
+            s = dict(self._stats)
+            idle = {key: len(drivers) for key, drivers in self._idle.items() if drivers}
+            in_use = len(self._in_use)
+        created = s["created"] or 1
+        return {
+            "in_use": in_use,
+            "idle": idle,
+            "created": s["created"],
+            "creation_failures": s["creation_failures"],
+            "creation_avg_ms": round(s["creation_total"] / created * 1000, 1),
+            "creation_max_ms": round(s["creation_max"] * 1000, 1),
+            "acquired": s["acquired"],
+            "reused": s["reused"],
+            "recycled": s["recycled"],
+            "crashed": s["crashed"],
+        }
+
+    def close_all(self):
+        """Cierra todos los drivers inactivos (los prestados se cierran al devolverse)."""
+        with self._lock:
+            idle = [pooled for drivers in self._idle.values() for pooled in drivers]
+            self._idle.clear()
+        for pooled in idle:
+            self._quit(pooled, None)
+
+
+class DriverLease:
+    """
+    Préstamo perezoso de un driver del pool para un worker.
+    Llamarlo devuelve el driver (lo pide al pool la primera vez); invalidate() descarta
+    una sesión caída para que la próxima llamada obtenga una nueva; release() lo devuelve.
+    """
+
+    def __init__(self, pool, key="default"):
+        self.pool = pool
+        self.key = key
+        self.driver = None
+        self.failed = False
+
+    def __call__(self):
+        # Si Chrome no se pudo crear, no reintentar en cada producto del mismo worker
+        if self.driver is None and not self.failed:
+            self.driver = self.pool.acquire(self.key)
+            self.failed = self.driver is None
+        return self.driver
+
+    def invalidate(self):
+        if self.driver is not None:
+            self.pool.release(self.driver, broken=True)
+            self.driver = None
+
+    def release(self):
+        if self.driver is not None:
+            self.pool.release(self.driver)
+            self.driver = None
+
+
+# --- Perfiles de Carga: medición ---
+
+# Bytes transferidos por la navegación + recursos (transferSize es 0 en recursos de otros
+# dominios sin Timing-Allow-Origin, así que es una cota inferior, comparable entre perfiles).
+PAGE_WEIGHT_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let total = nav ? (nav.transferSize || 0) : 0;
+for (const r of resources) { total += (r.transferSize || 0); }
+return [total, resources.length];
+"""
+
+
+class ProfileStats:
+    """
+    Acumula bytes y tiempo por carga de página para cada perfil de navegador,
+    y estima el ahorro contra el perfil base ("default") cuando hay muestras de él.
+    """
+
+    def __init__(self, baseline="default"):
+        self.baseline = baseline
+        self._lock = threading.Lock()
+        self._data = {}  # perfil -> {"pages", "bytes", "seconds", "resources"}
+
+    def record(self, profile, seconds, page_bytes, resources):
+        with self._lock:
+            d = self._data.setdefault(profile, {"pages": 0, "bytes": 0, "seconds": 0.0, "resources": 0})
+            d["pages"] += 1
+            d["bytes"] += page_bytes
+            d["seconds"] += seconds
+            d["resources"] += resources
+
+    def measure(self, profile, driver, seconds):
+        """Lee el peso de la página cargada en 'driver' y lo registra. Nunca lanza excepciones."""
+        try:
+            page_bytes, resources = driver.execute_script(PAGE_WEIGHT_SCRIPT)
+        except Exception:
+            page_bytes, resources = 0, 0
+        self.record(profile, seconds, int(page_bytes or 0), int(resources or 0))
+
+    def report(self):
+        """Promedios por perfil y ahorro (bytes / ms por página) contra el perfil base."""
+        with self._lock:
+            data = {k: dict(v) for k, v in self._data.items()}
+        out = {}
+        for profile, d in data.items():
+            pages = d["pages"] or 1
+            out[profile] = {
+                "pages": d["pages"],
+                "avg_kb": round(d["bytes"] / pages / 1024, 1),
+                "avg_ms": round(d["seconds"] / pages * 1000, 1),
+                "avg_resources": round(d["resources"] / pages, 1),
+            }
+        base = out.get(self.baseline)
+        if base:
+            for profile, r in out.items():
+                if profile != self.baseline:
+                    r["saved_kb"] = round(base["avg_kb"] - r["avg_kb"], 1)
+                    r["saved_ms"] = round(base["avg_ms"] - r["avg_ms"], 1)
+        return out
@@ -0,0 +1,97 @@
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Constantes ---
+HTTP_TIMEOUT = (5, 15)  # (connect, read) en segundos
+POOL_CONNECTIONS = 10  # Hosts distintos con conexiones keep-alive
+POOL_MAXSIZE = 20  # Conexiones por host
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "es-PE,es;q=0.9,en;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Devuelve la sesión HTTP compartida (keep-alive + compresión).
+    Se crea una sola vez por proceso y reutiliza las conexiones TCP/TLS entre productos.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+        return _session
+
+
+def fetch_page(url, timeout=HTTP_TIMEOUT):
+    """
+    Descarga el HTML estático de una URL sin navegador.
+    Devuelve (status_code, texto). El status es None si hubo error de red; el texto es None
+    si la respuesta no es utilizable (4xx/5xx, no-HTML). El motor usa el status para
+    clasificar el fallo (404 = no existe, 403/429 = bloqueo).
+    """
+    try:
+        response = get_session().get(url, timeout=timeout, allow_redirects=True)
+    except requests.RequestException as e:
+        log.warning(f"Fallo HTTP al descargar {url}: {e}")
+        return None, None
+
+    if response.status_code != 200:
+        log.warning(f"HTTP {response.status_code} al descargar {url}")
+        return response.status_code, None
+
+    if "html" not in response.headers.get("Content-Type", "html"):
+        log.warning(f"Respuesta no-HTML ({response.headers.get('Content-Type')}) para {url}")
+        return response.status_code, None
+
+    return response.status_code, response.text
+
+
+def fetch_json(url, params=None, headers=None, timeout=HTTP_TIMEOUT):
+    """
+    GET a un endpoint JSON con la misma sesión (mismo pool de conexiones keep-alive).
+    Devuelve (status_code, datos). El status es None si hubo error de red; los datos son
+    None si la respuesta no es 200 o no es JSON válido.
+    """
+    try:
+        response = get_session().get(url, params=params, timeout=timeout,
+                                     headers={"Accept": "application/json", **(headers or {})})
+    except requests.RequestException as e:
+        log.warning(f"Fallo HTTP al consultar {url}: {e}")
+        return None, None
+
+    if response.status_code != 200:
+        log.warning(f"HTTP {response.status_code} al consultar {url}")
+        return response.status_code, None
+
+    try:
+        return response.status_code, response.json()
+    except ValueError as e:
+        log.warning(f"Respuesta no-JSON de {url}: {e}")
+        return response.status_code, None
+
+
+def close_session():
+    """Cierra las conexiones del pool HTTP (ej. al apagar el proceso)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,244 @@
+import os
+import time
+import asyncio
+import logging
+
+import job_queue
+import rate_limiter
+import repository
+import scraper_engine
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Parámetros de estimación ---
+HISTORY_ALPHA = 0.3  # Peso de la última corrida en el promedio móvil de segundos/producto por tienda
+PRIOR_WEIGHT = 3  # Cuántos productos "vale" la historia antes de confiar solo en lo medido en el trabajo
+
+# --- Pedidos interactivos ---
+INTERACTIVE_TIMEOUT = 300  # Segundos máx. esperando el resultado del botón "Actualizar"
+INTERACTIVE_POLL = 1.0
+
+
+class StoreProgress:
+    """Avance de una tienda dentro de un trabajo (a partir de los Jobs de su grupo)."""
+
+    def __init__(self, store, total):
+        self.store = store
+        self.total = total
+        self.done = 0
+        self.ok = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.started = None
+        self.last_completion = None
+
+    @property
+    def remaining(self):
+        return self.total - self.done - self.cancelled
+
+    def update(self, snapshot):
+        self.total = snapshot["total"]
+        self.ok = snapshot["hecho"]
+        self.failed = snapshot["fallido"]
+        self.cancelled = snapshot["cancelado"]
+        self.done = self.ok + self.failed
+        self.started = snapshot["iniciado"]
+        self.last_completion = snapshot["ultimo_terminado"]
+
+    def seconds_per_item(self, prior):
+        """
+        Segundos de reloj por producto completado en esta tienda. Incluye el ritmo del
+        limitador y la concurrencia, que es lo que determina cuánto falta.
+        Al principio se mezcla con 'prior' (historia de corridas anteriores).
+        """
+        measured = None
+        if self.done and self.started is not None and self.last_completion is not None:
+            measured = (self.last_completion - self.started) / self.done
+        if measured is None:
+            return prior
+        if prior is None:
+            return measured
+        weight = self.done / (self.done + PRIOR_WEIGHT)
+        return weight * measured + (1 - weight) * prior
+
+
+class BulkUpdateJob:
+    """Un /actualizar o una importación: un grupo de trabajos en la cola Jobs, con progreso por tienda."""
+
+    def __init__(self, job_id, products, manager, origen="masivo"):
+        self.id = job_id
+        self.origen = origen  # "masivo" (/actualizar) o "importacion"
+        self.manager = manager
+        self.started = time.time()
+        self.finished = None
+        self.state = "running"  # running | done | cancelled
+        self.cancel_requested = False
+        self.stores = {}
+        for _, _, tienda in products:
+            if tienda not in self.stores:
+                self.stores[tienda] = StoreProgress(tienda, 0)
+            self.stores[tienda].total += 1
+
+    @property
+    def total(self):
+        return sum(s.total for s in self.stores.values())
+
+    @property
+    def done(self):
+        return sum(s.done for s in self.stores.values())
+
+    def update(self, progress):
+        """Aplica una foto de job_queue.group_progress; cierra el trabajo si no queda nada activo."""
+        for store, snapshot in progress.items():
+            self.stores.setdefault(store, StoreProgress(store, 0)).update(snapshot)
+        active = sum(s["pendiente"] + s["en_curso"] for s in progress.values())
+        if self.state == "running" and active == 0:
+            cancelled = any(s["cancelado"] for s in progress.values())
+            self.state = "cancelled" if cancelled or self.cancel_requested else "done"
+            self.finished = time.time()
+            self.manager._learn(self)
+
+    def eta_seconds(self, store=None):
+        """Segundos estimados hasta terminar (una tienda, o el trabajo: las tiendas corren en paralelo)."""
+        if store is not None:
+            progress = self.stores[store]
+            spi = progress.seconds_per_item(self.manager.prior_seconds_per_item(store))
+            return None if spi is None else progress.remaining * spi
+        etas = [self.eta_seconds(name) for name in self.stores]
+        return None if None in etas else max(etas, default=0)
+
+
+class JobManager:
+    """
+    Lado del bot de la cola Jobs: encola /actualizar y los pedidos interactivos y sigue
+    su avance. Si ningún otro worker (tracker) está vivo, arranca un worker propio que
+    consume la cola hasta vaciarla; si el tracker corre, el bot nunca abre navegadores.
+    Conserva, por tienda, un promedio móvil de segundos/producto de los trabajos
+    terminados para estimar el tiempo del siguiente desde el primer momento; al arrancar
+    lo reconstruye desde los grupos terminados que siguen en Jobs (job_queue.group_rates).
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.seconds_per_item_history = {}
+        self._history_loaded = False
+        self.worker = job_queue.JobWorker(f"bot-{os.getpid()}")
+        self._worker_task = None
+
+    def current(self):
+        """El trabajo masivo en curso, si lo hay (solo se permite uno a la vez)."""
+        for job in self.jobs.values():
+            if job.state == "running":
+                return job
+        return None
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def prior_seconds_per_item(self, store):
+        """Historia de la tienda o, si no hay, el ritmo actual de su limitador."""
+        if store in self.seconds_per_item_history:
+            return self.seconds_per_item_history[store]
+        limiter = rate_limiter.get_limiter(store, **scraper_engine.STORE_RATE_LIMITS.get(store, {}))
+        return 1 / limiter.rate if limiter.rate else None
+
+    async def load_history(self):
+        """Siembra la historia por tienda con los trabajos terminados en la BD (una vez por proceso)."""
+        if self._history_loaded:
+            return
+        self._history_loaded = True
+        for store, rates in (await repository.group_rates()).items():
+            if store in self.seconds_per_item_history:
+                continue
+            average = rates[0]
+            for measured in rates[1:]:
+                average = HISTORY_ALPHA * measured + (1 - HISTORY_ALPHA) * average
+            self.seconds_per_item_history[store] = average
+
+    async def ensure_worker(self):
+        """Arranca el worker local solo si no hay otro proceso consumiendo la cola."""
+        if self._worker_task is not None and not self._worker_task.done():
+            self.worker.wake()
+            return
+        if await repository.worker_alive(exclude=self.worker.name):
+            return
+        log.info("No hay un tracker activo: el bot procesará la cola con su propio worker.")
+        self._worker_task = asyncio.create_task(self.worker.run(until_idle=True), name="bot-job-worker")
+
+    async def start(self, products):
+        """Encola un /actualizar completo como un grupo de trabajos."""
+        await self.load_history()
+        job = BulkUpdateJob(int(time.time() * 1000), products, self)
+        await repository.enqueue_jobs([p[0] for p in products], "masivo", job_queue.PRIORITY_BULK, job.id)
+        self.jobs[job.id] = job
+        await self.ensure_worker()
+        log.info(f"Trabajo #{job.id} encolado: {job.total} productos en {len(job.stores)} tiendas.")
+        return job
+
+    async def start_import(self, urls):
+        """
+        Importa URLs en bloque y sigue el primer scraping de las nuevas como un trabajo
+        (mismo progreso por tienda que /actualizar). Devuelve (ImportResult, trabajo o None).
+        """
+        await self.load_history()
+        job_id = int(time.time() * 1000)
+        result = await repository.import_products(urls, job_id)
+        if not result.added:
+            return result, None
+        job = BulkUpdateJob(job_id, result.added, self, origen="importacion")
+        self.jobs[job.id] = job
+        await self.ensure_worker()
+        log.info(f"Importación #{job.id}: {job.total} productos nuevos en {len(job.stores)} tiendas.")
+        return result, job
+
+    async def refresh(self, job):
+        """Actualiza el avance del trabajo desde la BD."""
+        job.update(await repository.group_progress(job.id))
+        if job.state == "running":
+            await self.ensure_worker()
+        return job
+
+    async def cancel(self, job):
+        """Cancela lo pendiente del grupo; lo que ya está en curso termina."""
+        if job.state != "running":
+            return False
+        job.cancel_requested = True
+        cancelled = await repository.cancel_group(job.id)
+        log.warning(f"Trabajo #{job.id} cancelado: {cancelled} productos pendientes descartados.")
+        return True
+
+    async def run_interactive(self, product_id, timeout=INTERACTIVE_TIMEOUT):
+        """
+        Pide un scraping con prioridad interactiva (adelanta al resto de la cola) y espera
+        a que termine el primer intento. Devuelve el estado del trabajo (dict) o None.
+        """
+        ids = await repository.enqueue_jobs([product_id], "interactivo", job_queue.PRIORITY_INTERACTIVE)
+        job_id = ids.get(product_id)
+        if job_id is None:
+            return None
+        await self.ensure_worker()
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = await repository.job_status(job_id)
+            if status is None or status["estado"] not in job_queue.ACTIVE_STATES:
+                return status
+            if status["estado"] == "pendiente" and status["intentos"] > 0:
+                # Primer intento fallido, el reintento queda programado en la cola
+                return status
+            await asyncio.sleep(INTERACTIVE_POLL)
+        log.warning(f"Trabajo {job_id} (producto {product_id}) sigue en cola tras {timeout}s.")
+        return await repository.job_status(job_id)
+
+    def _learn(self, job):
+        for store, progress in job.stores.items():
+            if not progress.done:
+                continue
+            measured = progress.seconds_per_item(None)
+            if measured is None:
+                continue
+            previous = self.seconds_per_item_history.get(store)
+            self.seconds_per_item_history[store] = (
+                measured if previous is None else HISTORY_ALPHA * measured + (1 - HISTORY_ALPHA) * previous
+            )
@@ -0,0 +1,380 @@
+import os
+import time
+import asyncio
+import logging
+import socket
+
+import circuit_breaker
+import database
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Prioridades (mayor = antes) ---
+PRIORITY_INTERACTIVE = 100  # Botón "Actualizar" / alta de producto desde el bot
+PRIORITY_IMPORT = 60  # Primer scraping de productos importados en bloque
+PRIORITY_BULK = 50  # /actualizar
+PRIORITY_SCHEDULED = 10  # Barrido del scheduler adaptativo
+
+# Reintentos por origen. Los trabajos del scheduler no se reintentan aquí:
+# el fallo ya programa la próxima revisión con back-off (scheduler.next_check_at).
+MAX_ATTEMPTS = {"interactivo": 2, "importacion": 2, "masivo": 2, "scheduler": 1}
+RETRY_DELAY = 60  # Segundos antes del primer reintento (se duplica en cada intento)
+
+# --- Leases ---
+# Los tiempos de Jobs/Workers son epoch (REAL) para poder comparar y sumar sin parsear fechas.
+LEASE_SECONDS = 300  # Un trabajo en curso sin heartbeat durante esto vuelve a la cola
+HEARTBEAT_INTERVAL = 60
+WORKER_TIMEOUT = 90  # Un worker sin heartbeat durante esto se considera caído
+POLL_INTERVAL = 5  # Segundos entre consultas a la cola cuando está vacía
+CLAIM_BATCH = 6  # Trabajos por lote: pequeño para que los interactivos no esperen mucho
+PURGE_AFTER = 7 * 24 * 3600  # Trabajos terminados que se conservan (segundos)
+
+ACTIVE_STATES = ("pendiente", "en_curso")
+
+
+# ==========================================================
+# --- Operaciones sobre la cola (reciben una conexión) ---
+# ==========================================================
+
+def enqueue(conn, product_ids, origen, prioridad, grupo=None):
+    """
+    Encola un trabajo de scraping por producto y devuelve {producto_id: job_id}.
+    Si el producto ya tiene un trabajo activo no se duplica: se le sube la prioridad
+    (así una petición interactiva adelanta a un trabajo del scheduler ya encolado).
+    """
+    now = time.time()
+    max_intentos = MAX_ATTEMPTS.get(origen, 1)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany('''
+        INSERT INTO Jobs (producto_id, origen, prioridad, estado, intentos, max_intentos, grupo,
+                          creado, disponible_desde)
+        VALUES (?, ?, ?, 'pendiente', 0, ?, ?, ?, ?)
+        ON CONFLICT (producto_id) WHERE estado IN ('pendiente', 'en_curso') DO UPDATE SET
+            prioridad = MAX(prioridad, excluded.prioridad),
+            max_intentos = MAX(max_intentos, excluded.max_intentos),
+            disponible_desde = MIN(disponible_desde, excluded.disponible_desde),
+            grupo = COALESCE(excluded.grupo, grupo)
+        ''', [(pid, origen, prioridad, max_intentos, grupo, now, now) for pid in product_ids])
+        ids = {}
+        for pid in product_ids:
+            row = conn.execute(
+                "SELECT id FROM Jobs WHERE producto_id = ? AND estado IN ('pendiente', 'en_curso')", (pid,)
+            ).fetchone()
+            if row:
+                ids[pid] = row[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return ids
+
+
+def _reap_expired(conn, now):
+    """Devuelve a la cola (o da por fallidos) los trabajos cuyo lease venció."""
+    cursor = conn.execute('''
+    UPDATE Jobs SET
+        estado = CASE WHEN intentos >= max_intentos THEN 'fallido' ELSE 'pendiente' END,
+        terminado = CASE WHEN intentos >= max_intentos THEN ? ELSE NULL END,
+        error = 'lease vencido (worker caído)',
+        lease_owner = NULL,
+        lease_expira = NULL
+    WHERE estado = 'en_curso' AND lease_expira < ?
+    ''', (now, now))
+    if cursor.rowcount:
+        log.warning(f"{cursor.rowcount} trabajos con lease vencido recuperados.")
+
+
+def claim(conn, worker, limit=CLAIM_BATCH):
+    """
+    Toma hasta 'limit' trabajos pendientes (mayor prioridad primero) con un lease
+    a nombre de 'worker'. Devuelve [(job_id, producto_id, url, tienda)].
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _reap_expired(conn, now)
+        rows = conn.execute('''
+        SELECT J.id, J.producto_id, P.url, P.tienda
+        FROM Jobs J
+        JOIN Productos P ON P.id = J.producto_id
+        WHERE J.estado = 'pendiente' AND J.disponible_desde <= ?
+        ORDER BY J.prioridad DESC, J.id
+        LIMIT ?
+        ''', (now, limit)).fetchall()
+        conn.executemany('''
+        UPDATE Jobs SET
+            estado = 'en_curso',
+            intentos = intentos + 1,
+            lease_owner = ?,
+            lease_expira = ?,
+            heartbeat = ?,
+            iniciado = COALESCE(iniciado, ?)
+        WHERE id = ?
+        ''', [(worker, now + LEASE_SECONDS, now, now, row[0]) for row in rows])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rows
+
+
+def heartbeat(conn, worker):
+    """Renueva el lease de todos los trabajos en curso del worker y su registro en Workers."""
+    now = time.time()
+    conn.execute('''
+    UPDATE Jobs SET lease_expira = ?, heartbeat = ?
+    WHERE lease_owner = ? AND estado = 'en_curso'
+    ''', (now + LEASE_SECONDS, now, worker))
+    conn.execute('''
+    INSERT INTO Workers (nombre, pid, host, iniciado, heartbeat) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (nombre) DO UPDATE SET heartbeat = excluded.heartbeat
+    ''', (worker, os.getpid(), socket.gethostname(), now, now))
+    conn.commit()
+
+
+def complete(conn, job_id, ok, error=None, retry=True, not_before=None):
+    """
+    Cierra un trabajo. Si falló y le quedan intentos (y retry=True) vuelve a la cola con
+    back-off exponencial, nunca antes de not_before (epoch; p. ej. el fin del cooldown
+    del circuito de la tienda). Con retry=False el fallo es definitivo.
+    """
+    now = time.time()
+    if ok:
+        conn.execute('''
+        UPDATE Jobs SET estado = 'hecho', terminado = ?, lease_owner = NULL, lease_expira = NULL, error = NULL
+        WHERE id = ?
+        ''', (now, job_id))
+    else:
+        conn.execute('''
+        UPDATE Jobs SET
+            estado = CASE WHEN ? OR intentos >= max_intentos THEN 'fallido' ELSE 'pendiente' END,
+            terminado = CASE WHEN ? OR intentos >= max_intentos THEN ? ELSE NULL END,
+            disponible_desde = MAX(? + ? * (1 << (intentos - 1)), ?),
+            lease_owner = NULL,
+            lease_expira = NULL,
+            error = ?
+        WHERE id = ?
+        ''', (not retry, not retry, now, now, RETRY_DELAY, not_before or 0, error or "scraping fallido", job_id))
+    conn.commit()
+
+
+def job_status(conn, job_id):
+    row = conn.execute("SELECT estado, intentos, error FROM Jobs WHERE id = ?", (job_id,)).fetchone()
+    return None if row is None else {"estado": row[0], "intentos": row[1], "error": row[2]}
+
+
+def group_progress(conn, grupo):
+    """
+    Avance de un grupo (p. ej. un /actualizar) por tienda:
+    {tienda: {total, hecho, fallido, cancelado, pendiente, en_curso, iniciado, ultimo_terminado}}.
+    """
+    rows = conn.execute('''
+    SELECT P.tienda, J.estado, COUNT(*), MIN(J.iniciado), MAX(J.terminado)
+    FROM Jobs J
+    JOIN Productos P ON P.id = J.producto_id
+    WHERE J.grupo = ?
+    GROUP BY P.tienda, J.estado
+    ''', (grupo,)).fetchall()
+    progress = {}
+    for tienda, estado, count, iniciado, terminado in rows:
+        store = progress.setdefault(tienda, {
+            "total": 0, "hecho": 0, "fallido": 0, "cancelado": 0, "pendiente": 0, "en_curso": 0,
+            "iniciado": None, "ultimo_terminado": None,
+        })
+        store["total"] += count
+        store[estado] += count
+        if iniciado is not None:
+            store["iniciado"] = min(iniciado, store["iniciado"] or iniciado)
+        if terminado is not None and estado in ("hecho", "fallido"):
+            store["ultimo_terminado"] = max(terminado, store["ultimo_terminado"] or terminado)
+    return progress
+
+
+def group_rates(conn):
+    """
+    Segundos de reloj por producto de cada tienda en los grupos ya terminados:
+    {tienda: [segundos, ...]} del grupo más viejo al más nuevo. Es la misma medida que
+    job_manager.StoreProgress, pero sale de la BD, así que sobrevive a un reinicio del bot
+    (mientras purge no borre esos trabajos).
+    """
+    rows = conn.execute('''
+    SELECT P.tienda, J.grupo, COUNT(*), MIN(J.iniciado), MAX(J.terminado)
+    FROM Jobs J
+    JOIN Productos P ON P.id = J.producto_id
+    WHERE J.grupo IS NOT NULL AND J.estado IN ('hecho', 'fallido') AND J.iniciado IS NOT NULL
+      AND J.grupo NOT IN (SELECT grupo FROM Jobs WHERE grupo IS NOT NULL AND estado IN ('pendiente', 'en_curso'))
+    GROUP BY P.tienda, J.grupo
+    ORDER BY J.grupo
+    ''').fetchall()
+    rates = {}
+    for tienda, _, count, iniciado, terminado in rows:
+        if terminado > iniciado:
+            rates.setdefault(tienda, []).append((terminado - iniciado) / count)
+    return rates
+
+
+def cancel_group(conn, grupo):
+    """Cancela los trabajos pendientes de un grupo (los que ya están en curso terminan)."""
+    cursor = conn.execute('''
+    UPDATE Jobs SET estado = 'cancelado', terminado = ?
+    WHERE grupo = ? AND estado = 'pendiente'
+    ''', (time.time(), grupo))
+    conn.commit()
+    return cursor.rowcount
+
+
+def has_active(conn, grupo=None):
+    """
+    True si queda algún trabajo pendiente (aunque sea un reintento con espera) o en curso;
+    con 'grupo', solo los de ese grupo.
+    """
+    if grupo is None:
+        return conn.execute(
+            "SELECT 1 FROM Jobs WHERE estado IN ('pendiente', 'en_curso') LIMIT 1"
+        ).fetchone() is not None
+    return conn.execute(
+        "SELECT 1 FROM Jobs WHERE grupo = ? AND estado IN ('pendiente', 'en_curso') LIMIT 1", (grupo,)
+    ).fetchone() is not None
+
+
+def worker_alive(conn, exclude=None):
+    """True si algún worker (distinto de 'exclude') dio heartbeat hace menos de WORKER_TIMEOUT."""
+    row = conn.execute('''
+    SELECT 1 FROM Workers WHERE heartbeat > ? AND nombre IS NOT ?
+    LIMIT 1
+    ''', (time.time() - WORKER_TIMEOUT, exclude)).fetchone()
+    return row is not None
+
+
+def unregister(conn, worker):
+    """Baja ordenada de un worker: sus trabajos en curso vuelven a la cola de inmediato."""
+    conn.execute('''
+    UPDATE Jobs SET estado = 'pendiente', lease_owner = NULL, lease_expira = NULL, intentos = MAX(intentos - 1, 0)
+    WHERE lease_owner = ? AND estado = 'en_curso'
+    ''', (worker,))
+    conn.execute("DELETE FROM Workers WHERE nombre = ?", (worker,))
+    conn.commit()
+
+
+def purge(conn, older_than=PURGE_AFTER):
+    """Borra trabajos terminados hace más de 'older_than' segundos."""
+    cursor = conn.execute('''
+    DELETE FROM Jobs WHERE estado NOT IN ('pendiente', 'en_curso') AND terminado < ?
+    ''', (time.time() - older_than,))
+    conn.commit()
+    return cursor.rowcount
+
+
+def _with_conn(fn, *args):
+    with database.db_pool.get_conn() as conn:
+        return fn(conn, *args)
+
+
+# ==========================================================
+# --- Worker ---
+# ==========================================================
+
+class JobWorker:
+    """
+    Proceso consumidor de la cola Jobs: toma lotes por prioridad y los ejecuta con
+    scraper_engine.track_products (un pool de drivers por proceso). Mientras trabaja
+    renueva sus leases; si el proceso muere, otro worker recupera sus trabajos al vencer.
+    """
+
+    def __init__(self, name=None, batch_size=CLAIM_BATCH):
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.processed = 0
+        self._wakeup = None
+
+    async def _call(self, fn, *args):
+        return await asyncio.to_thread(_with_conn, fn, *args)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self._call(heartbeat, self.name)
+            except Exception as e:
+                log.warning(f"[{self.name}] Error renovando leases: {e}")
+
+    def wake(self):
+        """Despierta al worker si está esperando con la cola vacía (p. ej. llegó un pedido del bot)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _idle(self, seconds):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def beat(self):
+        """Heartbeat manual (p. ej. mientras el proceso espera sin trabajos)."""
+        await self._call(heartbeat, self.name)
+
+    async def run_once(self):
+        """
+        Toma un lote y lo procesa. Devuelve los producto_id procesados ([] si la cola está vacía).
+        """
+        # Import local: scraper_engine carga Selenium y el bot, que también importa este módulo
+        import scraper_engine
+
+        await self.beat()
+        claimed = await self._call(claim, self.name, self.batch_size)
+        if not claimed:
+            return []
+
+        jobs_by_product = {producto_id: job_id for job_id, producto_id, _, _ in claimed}
+        log.info(f"[{self.name}] Lote de {len(claimed)} trabajos: {sorted(jobs_by_product.values())}")
+        loop = asyncio.get_running_loop()
+        pending_writes = []
+
+        def on_progress(store, producto_id, ok, latency, outcome):
+            job_id = jobs_by_product.pop(producto_id, None)
+            if job_id is None:
+                return
+            retry = outcome in scraper_engine.RETRYABLE_FAILURES
+            # Con el circuito abierto no tiene sentido reintentar antes de la próxima prueba
+            not_before = circuit_breaker.get_breaker(store).retry_at if not ok else None
+            pending_writes.append(loop.run_in_executor(
+                None, _with_conn, complete, job_id, ok, None if ok else outcome, retry, not_before))
+
+        beating = asyncio.create_task(self._heartbeat_loop())
+        try:
+            await scraper_engine.track_products([row[1:] for row in claimed], progress=on_progress)
+        finally:
+            beating.cancel()
+            await asyncio.gather(*pending_writes, return_exceptions=True)
+            # Lo que no reportó progreso (error fatal o cancelación) vuelve a la cola
+            for job_id in jobs_by_product.values():
+                await self._call(complete, job_id, False, "sin resultado")
+
+        self.processed += len(claimed)
+        return [row[1] for row in claimed]
+
+    async def run(self, until_idle=False, on_batch=None, grupo=None):
+        """
+        Bucle del worker. Con until_idle=True termina cuando no queda ningún trabajo activo
+        (los reintentos programados para más tarde también cuentan como activos); con 'grupo',
+        cuando no queda ninguno de ese grupo, aunque la cola tenga trabajos de otros.
+        """
+        self._wakeup = asyncio.Event()
+        await self._call(purge)
+        try:
+            while True:
+                if grupo is not None and not await self._call(has_active, grupo):
+                    return
+                processed = await self.run_once()
+                if processed:
+                    if on_batch is not None:
+                        on_batch(processed)
+                    continue
+                if until_idle and not await self._call(has_active):
+                    return
+                await self._idle(POLL_INTERVAL)
+        finally:
+            await self._call(unregister, self.name)
@@ -0,0 +1,286 @@
+"""
+Instrumentación liviana del pipeline de scraping.
+
+Cada fase del camino caliente (creación de driver, HTTP, navegación, espera del scraper,
+page_source, parseo, escritura en BD, envío a Telegram) registra su duración en un
+histograma por (fase, tienda); los eventos discretos (ruta HTTP/Selenium, resultado,
+aperturas de circuito) son contadores. Todo vive en memoria del proceso:
+
+  - summary() resume las fases (conteo, promedio, p50/p95 aproximados) para el log del ciclo.
+  - serve() expone /metrics en formato de texto de Prometheus (solo localhost). El tracker
+    usa METRICS_PORT y el bot BOT_METRICS_PORT.
+  - sampled_profile() captura un cProfile de un producto completo cada tanto
+    (PROFILE_SAMPLE_RATE) o siempre para los IDs de PROFILE_PRODUCTS.
+
+La tienda de una medición se toma del contexto del hilo (store_context), así los
+scrapers pueden medir sus fases sin saber qué tienda procesan.
+"""
+import io
+import os
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Configuración ---
+load_dotenv()
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sin endpoint
+METRICS_HOST = "127.0.0.1"
+NAMESPACE = "drift"
+# Límites superiores de los buckets (segundos): del parseo (ms) a una navegación lenta
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# --- Perfilado por muestreo ---
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0.01 = 1 de cada 100 productos
+PROFILE_PRODUCTS = {int(p) for p in os.getenv("PROFILE_PRODUCTS", "").split(",") if p.strip().isdigit()}
+PROFILE_DIR = Path(__file__).parent / "logs" / "profiles"
+PROFILE_TOP = 25  # Funciones (por tiempo acumulado) que se copian al log
+
+NO_STORE = "-"
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos (el formato de Prometheus)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Cuantil aproximado: el límite superior del bucket donde cae (None si no hay datos)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Histogramas por (fase, tienda) y contadores por (nombre, etiquetas). Seguro entre hilos."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, phase, seconds, tienda=NO_STORE):
+        with self._lock:
+            histogram = self._histograms.get((phase, tienda))
+            if histogram is None:
+                histogram = self._histograms[(phase, tienda)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def summary(self):
+        """{fase: {tienda: {n, avg_ms, p50_ms, p95_ms}}} para el log de fin de ciclo."""
+        with self._lock:
+            out = {}
+            for (phase, tienda), h in sorted(self._histograms.items()):
+                out.setdefault(phase, {})[tienda] = {
+                    "n": h.count,
+                    "avg_ms": round(h.sum / h.count * 1000, 1),
+                    "p50_ms": round(h.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 1),
+                }
+            return out
+
+    def counters(self):
+        with self._lock:
+            return {(name, labels): value for (name, labels), value in self._counters.items()}
+
+    def render(self):
+        """Texto en formato de exposición de Prometheus (versión 0.0.4)."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            if histograms:
+                name = f"{NAMESPACE}_fase_segundos"
+                lines.append(f"# HELP {name} Duración de cada fase del pipeline de scraping.")
+                lines.append(f"# TYPE {name} histogram")
+                for (phase, tienda), h in histograms:
+                    labels = f'fase="{_escape(phase)}",tienda="{_escape(tienda)}"'
+                    cumulative = 0
+                    for bound, n in zip(h.buckets, h.counts):
+                        cumulative += n
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                    lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+            declared = set()
+            for (counter, labels), value in sorted(self._counters.items()):
+                name = f"{NAMESPACE}_{counter}_total"
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+_context = threading.local()
+
+
+@contextmanager
+def store_context(tienda):
+    """Marca la tienda de las mediciones hechas en este hilo (las fases anidadas la heredan)."""
+    previous = getattr(_context, "tienda", None)
+    _context.tienda = tienda
+    try:
+        yield
+    finally:
+        _context.tienda = previous
+
+
+def current_store():
+    return getattr(_context, "tienda", None) or NO_STORE
+
+
+def observe(phase, seconds, tienda=None):
+    registry.observe(phase, seconds, tienda or current_store())
+
+
+def inc(name, n=1, **labels):
+    """Suma n a un contador. Si no se pasa 'tienda' se usa la del contexto del hilo."""
+    labels.setdefault("tienda", current_store())
+    registry.inc(name, n, **labels)
+
+
+@contextmanager
+def timed(phase, tienda=None):
+    """Mide el bloque y lo registra en el histograma de la fase (también si lanza una excepción)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase, time.perf_counter() - t0, tienda)
+
+
+def summary():
+    return registry.summary()
+
+
+# ==========================================================
+# --- Endpoint de Prometheus ---
+# ==========================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Sin una línea de log por cada scrape de Prometheus
+        pass
+
+
+def serve(port=None, host=METRICS_HOST):
+    """
+    Sirve /metrics en un hilo daemon. Devuelve el servidor o None si no hay puerto
+    configurado o está ocupado (p. ej. el bot y el tracker con el mismo METRICS_PORT).
+    """
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        log.warning(f"No se pudo abrir el endpoint de métricas en {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info(f"Métricas disponibles en http://{host}:{port}/metrics")
+    return server
+
+
+# ==========================================================
+# --- cProfile por muestreo ---
+# ==========================================================
+
+_profile_lock = threading.Lock()  # Un solo perfil a la vez: dos en paralelo se distorsionan
+
+
+@contextmanager
+def sampled_profile(label, key=None):
+    """
+    Perfila el bloque con cProfile si 'key' está en PROFILE_PRODUCTS o al azar con
+    probabilidad PROFILE_SAMPLE_RATE. Guarda el .prof en logs/profiles/ (abrible con
+    snakeviz o pstats) y copia al log las funciones más costosas.
+    cProfile solo ve el hilo actual: se usa dentro del hilo que procesa el producto.
+    """
+    wanted = key in PROFILE_PRODUCTS or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+    if not wanted or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        _dump_profile(profiler, label)
+    finally:
+        _profile_lock.release()
+
+
+def _dump_profile(profiler, label):
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        path = PROFILE_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}_{label}.prof"
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        log.info(f"Perfil de '{label}' guardado en {path}\n{out.getvalue()}")
+        inc("perfiles")
+    except Exception as e:
+        log.warning(f"No se pudo guardar el perfil de '{label}': {e}")
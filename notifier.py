@@ -0,0 +1,295 @@
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import telegram
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+import metrics
+import rate_limiter
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Límites de Telegram ---
+# ~1 mensaje/s por chat y ~30 mensajes/s en total por bot
+PER_CHAT_RATE = 1.0
+GLOBAL_RATE = 25.0
+MAX_MESSAGE_LENGTH = 4000  # Telegram corta en 4096; dejamos margen para el encabezado
+
+# --- Agrupación (digest) ---
+# Las bajadas de precio se retienen hasta que el motor avisa el fin del ciclo (release_digest);
+# DIGEST_MAX_HOLD es el tope por si ese aviso no llega (p. ej. un ciclo que se cae a mitad).
+DIGEST_MAX_HOLD = 600.0
+DIGEST_MIN_ITEMS = 3  # A partir de cuántas bajadas en un mismo chat se envía un resumen
+
+# --- Reintentos ---
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+CLOSE_TIMEOUT = 15  # Segundos que se espera al salir para vaciar la cola
+
+
+@dataclass
+class Notification:
+    """
+    Un mensaje a enviar. Si trae digest_line puede agruparse con otros del mismo chat
+    en un solo resumen; sin digest_line (p. ej. precio objetivo) siempre se envía aparte.
+    """
+    text: str
+    chat_id: Optional[str] = None
+    digest_line: Optional[str] = None
+
+
+class NotificationDispatcher:
+    """
+    Servicio de notificaciones de larga vida.
+
+    Un hilo propio mantiene un event loop y un telegram.Bot inicializado una sola vez
+    (la sesión HTTP se reutiliza). Los workers de scraping solo encolan con enqueue(),
+    que nunca toca la red. Los mensajes sueltos salen de inmediato; las bajadas de precio
+    (con digest_line) se retienen hasta release_digest(), que el motor llama al terminar
+    cada ciclo, y entonces se agrupan en resúmenes. Respeta los límites por chat y
+    globales y reintenta con back-off.
+    """
+
+    _STOP = object()
+    _RELEASE = object()
+
+    def __init__(self, token, default_chat_id, per_chat_rate=PER_CHAT_RATE, global_rate=GLOBAL_RATE,
+                 digest_max_hold=DIGEST_MAX_HOLD, digest_min_items=DIGEST_MIN_ITEMS, max_retries=MAX_RETRIES,
+                 name="notifier"):
+        self.token = token
+        self.default_chat_id = default_chat_id
+        self.per_chat_rate = per_chat_rate
+        self.global_rate = global_rate
+        self.digest_max_hold = digest_max_hold
+        self.digest_min_items = digest_min_items
+        self.max_retries = max_retries
+        self.name = name
+
+        self._thread = None
+        self._loop = None
+        self._queue = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition()
+
+        self.enqueued = 0
+        self.sent = 0
+        self.digests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+
+    # --- API para los productores (cualquier hilo) ---
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._ready.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                self._ready.wait()
+        return self
+
+    def enqueue(self, notification):
+        """Encola un mensaje (str o Notification) y vuelve de inmediato."""
+        if isinstance(notification, str):
+            notification = Notification(text=notification)
+        if notification.chat_id is None:
+            notification.chat_id = self.default_chat_id
+        self.start()
+        with self._idle:
+            self._pending += 1
+            self.enqueued += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, notification)
+
+    def release_digest(self):
+        """Fin de un ciclo: envía las bajadas retenidas (agrupadas si son muchas). No bloquea."""
+        if self._thread is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, self._RELEASE)
+
+    def flush(self, timeout=None):
+        """
+        Envía lo retenido y bloquea hasta que todo lo encolado se haya enviado (o descartado).
+        Devuelve False si vence.
+        """
+        self.release_digest()
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Envía lo pendiente, cierra la sesión del bot y detiene el hilo."""
+        if self._thread is None:
+            return
+        if not self.flush(timeout):
+            log.warning(f"[{self.name}] Se cierra con {self._pending} notificaciones sin enviar.")
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, self._STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "digests": self.digests,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failed": self.failed,
+            "pending": self._pending,
+        }
+
+    # --- Hilo del dispatcher ---
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._ready.set()
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        bot = None
+        if self.token:
+            try:
+                bot = telegram.Bot(token=self.token)
+                await bot.initialize()
+                log.info(f"[{self.name}] Bot de Telegram inicializado.")
+            except Exception as e:
+                log.error(f"[{self.name}] Error inicializando el bot de Telegram: {e}")
+                bot = None
+
+        global_limiter = rate_limiter.AdaptiveRateLimiter(
+            "telegram", rate=self.global_rate, burst=self.global_rate, max_rate=self.global_rate)
+        held = []  # Bajadas de precio del ciclo en curso
+        held_since = None
+        try:
+            while True:
+                timeout = None if held_since is None else max(0.0, held_since + self.digest_max_hold - time.monotonic())
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    log.warning(f"[{self.name}] No llegó el fin del ciclo: se envían {len(held)} bajadas retenidas.")
+                    item = self._RELEASE
+
+                if isinstance(item, Notification):
+                    if item.digest_line:
+                        held.append(item)
+                        held_since = held_since or time.monotonic()
+                        continue
+                    batch = [item]
+                else:
+                    batch, held, held_since = held, [], None
+
+                await self._send_batch(bot, batch, global_limiter)
+                self._done(len(batch))
+                if item is self._STOP:
+                    break
+        finally:
+            if bot is not None:
+                try:
+                    await bot.shutdown()
+                except Exception as e:
+                    log.debug(f"[{self.name}] Error cerrando la sesión del bot: {e}")
+
+    async def _send_batch(self, bot, batch, global_limiter):
+        for chat_id, text in self._build_messages(batch):
+            chat_limiter = rate_limiter.get_limiter(
+                f"telegram:{chat_id}", rate=self.per_chat_rate, burst=1, max_rate=self.per_chat_rate)
+            await chat_limiter.acquire()
+            await global_limiter.acquire()
+            await self._send(bot, chat_id, text, chat_limiter)
+
+    def _done(self, count):
+        with self._idle:
+            self._pending -= count
+            self._idle.notify_all()
+
+    def _build_messages(self, batch):
+        """Convierte un lote en [(chat_id, texto)], resumiendo las bajadas cuando son muchas."""
+        messages = []
+        by_chat = {}
+        for n in batch:
+            by_chat.setdefault(n.chat_id, []).append(n)
+
+        for chat_id, items in by_chat.items():
+            agrupables = [n for n in items if n.digest_line]
+            if len(agrupables) < self.digest_min_items:
+                messages.extend((chat_id, n.text) for n in items)
+                continue
+
+            messages.extend((chat_id, n.text) for n in items if not n.digest_line)
+            self.coalesced += len(agrupables)
+            for chunk in self._chunk_lines([n.digest_line for n in agrupables]):
+                self.digests += 1
+                header = f"📉 **{len(chunk)} productos bajaron de precio**\n\n"
+                messages.append((chat_id, header + "\n".join(chunk)))
+        return messages
+
+    @staticmethod
+    def _chunk_lines(lines):
+        chunk, size = [], 0
+        for line in lines:
+            if chunk and size + len(line) + 1 > MAX_MESSAGE_LENGTH:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line) + 1
+        if chunk:
+            yield chunk
+
+    async def _send(self, bot, chat_id, text, chat_limiter):
+        if bot is None:
+            log.warning(f"Notificación (simulada): {text}")
+            self.sent += 1
+            return
+
+        parse_mode = 'Markdown'
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                metrics.observe("telegram", time.monotonic() - start)
+                chat_limiter.record(time.monotonic() - start, ok=True)
+                self.sent += 1
+                log.info("Notificación de Telegram enviada.")
+                return
+            except RetryAfter as e:
+                # Telegram indica cuánto esperar; además se baja la tasa del chat
+                chat_limiter.record(time.monotonic() - start, ok=False)
+                wait = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+                log.warning(f"[{self.name}] Límite de Telegram alcanzado, reintentando en {wait}s.")
+                await asyncio.sleep(wait)
+            except BadRequest as e:
+                # Títulos con '*' o '_' rompen el Markdown: se reintenta una vez como texto plano
+                if parse_mode and "parse" in str(e).lower():
+                    log.warning(f"[{self.name}] Markdown inválido, reenviando como texto plano.")
+                    parse_mode = None
+                    continue
+                log.error(f"[{self.name}] Telegram rechazó el mensaje: {e}")
+                break
+            except Forbidden as e:
+                log.error(f"[{self.name}] Sin permiso para escribir al chat {chat_id}: {e}")
+                break
+            except (TimedOut, NetworkError) as e:
+                chat_limiter.record(time.monotonic() - start, ok=False)
+                if attempt >= self.max_retries:
+                    log.error(f"[{self.name}] Error de red enviando notificación (sin más reintentos): {e}")
+                    break
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+                log.warning(f"[{self.name}] Error de red ({e}); reintento {attempt + 1} en {delay:.1f}s.")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                log.error(f"Error al enviar notificación: {e}")
+                break
+            self.retries += 1
+            metrics.inc("telegram_reintentos")
+        self.failed += 1
+        metrics.inc("telegram_fallidos")
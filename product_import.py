@@ -0,0 +1,147 @@
+"""
+Alta de productos en bloque: desde un archivo (python add_product.py --archivo urls.txt)
+o desde el bot (/agregar con varias URLs, o un .txt adjunto).
+
+Las URLs se detectan en texto libre y se reducen a su identidad (tienda, URL canónica e
+item_id, ver stores.canonicalize); se descartan las repetidas y las que ya están
+registradas (aunque sea con otra URL del mismo ítem), y las nuevas se insertan con un solo
+executemany en una transacción. Su primer scraping se encola en la cola Jobs como un
+grupo, intercalado por tienda: cada lote que toma el worker trae productos de varias
+tiendas y sus workers por tienda corren en paralelo (ver scraper_engine.track_products).
+"""
+import re
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+import job_queue
+import stores
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+")
+URL_TRAILING_CHARS = ".,;:!?)]}>"  # Puntuación pegada al final de una URL dentro de un texto
+QUERY_CHUNK = 500  # URLs por consulta IN (...) al buscar las ya registradas
+
+
+@dataclass
+class ImportResult:
+    """Resultado de una importación."""
+    added: list = field(default_factory=list)  # [(id, url, tienda)] nuevos, con su primer scraping encolado
+    existing: list = field(default_factory=list)  # [(id, url)] URLs de productos ya registrados
+    unknown: list = field(default_factory=list)  # URLs de tiendas no soportadas
+    repeated: int = 0  # Repetidas dentro del mismo envío
+    grupo: Optional[int] = None  # Grupo de Jobs del primer scraping (progreso con group_progress)
+
+    def added_by_store(self):
+        return Counter(tienda for _, _, tienda in self.added)
+
+
+def extract_urls(text):
+    """URLs de un texto libre (una por línea, separadas por espacios, con texto alrededor...)."""
+    return [match.rstrip(URL_TRAILING_CHARS) for match in URL_PATTERN.findall(text or "")]
+
+
+def _chunks(items, size=QUERY_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def find_existing(conn, identities):
+    """
+    Productos ya registrados para cada identidad: {identity.key: id}. Coinciden por ítem
+    (tienda, item_id), con el producto principal del ítem, o por URL canónica si no hay
+    item_id (las URLs guardadas antes de canonicalizar se comparan ya canonicalizadas).
+    """
+    found = {}
+    items_by_store = {}
+    urls_by_store = {}
+    for identity in identities:
+        if identity.item_id:
+            items_by_store.setdefault(identity.tienda, []).append(identity.item_id)
+        else:
+            urls_by_store.setdefault(identity.tienda, {})[identity.url] = identity.key
+    for tienda, item_ids in items_by_store.items():
+        for chunk in _chunks(item_ids):
+            placeholders = ",".join("?" * len(chunk))
+            for item_id, p_id in conn.execute(f'''
+            SELECT item_id, MIN(id) FROM Productos
+            WHERE tienda = ? AND item_id IN ({placeholders})
+            GROUP BY item_id
+            ''', [tienda, *chunk]):
+                found[(tienda, item_id)] = p_id
+    for tienda, urls in urls_by_store.items():
+        # Sin item_id no hay índice que sirva: se canonicalizan las URLs de la tienda (pocas filas)
+        for p_id, url in conn.execute(
+                "SELECT id, url FROM Productos WHERE tienda = ? AND item_id IS NULL ORDER BY id", (tienda,)):
+            key = urls.get(stores.canonicalize(url).url)
+            if key is not None:
+                found.setdefault(key, p_id)
+    return found
+
+
+def _interleave_by_store(products):
+    """Ordena [(id, url, tienda)] alternando tiendas, para que cada lote de la cola las mezcle."""
+    by_store = {}
+    for product in products:
+        by_store.setdefault(product[2], []).append(product)
+    queues = list(by_store.values())
+    ordered = []
+    for i in range(max((len(q) for q in queues), default=0)):
+        ordered.extend(q[i] for q in queues if i < len(q))
+    return ordered
+
+
+def import_urls(conn, urls, grupo=None, precio_objetivo=None, enqueue=True):
+    """
+    Registra las URLs nuevas y encola su primer scraping (origen 'importacion', grupo 'grupo').
+    Recibe una conexión, como las operaciones de job_queue. Devuelve un ImportResult.
+    """
+    result = ImportResult(grupo=grupo)
+    candidates = {}
+    seen = set()
+    for url in urls:
+        url = url.strip()
+        if not url:
+            continue
+        identity = stores.canonicalize(url)
+        if identity.key in seen:
+            result.repeated += 1
+            continue
+        seen.add(identity.key)
+        if identity.tienda is None:
+            result.unknown.append(url)
+        else:
+            candidates[identity.key] = identity
+
+    if candidates:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known = find_existing(conn, candidates.values())
+            new = [identity for key, identity in candidates.items() if key not in known]
+            result.existing = [(known[key], identity.url) for key, identity in candidates.items() if key in known]
+
+            conn.executemany('''
+            INSERT INTO Productos (url, tienda, item_id, precio_objetivo, status, notificacion_objetivo_enviada)
+            VALUES (?, ?, ?, ?, 'ninguno', 0)
+            ''', [(i.url, i.tienda, i.item_id, precio_objetivo) for i in new])
+            ids = {}
+            for chunk in _chunks([i.url for i in new]):
+                placeholders = ",".join("?" * len(chunk))
+                ids.update(conn.execute(f"SELECT url, id FROM Productos WHERE url IN ({placeholders})", chunk))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        result.added = [(ids[i.url], i.url, i.tienda) for i in new]
+
+    if result.added and enqueue:
+        ordered = _interleave_by_store(result.added)
+        job_queue.enqueue(conn, [p[0] for p in ordered], "importacion", job_queue.PRIORITY_IMPORT, grupo)
+
+    log.info(f"Importación: {len(result.added)} nuevos {dict(result.added_by_store())}, "
+             f"{len(result.existing)} ya registrados, {len(result.unknown)} sin tienda, "
+             f"{result.repeated} repetidos.")
+    return result
@@ -0,0 +1,162 @@
+import datetime
+import logging
+
+import timestamps
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# Ventanas móviles (en días, incluyendo hoy): se miden desde ahora y no desde el último
+# registro, así un producto que dejó de scrapearse no arrastra un "mínimo 30 días" viejo.
+ROLLING_WINDOWS = (7, 30)
+
+STATS_COLUMNS = (
+    "producto_id", "registros", "suma", "minimo", "maximo", "ultimo",
+    "primera_fecha", "ultima_fecha", "ultimo_cambio",
+    "registros_7d", "suma_7d", "minimo_7d", "maximo_7d",
+    "registros_30d", "suma_30d", "minimo_30d", "maximo_30d",
+)
+
+
+def _window_start(days, now=None):
+    """Primer día (YYYY-MM-DD) de una ventana de 'days' días que termina hoy (o en 'now', epoch ms)."""
+    dia = datetime.date.fromtimestamp((now or timestamps.now_ms()) / 1000)
+    return (dia - datetime.timedelta(days=days - 1)).isoformat()
+
+
+def record_price(cursor, producto_id, precio, fecha):
+    """
+    Actualiza ProductStats y el bucket diario con un nuevo precio, dentro de la transacción
+    del llamador. Costo constante: dos upserts por clave primaria y una lectura de como
+    mucho 30 buckets para las ventanas móviles.
+    Devuelve las estadísticas ya actualizadas (dict).
+    """
+    cursor.execute('''
+    INSERT INTO ProductStats (producto_id, registros, suma, minimo, maximo, ultimo,
+                              primera_fecha, ultima_fecha, ultimo_cambio)
+    VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (producto_id) DO UPDATE SET
+        registros = registros + 1,
+        suma = suma + excluded.suma,
+        minimo = MIN(minimo, excluded.minimo),
+        maximo = MAX(maximo, excluded.maximo),
+        ultimo_cambio = CASE WHEN ultimo IS excluded.ultimo THEN ultimo_cambio ELSE excluded.ultima_fecha END,
+        ultimo = excluded.ultimo,
+        ultima_fecha = excluded.ultima_fecha
+    ''', (producto_id, precio, precio, precio, precio, fecha, fecha, fecha))
+
+    cursor.execute('''
+    INSERT INTO ProductStatsDiario (producto_id, dia, registros, suma, minimo, maximo)
+    VALUES (?, ?, 1, ?, ?, ?)
+    ON CONFLICT (producto_id, dia) DO UPDATE SET
+        registros = registros + 1,
+        suma = suma + excluded.suma,
+        minimo = MIN(minimo, excluded.minimo),
+        maximo = MAX(maximo, excluded.maximo)
+    ''', (producto_id, timestamps.day(fecha), precio, precio, precio))
+
+    refresh_rolling(cursor, producto_id, fecha)
+    return get_stats(cursor, producto_id)
+
+
+def refresh_rolling(cursor, producto_id, now=None):
+    """Recalcula las ventanas de 7 y 30 días que terminan hoy desde los buckets diarios (≤ 30 filas)."""
+    valores = []
+    for days in ROLLING_WINDOWS:
+        cursor.execute('''
+        SELECT COALESCE(SUM(registros), 0), SUM(suma), MIN(minimo), MAX(maximo)
+        FROM ProductStatsDiario
+        WHERE producto_id = ? AND dia >= ?
+        ''', (producto_id, _window_start(days, now)))
+        valores.extend(cursor.fetchone())
+    cursor.execute('''
+    UPDATE ProductStats SET
+        registros_7d = ?, suma_7d = ?, minimo_7d = ?, maximo_7d = ?,
+        registros_30d = ?, suma_30d = ?, minimo_30d = ?, maximo_30d = ?
+    WHERE producto_id = ?
+    ''', (*valores, producto_id))
+
+
+def get_stats(cursor, producto_id):
+    """
+    Estadísticas de un producto (dict) o None si aún no tiene precios.
+    Incluye los promedios derivados: promedio, promedio_7d y promedio_30d.
+    """
+    cursor.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM ProductStats WHERE producto_id = ?", (producto_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    stats = dict(zip(STATS_COLUMNS, row))
+    for suffix in ("", "_7d", "_30d"):
+        registros = stats[f"registros{suffix}"]
+        stats[f"promedio{suffix}"] = stats[f"suma{suffix}"] / registros if registros else None
+    return stats
+
+
+def rebuild(cursor):
+    """
+    Reconstruye ProductStats y los buckets diarios desde HistorialPrecios.
+    Se usa una sola vez al crear las tablas (o para reparar), no en el camino normal.
+    Cada fila del historial es un tramo (ver database._migrate_history_rle): pesa tantas
+    observaciones como tenga. Como no se sabe en qué días cayeron las observaciones
+    intermedias, el bucket diario recibe una en el último día del tramo y el resto en el
+    primero; así mínimo y máximo de las ventanas son exactos y los promedios, aproximados.
+    """
+    log.info("Reconstruyendo ProductStats desde HistorialPrecios...")
+    cursor.execute("DELETE FROM ProductStatsDiario")
+    cursor.execute("DELETE FROM ProductStats")
+    inicio = timestamps.sql_day("fecha")
+    fin = timestamps.sql_day("COALESCE(fecha_ultima, fecha)")
+    cursor.execute(f'''
+    INSERT INTO ProductStatsDiario (producto_id, dia, registros, suma, minimo, maximo)
+    SELECT producto_id, dia, SUM(n), SUM(precio * n), MIN(precio), MAX(precio)
+    FROM (
+        SELECT producto_id, precio, {inicio} AS dia,
+               CASE WHEN {fin} = {inicio} THEN observaciones ELSE observaciones - 1 END AS n
+        FROM HistorialPrecios WHERE precio IS NOT NULL
+        UNION ALL
+        SELECT producto_id, precio, {fin}, 1
+        FROM HistorialPrecios
+        WHERE precio IS NOT NULL AND {fin} != {inicio}
+    )
+    WHERE n > 0 AND dia >= ?
+    GROUP BY producto_id, dia
+    ''', (_window_start(max(ROLLING_WINDOWS)),))
+    cursor.execute('''
+    INSERT INTO ProductStats (producto_id, registros, suma, minimo, maximo, primera_fecha, ultima_fecha)
+    SELECT producto_id, SUM(observaciones), SUM(precio * observaciones), MIN(precio), MAX(precio),
+           MIN(fecha), MAX(COALESCE(fecha_ultima, fecha))
+    FROM HistorialPrecios
+    WHERE precio IS NOT NULL
+    GROUP BY producto_id
+    ''')
+    # Último precio y desde cuándo se mantiene: el inicio del último tramo
+    cursor.execute('''
+    UPDATE ProductStats SET (ultimo, ultimo_cambio) = (
+        SELECT H.precio, H.fecha FROM HistorialPrecios H
+        WHERE H.producto_id = ProductStats.producto_id AND H.precio IS NOT NULL
+        ORDER BY H.fecha DESC LIMIT 1
+    )
+    ''')
+    productos = [row[0] for row in cursor.execute("SELECT producto_id FROM ProductStats").fetchall()]
+    for producto_id in productos:
+        refresh_rolling(cursor, producto_id)
+    log.info(f"ProductStats reconstruida para {len(productos)} productos.")
+
+
+def expire_rolling(cursor, now=None):
+    """
+    Recalcula las ventanas de los productos sin registros hoy: sus días viejos van saliendo
+    de las ventanas aunque ya no se scrapeen (los demás se recalcularon hoy al registrar
+    su precio). También borra los buckets diarios que ya no entran en ninguna ventana.
+    La retención lo corre una vez por día. Devuelve cuántos productos tocó.
+    """
+    cursor.execute("DELETE FROM ProductStatsDiario WHERE dia < ?", (_window_start(max(ROLLING_WINDOWS), now),))
+    hoy = timestamps.day_start_ms(_window_start(1, now))
+    productos = [row[0] for row in cursor.execute('''
+    SELECT producto_id FROM ProductStats
+    WHERE ultima_fecha < ? AND (registros_7d > 0 OR registros_30d > 0)
+    ''', (hoy,)).fetchall()]
+    for producto_id in productos:
+        refresh_rolling(cursor, producto_id, now)
+    return len(productos)
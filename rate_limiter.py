@@ -0,0 +1,86 @@
+import time
+import asyncio
+import logging
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Valores por defecto (cortesía con las tiendas) ---
+DEFAULT_RATE = 0.2  # Peticiones por segundo (1 cada 5s)
+DEFAULT_BURST = 1  # Peticiones que se permiten seguidas sin esperar
+DEFAULT_MIN_RATE = 1 / 30  # Nunca más lento que 1 cada 30s
+DEFAULT_MAX_RATE = 1.0  # Nunca más rápido que 1 por segundo
+SLOW_RESPONSE_SECONDS = 20  # Una respuesta más lenta que esto cuenta como señal de saturación
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket por dominio con ajuste adaptativo (AIMD).
+
+    Cada petición consume un token; los tokens se reponen a 'rate' por segundo hasta 'burst'.
+    Tras un error o una respuesta lenta la tasa se reduce a la mitad (back-off); cada éxito
+    rápido la sube un poco, hasta max_rate. Así la cortesía depende de cómo responde el sitio
+    y no de un sleep fijo.
+    """
+
+    def __init__(self, name, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=DEFAULT_MIN_RATE,
+                 max_rate=DEFAULT_MAX_RATE, slow_threshold=SLOW_RESPONSE_SECONDS):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_threshold = slow_threshold
+        self.increase_step = rate * 0.1
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = None  # asyncio.Lock, creado en el loop activo (tracker usa un loop nuevo por ciclo)
+        self._lock_loop = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _get_lock(self):
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def acquire(self):
+        """Espera hasta que haya un token disponible y lo consume."""
+        async with self._get_lock():
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def record(self, latency, ok):
+        """Ajusta la tasa según el resultado de la última petición."""
+        if not ok or latency > self.slow_threshold:
+            new_rate = max(self.min_rate, self.rate / 2)
+            if new_rate < self.rate:
+                log.info(f"[Limiter: {self.name}] Back-off: {self.rate:.3f} -> {new_rate:.3f} req/s "
+                         f"({'error' if not ok else f'lento {latency:.1f}s'}).")
+            self.rate = new_rate
+            # Vaciar el bucket para que la pausa se note de inmediato
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+
+_limiters = {}
+
+
+def get_limiter(name, **config):
+    """Devuelve el limitador de un dominio/tienda (se conserva entre ciclos para recordar la tasa aprendida)."""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters[name] = AdaptiveRateLimiter(name, **config)
+    return limiter
@@ -0,0 +1,226 @@
+import asyncio
+import atexit
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import job_queue
+import product_import
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Parámetros del Repositorio ---
+REPO_MAX_WORKERS = 4  # Hilos dedicados a consultas del bot (el pool de BD los reutiliza por hilo)
+QUERY_TIMEOUT = 10  # Segundos máx. por operación, incluida la espera por el lock de escritura
+IMPORT_TIMEOUT = 60  # Las importaciones en bloque insertan y encolan cientos de filas
+
+
+class RepositoryTimeout(TimeoutError):
+    """La operación no terminó a tiempo (p. ej. el tracker tiene tomado el lock de escritura)."""
+
+
+class DuplicateProduct(sqlite3.IntegrityError):
+    """El ítem ya está registrado (quizás con otra URL): product_id es el producto existente."""
+
+    def __init__(self, product_id):
+        super().__init__(f"ítem ya registrado como producto {product_id}")
+        self.product_id = product_id
+
+
+_executor = ThreadPoolExecutor(max_workers=REPO_MAX_WORKERS, thread_name_prefix="db-repo")
+atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+
+# Conexión en uso por cada operación en curso, para poder interrumpirla al cancelar
+_active = {}
+_active_lock = threading.Lock()
+
+
+def _execute(token, timeout, fn, args):
+    with database.db_pool.get_conn() as conn:
+        # Nunca esperar el lock más que el timeout de la operación (el default del pool es DB_TIMEOUT).
+        # Un poco menos, para que la espera termine con 'database is locked' antes que wait_for.
+        conn.execute(f"PRAGMA busy_timeout = {int(timeout * 900)}")
+        with _active_lock:
+            _active[token] = conn
+        try:
+            return fn(conn, *args)
+        finally:
+            with _active_lock:
+                _active.pop(token, None)
+
+
+async def _run(fn, *args, timeout=None):
+    """
+    Ejecuta fn(conn, *args) en el executor del repositorio sin bloquear el event loop.
+    Si vence el timeout o se cancela la tarea, se interrumpe la consulta en curso
+    (conn.interrupt()) y la tarea todavía en cola se descarta.
+    """
+    timeout = timeout or QUERY_TIMEOUT
+    token = object()
+    future = asyncio.get_running_loop().run_in_executor(_executor, _execute, token, timeout, fn, args)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except sqlite3.OperationalError as e:
+        if "locked" in str(e):
+            log.warning(f"Operación de BD '{fn.__name__}' abandonada: lock de escritura ocupado {timeout}s.")
+            raise RepositoryTimeout(f"{fn.__name__}: BD bloqueada por otro proceso") from e
+        raise
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        with _active_lock:
+            conn = _active.get(token)
+        if conn is not None:
+            conn.interrupt()
+        if isinstance(e, asyncio.TimeoutError):
+            log.warning(f"Operación de BD '{fn.__name__}' cancelada tras {timeout}s.")
+            raise RepositoryTimeout(f"{fn.__name__} excedió {timeout}s") from None
+        raise
+
+
+# ==========================================================
+# --- Consultas (síncronas, se ejecutan en el executor) ---
+# ==========================================================
+
+def _get_product_card(conn, product_id):
+    return conn.execute("""
+        SELECT
+            P.id, P.nombre, P.precio_objetivo, P.status, P.precio_mas_bajo, P.url, P.ultimo_precio,
+            S.minimo_30d, S.suma_30d / NULLIF(S.registros_30d, 0)
+        FROM Productos P
+        LEFT JOIN ProductStats S ON S.producto_id = P.id
+        WHERE P.id = ?
+    """, (product_id,)).fetchone()
+
+
+def _list_page(conn, page, page_size):
+    rows = conn.execute("""
+        SELECT id, nombre, tienda, status, ultimo_precio, precio_objetivo, COUNT(*) OVER () AS total
+        FROM Productos
+        ORDER BY id
+        LIMIT ? OFFSET ?
+    """, (page_size, page * page_size)).fetchall()
+    if rows:
+        return rows, rows[0][-1]
+    # Página fuera de rango (p. ej. tras eliminar productos): solo hace falta el total
+    return [], conn.execute("SELECT COUNT(*) FROM Productos").fetchone()[0]
+
+
+def _all_products(conn):
+    # Sin alias: el scraping del producto principal los actualiza
+    return conn.execute(
+        f"SELECT id, url, tienda FROM Productos P WHERE {database.PRIMARY_PRODUCT_SQL.format(p='P')}"
+    ).fetchall()
+
+
+def _recent_prices(conn, product_id, limit):
+    rows = conn.execute("""
+        SELECT precio FROM HistorialPrecios
+        WHERE producto_id = ?
+        ORDER BY fecha DESC
+        LIMIT ?
+    """, (product_id, limit)).fetchall()
+    return [row[0] for row in reversed(rows)]
+
+
+def _add_product(conn, url):
+    result = product_import.import_urls(conn, [url], enqueue=False)
+    if result.existing:
+        raise DuplicateProduct(result.existing[0][0])
+    if not result.added:
+        raise ValueError(f"Tienda no reconocida: {url}")
+    return result.added[0][0]
+
+
+def _delete_product(conn, product_id):
+    try:
+        cursor = conn.execute("DELETE FROM Productos WHERE id = ?", (product_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cursor.rowcount > 0
+
+
+def _set_target_price(conn, product_id, price):
+    try:
+        cursor = conn.execute(
+            "UPDATE Productos SET precio_objetivo = ?, notificacion_objetivo_enviada = 0 WHERE id = ?",
+            (price, product_id)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cursor.rowcount > 0
+
+
+# ==========================================================
+# --- API asíncrona para los handlers del bot ---
+# ==========================================================
+
+async def get_product_card(product_id):
+    """Datos de la tarjeta de un producto (incluye mínimo y promedio de 30 días) o None."""
+    return await _run(_get_product_card, product_id)
+
+
+async def list_page(page, page_size):
+    """Productos de una página de /lista y el total del catálogo: (filas, total)."""
+    return await _run(_list_page, page, page_size)
+
+
+async def all_products():
+    """Todos los productos (sin alias) como [(id, url, tienda)], el formato de scraper_engine.track_products."""
+    return await _run(_all_products)
+
+
+async def enqueue_jobs(product_ids, origen, prioridad, grupo=None):
+    """Encola trabajos de scraping (ver job_queue.enqueue). Devuelve {producto_id: job_id}."""
+    return await _run(job_queue.enqueue, product_ids, origen, prioridad, grupo)
+
+
+async def job_status(job_id):
+    return await _run(job_queue.job_status, job_id)
+
+
+async def group_progress(grupo):
+    return await _run(job_queue.group_progress, grupo)
+
+
+async def group_rates():
+    return await _run(job_queue.group_rates)
+
+
+async def cancel_group(grupo):
+    return await _run(job_queue.cancel_group, grupo)
+
+
+async def worker_alive(exclude=None):
+    return await _run(job_queue.worker_alive, exclude)
+
+
+async def recent_prices(product_id, limit=5):
+    """Últimos 'limit' precios distintos (tramos del historial), del más antiguo al más reciente."""
+    return await _run(_recent_prices, product_id, limit)
+
+
+async def add_product(url):
+    """
+    Inserta un producto (con su URL canónica) y devuelve su ID. Lanza DuplicateProduct si
+    el ítem ya está registrado, aunque sea con otra URL.
+    """
+    return await _run(_add_product, url)
+
+
+async def import_products(urls, grupo=None, precio_objetivo=None):
+    """Alta en bloque con el primer scraping encolado (ver product_import.import_urls)."""
+    return await _run(product_import.import_urls, urls, grupo, precio_objetivo, timeout=IMPORT_TIMEOUT)
+
+
+async def delete_product(product_id):
+    return await _run(_delete_product, product_id)
+
+
+async def set_target_price(product_id, price):
+    return await _run(_set_target_price, product_id, price)
@@ -0,0 +1,247 @@
+"""
+Retención del historial por niveles.
+
+  1. HistorialPrecios (tramos de precio, resolución completa): últimos FULL_RESOLUTION_DAYS días.
+  2. HistorialDiario (una fila por producto y día: apertura / mínimo / máximo / cierre):
+     lo que sale del nivel 1, hasta DAILY_RETENTION_DAYS días.
+  3. Archivo Parquet (archive/<tienda>/<YYYY-MM>.parquet): los meses completos que salen
+     del nivel 2. Se leen con memory-map (pyarrow) solo para las vistas de largo plazo.
+
+Así la BD que comparten tracker, bot y dashboard no crece sin límite. El último tramo de
+cada producto nunca se mueve: el tracker lo sigue alargando (ver scraper_engine._record_history).
+De paso recalcula las ventanas de 7/30 días de ProductStats de los productos sin registros
+hoy (ver product_stats.expire_rolling).
+
+Uso: el tracker llama a run() una vez por día; también se puede correr a mano:
+    python retention.py [--vacuum]
+"""
+import os
+import re
+import argparse
+import datetime
+import logging
+
+import database
+import product_stats
+import timestamps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dependencia opcional: sin pyarrow no se archiva (los niveles 1 y 2 funcionan igual)
+    pa = pq = None
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Política de Retención ---
+FULL_RESOLUTION_DAYS = 90  # Tramos completos en HistorialPrecios
+DAILY_RETENTION_DAYS = 365  # Filas diarias en la BD antes de pasar al archivo
+RUN_INTERVAL = 24 * 60 * 60  # Cada cuánto lo ejecuta el tracker (segundos)
+BATCH_SIZE = 5000  # Filas por sentencia al borrar lo ya movido
+
+ARCHIVE_DIR = database.BASE_DIR / "archive"
+ARCHIVE_COLUMNS = ("producto_id", "dia", "apertura", "minimo", "maximo", "cierre", "observaciones", "desde", "hasta")
+
+
+def day_cutoff(days, now=None):
+    """Medianoche de hace 'days' días (YYYY-MM-DD): todo lo anterior se mueve de nivel."""
+    now = now or datetime.datetime.now()
+    return (now.date() - datetime.timedelta(days=days)).isoformat()
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# ==========================================================
+# --- Nivel 1 -> 2: tramos a filas diarias ---
+# ==========================================================
+
+def _daily_points(run):
+    """
+    Puntos (producto_id, dia, desde, hasta, precio, observaciones) de un tramo: su inicio y su fin.
+    Las observaciones intermedias se asignan al día de inicio (no se sabe cuándo cayeron).
+    """
+    _, producto_id, precio, desde, hasta, observaciones = run
+    dia_desde, dia_hasta = timestamps.day(desde), timestamps.day(hasta)
+    if dia_hasta == dia_desde:
+        return [(producto_id, dia_desde, desde, hasta, precio, observaciones)]
+    return [
+        (producto_id, dia_desde, desde, desde, precio, max(observaciones - 1, 0)),
+        (producto_id, dia_hasta, hasta, hasta, precio, 1),
+    ]
+
+
+def rollup(cursor, before):
+    """
+    Agrega en HistorialDiario los tramos que terminaron antes de 'before' (YYYY-MM-DD)
+    y los borra de HistorialPrecios, dentro de la transacción del llamador.
+    Devuelve (tramos movidos, filas diarias tocadas).
+    """
+    runs = cursor.execute('''
+    SELECT H.id, H.producto_id, H.precio, H.fecha, COALESCE(H.fecha_ultima, H.fecha), H.observaciones
+    FROM HistorialPrecios H
+    WHERE COALESCE(H.fecha_ultima, H.fecha) < ?
+      AND H.precio IS NOT NULL
+      AND H.id != (SELECT L.id FROM HistorialPrecios L WHERE L.producto_id = H.producto_id
+                   ORDER BY L.fecha DESC LIMIT 1)
+    ORDER BY H.producto_id, H.fecha
+    ''', (timestamps.day_start_ms(before),)).fetchall()
+    if not runs:
+        return 0, 0
+
+    days = {}
+    for run in runs:
+        for producto_id, dia, desde, hasta, precio, n in _daily_points(run):
+            row = days.get((producto_id, dia))
+            if row is None:
+                days[(producto_id, dia)] = [precio, precio, precio, precio, n, desde, hasta]
+                continue
+            if desde < row[5]:
+                row[0], row[5] = precio, desde
+            if hasta > row[6]:
+                row[3], row[6] = precio, hasta
+            row[1] = min(row[1], precio)
+            row[2] = max(row[2], precio)
+            row[4] += n
+
+    # Un día puede recibir tramos en dos corridas distintas (un tramo largo se mueve más tarde)
+    cursor.executemany('''
+    INSERT INTO HistorialDiario (producto_id, dia, apertura, minimo, maximo, cierre, observaciones, desde, hasta)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (producto_id, dia) DO UPDATE SET
+        apertura = CASE WHEN excluded.desde < desde THEN excluded.apertura ELSE apertura END,
+        cierre = CASE WHEN excluded.hasta > hasta THEN excluded.cierre ELSE cierre END,
+        minimo = MIN(minimo, excluded.minimo),
+        maximo = MAX(maximo, excluded.maximo),
+        observaciones = observaciones + excluded.observaciones,
+        desde = MIN(desde, excluded.desde),
+        hasta = MAX(hasta, excluded.hasta)
+    ''', [(producto_id, dia, *values) for (producto_id, dia), values in days.items()])
+
+    for chunk in _chunks([(run[0],) for run in runs]):
+        cursor.executemany("DELETE FROM HistorialPrecios WHERE id = ?", chunk)
+    return len(runs), len(days)
+
+
+# ==========================================================
+# --- Nivel 2 -> 3: meses completos a Parquet ---
+# ==========================================================
+
+def _store_dir(tienda):
+    return ARCHIVE_DIR / re.sub(r"[^\w.-]+", "_", tienda or "desconocida")
+
+
+def archive_path(tienda, month):
+    """Archivo Parquet de una tienda y un mes (YYYY-MM)."""
+    return _store_dir(tienda) / f"{month}.parquet"
+
+
+def _write_partition(path, rows):
+    """Escribe (o completa) un archivo mensual. Reescribir es idempotente: manda la última fila por día."""
+    table = pa.Table.from_pylist([dict(zip(ARCHIVE_COLUMNS, row)) for row in rows])
+    if path.exists():
+        table = pa.concat_tables([pq.read_table(path), table.cast(pq.read_schema(path))])
+    df = table.to_pandas().drop_duplicates(["producto_id", "dia"], keep="last").sort_values(["producto_id", "dia"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def archive(before):
+    """
+    Mueve a Parquet las filas diarias de los meses completos anteriores a 'before'
+    (YYYY-MM-DD). Primero escribe los archivos y después borra de la BD: si se corta
+    a mitad de camino, la próxima corrida reescribe los mismos meses sin duplicar.
+    Devuelve el número de filas archivadas.
+    """
+    if pq is None:
+        log.warning("pyarrow no está instalado: el historial diario no se archiva.")
+        return 0
+
+    first_kept_month = before[:7] + "-01"
+    with database.db_pool.get_conn() as conn:
+        rows = conn.execute(f'''
+        SELECT P.tienda, substr(D.dia, 1, 7), {", ".join("D." + c for c in ARCHIVE_COLUMNS)}
+        FROM HistorialDiario D
+        LEFT JOIN Productos P ON P.id = D.producto_id
+        WHERE D.dia < ?
+        ''', (first_kept_month,)).fetchall()
+    if not rows:
+        return 0
+
+    partitions = {}
+    for tienda, month, *values in rows:
+        partitions.setdefault((tienda, month), []).append(values)
+    for (tienda, month), values in sorted(partitions.items(), key=lambda item: (item[0][0] or "", item[0][1])):
+        _write_partition(archive_path(tienda, month), values)
+        log.info(f"Archivadas {len(values)} filas diarias en {archive_path(tienda, month)}")
+
+    database.run_in_transaction(
+        lambda cursor: cursor.execute("DELETE FROM HistorialDiario WHERE dia < ?", (first_kept_month,)))
+    return len(rows)
+
+
+def read_archive(tienda, producto_id, since=None):
+    """
+    Filas diarias archivadas de un producto (DataFrame con ARCHIVE_COLUMNS), opcionalmente
+    desde 'since' (YYYY-MM-DD). Lee con memory-map y solo los meses necesarios.
+    """
+    import pandas as pd
+
+    store_dir = _store_dir(tienda)
+    if pq is None or not store_dir.is_dir():
+        return pd.DataFrame(columns=ARCHIVE_COLUMNS)
+
+    frames = []
+    for path in sorted(store_dir.glob("*.parquet")):
+        if since and path.stem < since[:7]:
+            continue
+        filters = [("producto_id", "=", producto_id)]
+        if since:
+            filters.append(("dia", ">=", since))
+        table = pq.read_table(path, memory_map=True, filters=filters)
+        if table.num_rows:
+            frames.append(table.to_pandas())
+    if not frames:
+        return pd.DataFrame(columns=ARCHIVE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+# ==========================================================
+# --- Ejecución ---
+# ==========================================================
+
+def run(now=None, vacuum=False):
+    """Aplica la política completa. Devuelve un resumen (dict) para el log."""
+    full_cutoff = day_cutoff(FULL_RESOLUTION_DAYS, now)
+    daily_cutoff = day_cutoff(DAILY_RETENTION_DAYS, now)
+
+    runs, days = database.run_in_transaction(rollup, full_cutoff)
+    archived = archive(daily_cutoff)
+    # Las ventanas de 7/30 días de los productos que ya no se scrapean también avanzan
+    expired = database.run_in_transaction(product_stats.expire_rolling, now and timestamps.to_ms(now))
+    summary = {"tramos_agregados": runs, "dias_afectados": days, "dias_archivados": archived,
+               "ventanas_recalculadas": expired}
+    log.info(f"Retención aplicada (completo desde {full_cutoff}, diario desde {daily_cutoff}): {summary}")
+
+    if vacuum and (runs or archived):
+        # VACUUM reescribe el archivo completo: solo a mano, nunca desde el tracker
+        with database.db_pool.get_conn() as conn:
+            conn.execute("VACUUM")
+        log.info("VACUUM completado.")
+    return summary
+
+
+if __name__ == "__main__":
+    import log_setup
+
+    log = log_setup.setup_logging('retention')
+    parser = argparse.ArgumentParser(description="Aplica la retención por niveles al historial de precios.")
+    parser.add_argument("--vacuum", action="store_true", help="compactar el archivo de la BD al terminar")
+    args = parser.parse_args()
+    database.setup_database()
+    run(vacuum=args.vacuum)
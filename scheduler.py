@@ -0,0 +1,152 @@
+import time
+import heapq
+import random
+import logging
+import database
+import timestamps
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+# --- Política de Intervalos (segundos) ---
+MIN_INTERVAL = 5 * 60  # Productos volátiles o a punto de alcanzar la meta
+MAX_INTERVAL = 24 * 60 * 60  # Productos estables: una vez al día
+NEAR_TARGET_RATIO = 0.05  # "Cerca de la meta" = a menos de 5% del precio objetivo
+NEAR_TARGET_INTERVAL = 10 * 60
+TARGET_ZONE_RATIO = 0.25  # Dentro de este margen el intervalo se acorta proporcionalmente
+VOLATILITY_ALPHA = 0.3  # Peso de la última observación en la media móvil exponencial
+VOLATILITY_WEIGHT = 500  # volatilidad 0.05 (5% por observación) => ~1 revisión por hora
+UNAVAILABLE_FACTOR = 2  # Los no disponibles se revisan con menos frecuencia
+RETRY_BASE = 10 * 60  # Back-off tras fallos: 10min, 20min, 40min...
+RETRY_MAX = 6 * 60 * 60
+JITTER = 0.1  # ±10% para no sincronizar todos los productos
+
+# --- Parámetros del Bucle ---
+RESYNC_INTERVAL = 5 * 60  # Cada cuánto se recarga la cola desde la BD (productos nuevos, metas editadas)
+MAX_BATCH = 50  # Máximo de productos vencidos que se procesan juntos
+
+
+def update_volatility(volatilidad, precio_anterior, precio_actual):
+    """Media móvil exponencial del cambio relativo de precio por observación."""
+    volatilidad = volatilidad or 0.0
+    if not precio_anterior or precio_actual is None:
+        return volatilidad
+    cambio = abs(precio_actual - precio_anterior) / precio_anterior
+    return VOLATILITY_ALPHA * cambio + (1 - VOLATILITY_ALPHA) * volatilidad
+
+
+def next_interval(precio, precio_objetivo, status, volatilidad, fallos):
+    """
+    Segundos hasta la próxima revisión de un producto según su volatilidad,
+    su distancia al precio objetivo, su disponibilidad y su historial de fallos.
+    """
+    if fallos:
+        return min(RETRY_MAX, RETRY_BASE * 2 ** (fallos - 1))
+
+    interval = MAX_INTERVAL / (1 + (volatilidad or 0.0) * VOLATILITY_WEIGHT)
+
+    if precio_objetivo and precio and precio > precio_objetivo:
+        distancia = (precio - precio_objetivo) / precio_objetivo
+        if distancia <= NEAR_TARGET_RATIO:
+            interval = min(interval, NEAR_TARGET_INTERVAL)
+        elif distancia < TARGET_ZONE_RATIO:
+            interval *= distancia / TARGET_ZONE_RATIO
+
+    if status == "no disponible":
+        interval *= UNAVAILABLE_FACTOR
+
+    return max(MIN_INTERVAL, min(MAX_INTERVAL, interval))
+
+
+def next_check_at(precio, precio_objetivo, status, volatilidad, fallos, now=None):
+    """Epoch ms de la próxima revisión (con jitter). 'now' en segundos epoch."""
+    now = now or time.time()
+    interval = next_interval(precio, precio_objetivo, status, volatilidad, fallos)
+    interval *= random.uniform(1 - JITTER, 1 + JITTER)
+    return timestamps.to_ms(now + interval)
+
+
+def _to_timestamp(ms):
+    if not ms:
+        return 0.0  # Nunca revisado: vence de inmediato
+    return ms / 1000
+
+
+class ProductScheduler:
+    """
+    Cola de prioridad (min-heap por proxima_revision) de los productos a revisar.
+    La BD es la fuente de verdad: la cola se recarga cada RESYNC_INTERVAL y tras cada
+    lote se vuelven a leer las fechas que el motor calculó para los productos procesados.
+    """
+
+    def __init__(self, resync_interval=RESYNC_INTERVAL):
+        self.resync_interval = resync_interval
+        self._heap = []  # (vence_ts, producto_id)
+        self._products = {}  # producto_id -> (url, tienda, vence_ts)
+        self._last_resync = 0.0
+
+    def _push(self, p_id, url, tienda, due):
+        self._products[p_id] = (url, tienda, due)
+        heapq.heappush(self._heap, (due, p_id))
+
+    def resync(self):
+        """Reconstruye la cola completa desde Productos (los alias no se programan: ver stores.py)."""
+        with database.db_pool.get_conn() as conn:
+            rows = conn.execute(
+                "SELECT id, url, tienda, proxima_revision FROM Productos P "
+                f"WHERE {database.PRIMARY_PRODUCT_SQL.format(p='P')}"
+            ).fetchall()
+        self._heap = []
+        self._products = {}
+        for p_id, url, tienda, proxima in rows:
+            self._push(p_id, url, tienda, _to_timestamp(proxima))
+        self._last_resync = time.monotonic()
+        log.info(f"Cola de revisión recargada: {len(rows)} productos.")
+
+    def resync_due(self):
+        return time.monotonic() - self._last_resync >= self.resync_interval
+
+    def pop_due(self, now=None, limit=MAX_BATCH):
+        """Saca los productos vencidos (los más atrasados primero). Devuelve [(id, url, tienda)]."""
+        now = now or time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            ts, p_id = heapq.heappop(self._heap)
+            entry = self._products.get(p_id)
+            if entry is None or entry[2] != ts:
+                continue  # Entrada obsoleta (reprogramado o eliminado)
+            url, tienda, _ = entry
+            del self._products[p_id]
+            due.append((p_id, url, tienda))
+        return due
+
+    def reschedule(self, product_ids):
+        """Vuelve a encolar productos ya procesados con la proxima_revision que quedó en la BD."""
+        if not product_ids:
+            return
+        placeholders = ",".join("?" * len(product_ids))
+        with database.db_pool.get_conn() as conn:
+            rows = conn.execute(
+                f"SELECT id, url, tienda, proxima_revision FROM Productos WHERE id IN ({placeholders})",
+                list(product_ids)
+            ).fetchall()
+        for p_id, url, tienda, proxima in rows:
+            due = _to_timestamp(proxima)
+            if due <= time.time():
+                # El motor no lo reprogramó (ej. sin scraper): no reintentar en bucle
+                due = time.time() + MIN_INTERVAL
+            self._push(p_id, url, tienda, due)
+
+    def seconds_until_next(self, now=None):
+        """Segundos hasta el próximo vencimiento (None si la cola está vacía)."""
+        now = now or time.time()
+        while self._heap:
+            ts, p_id = self._heap[0]
+            entry = self._products.get(p_id)
+            if entry is not None and entry[2] == ts:
+                return max(0.0, ts - now)
+            heapq.heappop(self._heap)
+        return None
+
+    def __len__(self):
+        return len(self._products)
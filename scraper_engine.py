@@ -1,24 +1,35 @@
 
 import time
 import sqlite3
-import datetime
 import os
 import asyncio
-import random
 from pathlib import Path
 from dotenv import load_dotenv
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-import telegram
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException, TimeoutException
 import logging
+import atexit
+from dataclasses import dataclass, replace
+from threading import Lock
+from typing import Optional
 
 # --- Importar módulos del proyecto ---
 from scrapers import mercadolibre_scraper
 from scrapers import lacuracao_scraper
+from scrapers import mercadolibre_api
+import circuit_breaker
 import database
+import driver_pool
+import http_fetcher
 import log_setup
+import metrics
+import notifier
+import product_stats
+import rate_limiter
+import scheduler
+import timestamps
 
 # --- Configurar Logger ---
 log = log_setup.setup_logging('scraper_engine')
@@ -33,167 +44,404 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 CHAT_ID = os.getenv("CHAT_ID")
 
 # --- Constantes ---
-LOCK_FILE = database.BASE_DIR / "tracker.lock"
-SCRAPING_WAIT_TIME = 7  # Tiempo base de espera (se puede reducir si usamos waits explícitos en el futuro)
-POST_SCRAPE_SLEEP = 30  # Ya no se usa globalmente, sino dinámico por tienda
-
+# Cada módulo expone parse(driver) y, si SUPPORTS_STATIC_HTML, parse_html(html)
 SCRAPER_DISPATCH = {
-    "MercadoLibre": mercadolibre_scraper.parse,
-    "LaCuracao": lacuracao_scraper.parse,
+    "MercadoLibre": mercadolibre_scraper,
+    "LaCuracao": lacuracao_scraper,
     "Falabella": None, # Placeholder
     "Ripley": None     # Placeholder
 }
 
-# --- Inicialización de Telegram ---
-bot_telegram = None
-if TELEGRAM_TOKEN:
-    try:
-        bot_telegram = telegram.Bot(token=TELEGRAM_TOKEN)
-        log.info("Bot de Telegram inicializado.")
-    except Exception as e:
-        log.error(f"Error inicializando el bot de Telegram: {e}")
-else:
+# Probar primero HTTP sin navegador (STATIC_FETCH=0 fuerza siempre Selenium)
+STATIC_FETCH_ENABLED = os.getenv("STATIC_FETCH", "1") == "1"
+
+# Fuentes por lotes (API JSON de la tienda): resuelven muchos productos por llamada antes
+# de la ruta por producto. Cada módulo expone MULTIGET_MAX, item_id(url) y fetch_items(ids).
+# ITEMS_API=0 las desactiva (todo va por HTML estático / Selenium).
+BATCH_BACKENDS = {
+    "MercadoLibre": mercadolibre_api,
+}
+ITEMS_API_ENABLED = os.getenv("ITEMS_API", "1") == "1"
+
+# --- Concurrencia y Cortesía por Tienda ---
+# Workers (drivers) simultáneos por tienda. El ritmo real lo pone el limitador adaptativo.
+DEFAULT_STORE_CONCURRENCY = 1
+STORE_CONCURRENCY = {
+    "MercadoLibre": 3,
+    "LaCuracao": 2,
+}
+# Parámetros del token bucket por tienda (ver rate_limiter.AdaptiveRateLimiter)
+STORE_RATE_LIMITS = {
+    "MercadoLibre": {"rate": 0.5, "burst": 2, "max_rate": 2.0},
+    "LaCuracao": {"rate": 0.3, "burst": 1},
+}
+# Parámetros del circuit breaker por tienda (ver circuit_breaker.CircuitBreaker)
+STORE_BREAKERS = {}
+
+# --- Clasificación de Resultados ---
+OUTCOME_OK = "ok"
+FAIL_TIMEOUT = "timeout"  # La página (o el elemento clave) no cargó a tiempo
+FAIL_BLOCKED = "bloqueo"  # Captcha, 403/429 o página de verificación anti-bots
+FAIL_PARSE = "parse"  # La página cargó pero no se pudo extraer título/precio
+FAIL_NOT_FOUND = "no_encontrado"  # La publicación ya no existe (404/410)
+FAIL_DRIVER = "driver"  # Chrome se cayó o no hay driver disponible
+FAIL_UNSUPPORTED = "sin_scraper"  # Tienda sin scraper implementado
+FAIL_ERROR = "error"  # Excepción inesperada del motor (BD, bug), no atribuible a la tienda
+FAIL_CIRCUIT_OPEN = "circuito_abierto"  # No se intentó: la tienda tiene el circuito abierto
+
+# Fallos que hablan de la tienda y no del producto: cuentan para el circuit breaker y el limitador
+STORE_FAILURES = {FAIL_TIMEOUT, FAIL_BLOCKED, FAIL_DRIVER}
+# Fallos transitorios: el trabajo vuelve a la cola con back-off exponencial. Los demás
+# (parse, no_encontrado, sin_scraper) no mejoran reintentando en unos minutos.
+RETRYABLE_FAILURES = {FAIL_TIMEOUT, FAIL_BLOCKED, FAIL_DRIVER, FAIL_ERROR, FAIL_CIRCUIT_OPEN}
+
+# Textos que delatan una página de bloqueo / captcha (se buscan en minúsculas)
+BLOCK_MARKERS = (
+    "captcha", "are you a robot", "no soy un robot", "unusual traffic", "tráfico inusual",
+    "access denied", "acceso denegado", "account-verification", "verifica que eres humano",
+)
+# Textos del título de la página cuando la publicación no existe
+NOT_FOUND_MARKERS = ("no existe", "not found", "404", "no encontrada", "no encontramos")
+
+# --- Notificaciones ---
+# Un único dispatcher en segundo plano con sesión persistente del bot. Los workers solo encolan.
+if not TELEGRAM_TOKEN:
     log.warning("TELEGRAM_TOKEN no encontrado.")
 
+_notifier = None
+_notifier_lock = Lock()
 
-# --- Funciones de Notificación (Async) ---
-async def _async_send_message(bot, chat_id, message):
-    try:
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
-        log.info("Notificación de Telegram enviada.")
-    except Exception as e:
-        log.error(f"Error al enviar notificación (async): {e}")
+
+def get_notifier():
+    """Devuelve el dispatcher de notificaciones (se crea una vez por proceso)."""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = notifier.NotificationDispatcher(TELEGRAM_TOKEN, CHAT_ID)
+            atexit.register(_notifier.close)
+        return _notifier
 
 
 def send_telegram_notification(message):
-    if not bot_telegram:
-        log.warning(f"Notificación (simulada): {message}")
-        return
+    """Encola un mensaje (str o notifier.Notification); no espera a la red."""
     try:
-        # Creamos un loop temporal si no existe, o usamos el actual
-        try:
-            loop = asyncio.get_running_loop()
-            loop.create_task(_async_send_message(bot_telegram, CHAT_ID, message))
-        except RuntimeError:
-            asyncio.run(_async_send_message(bot_telegram, CHAT_ID, message))
+        get_notifier().enqueue(message)
     except Exception as e:
         log.error(f"Error general en send_telegram_notification: {e}")
 
 
-# --- Funciones de Base de Datos ---
-def update_product_name(producto_id, nombre):
-    with database.db_pool.get_conn() as conn:
-        conn.execute("UPDATE Productos SET nombre = ? WHERE id = ?", (nombre, producto_id))
-        conn.commit()
+# --- Escritura de Resultados (Unit of Work) ---
+# Con GROUP_COMMIT=1 un hilo escritor agrupa los resultados de todas las tiendas
+# en lotes (un solo commit por lote). Por defecto cada resultado es su propia transacción.
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0") == "1"
 
+_writer = None
+_writer_lock = Lock()
 
-def save_price(producto_id, precio):
-    with database.db_pool.get_conn() as conn:
-        fecha_iso = datetime.datetime.now().isoformat()
-        conn.execute("INSERT INTO HistorialPrecios (producto_id, precio, fecha) VALUES (?, ?, ?)",
-                     (producto_id, precio, fecha_iso))
-        conn.commit()
-    log.info(f"Nuevo precio guardado: S/ {precio}")
 
+class ScrapeFailure(Exception):
+    """Fallo de scraping ya clasificado (kind es uno de los FAIL_*)."""
 
-def update_product_status(producto_id, status):
-    if not status or status == 'ninguno':
-        return
-    with database.db_pool.get_conn() as conn:
-        conn.execute("UPDATE Productos SET status = ? WHERE id = ?", (status, producto_id))
-        conn.commit()
-    log.info(f"Status actualizado a: {status}")
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
 
 
-def check_and_notify(producto_id, nombre_producto, precio_actual, producto_url, nuevo_status):
-    with database.db_pool.get_conn() as conn:
-        cursor = conn.cursor()
+@dataclass
+class ScrapeResult:
+    """Lo que devolvió un scraper para un producto, listo para persistir."""
+    producto_id: int
+    url: str
+    titulo: Optional[str]
+    precio: Optional[float]
+    status: Optional[str]
+
 
+def _record_history(cursor, producto_id, precio, fecha):
+    """
+    Historial por tramos: si el precio no cambió desde el último tramo solo se alarga
+    (fecha_ultima, observaciones); si cambió se abre un tramo nuevo.
+    """
+    cursor.execute("""
+        UPDATE HistorialPrecios SET fecha_ultima = ?, observaciones = observaciones + 1
+        WHERE id = (SELECT id FROM HistorialPrecios WHERE producto_id = ? ORDER BY fecha DESC LIMIT 1)
+          AND precio = ?
+    """, (fecha, producto_id, precio))
+    if cursor.rowcount == 0:
         cursor.execute("""
-            SELECT precio_inicial, precio_objetivo, notificacion_objetivo_enviada, precio_mas_bajo
-            FROM Productos WHERE id = ?
-        """, (producto_id,))
-        datos = cursor.fetchone()
+            INSERT INTO HistorialPrecios (producto_id, precio, fecha, fecha_ultima, observaciones)
+            VALUES (?, ?, ?, ?, 1)
+        """, (producto_id, precio, fecha, fecha))
 
-        if not datos:
-            log.error(f"No se pudieron leer los datos del producto ID {producto_id} para notificar.")
-            return
 
-        precio_inicial, precio_objetivo, notificacion_enviada, precio_mas_bajo = datos
-
-        cursor.execute("SELECT precio FROM HistorialPrecios WHERE producto_id = ? ORDER BY fecha DESC LIMIT 2",
-                       (producto_id,))
-        precios = cursor.fetchall()
-        precio_anterior = None
-        if len(precios) > 1:
-            precio_anterior = precios[1][0]
-
-        if precio_inicial is None:
-            cursor.execute("UPDATE Productos SET precio_inicial = ? WHERE id = ?", (precio_actual, producto_id))
-            conn.commit()
-            log.info(f"Se guardó el precio inicial: S/ {precio_actual}")
-
-        if precio_mas_bajo is None or precio_actual < precio_mas_bajo:
-            precio_mas_bajo = precio_actual
-            cursor.execute("UPDATE Productos SET precio_mas_bajo = ? WHERE id = ?", (precio_mas_bajo, producto_id))
-            conn.commit()
-            log.info(f"¡Nuevo precio más bajo registrado: S/ {precio_mas_bajo}!")
-
-        precio_mas_bajo_str = f"S/ {precio_mas_bajo}" if precio_mas_bajo else "N/A"
-        status_str = nuevo_status.capitalize() if nuevo_status else "Ninguno"
-
-        if precio_objetivo is not None and precio_actual <= precio_objetivo:
-            if not notificacion_enviada:
-                mensaje = (
-                    f"🎯 **¡PRECIO OBJETIVO ALCANZADO!** 🎯\n\n"
-                    f"Producto: *{nombre_producto}*\n"
-                    f"Status: *{status_str}*\n\n"
-                    f"Precio Objetivo: S/ {precio_objetivo}\n"
-                    f"**Precio Nuevo: S/ {precio_actual}**\n"
-                    f"Precio Más Bajo: {precio_mas_bajo_str}\n\n"
-                    f"[Ver Producto]({producto_url})"
-                )
-                send_telegram_notification(mensaje)
-                cursor.execute("UPDATE Productos SET notificacion_objetivo_enviada = 1 WHERE id = ?", (producto_id,))
-                conn.commit()
-        elif precio_anterior is not None and precio_actual < precio_anterior:
-            mensaje = (
+def _apply_scrape_result(cursor, result, notify_drops=True):
+    """
+    Aplica UN resultado de scraping dentro de la transacción actual:
+    historial, nombre, status, precio inicial, precio más bajo, último/anterior precio,
+    flag de notificación y la próxima revisión programada (volatilidad / fallos).
+    Un resultado sin título, precio ni status "no disponible" cuenta como fallo.
+    Devuelve la lista de mensajes a notificar (se envían después del COMMIT); con
+    notify_drops=False solo el de precio objetivo.
+    """
+    nuevo_status = result.status if result.status and result.status != 'ninguno' else None
+
+    # ultimo_precio se mantiene en Productos: no hace falta leer el historial
+    cursor.execute("""
+        SELECT precio_inicial, precio_objetivo, notificacion_objetivo_enviada, precio_mas_bajo, ultimo_precio,
+               status, volatilidad, fallos_consecutivos
+        FROM Productos WHERE id = ?
+    """, (result.producto_id,))
+    datos = cursor.fetchone()
+
+    if not datos:
+        log.error(f"No se pudieron leer los datos del producto ID {result.producto_id} para notificar.")
+        return []
+
+    (precio_inicial, precio_objetivo, notificacion_enviada, precio_mas_bajo, precio_anterior,
+     status_actual, volatilidad, fallos) = datos
+
+    if not (result.titulo and result.precio):
+        if result.status == "no disponible":
+            # Caso especial: solo se actualiza el status, sin tocar precio ni nombre.
+            proxima = scheduler.next_check_at(precio_anterior, precio_objetivo, result.status, volatilidad, 0)
+            cursor.execute("UPDATE Productos SET status = ?, fallos_consecutivos = 0, proxima_revision = ? WHERE id = ?",
+                           (result.status, proxima, result.producto_id))
+        else:
+            # Fallo de scraping: back-off exponencial de la próxima revisión
+            fallos = (fallos or 0) + 1
+            proxima = scheduler.next_check_at(precio_anterior, precio_objetivo, status_actual, volatilidad, fallos)
+            cursor.execute("UPDATE Productos SET fallos_consecutivos = ?, proxima_revision = ? WHERE id = ?",
+                           (fallos, proxima, result.producto_id))
+        return []
+
+    precio_actual = result.precio
+
+    fecha = timestamps.now_ms()
+    _record_history(cursor, result.producto_id, precio_actual, fecha)
+    stats = product_stats.record_price(cursor, result.producto_id, precio_actual, fecha)
+
+    if precio_inicial is None:
+        log.info(f"Se guardará el precio inicial: S/ {precio_actual}")
+
+    if precio_mas_bajo is None or precio_actual < precio_mas_bajo:
+        log.info(f"¡Nuevo precio más bajo registrado: S/ {precio_actual}!")
+    precio_mas_bajo = stats["minimo"]
+
+    objetivo_alcanzado = precio_objetivo is not None and precio_actual <= precio_objetivo
+    notificar_objetivo = objetivo_alcanzado and not notificacion_enviada
+
+    volatilidad = scheduler.update_volatility(volatilidad, precio_anterior, precio_actual)
+    proxima = scheduler.next_check_at(precio_actual, precio_objetivo, nuevo_status or status_actual, volatilidad, 0)
+
+    cursor.execute("""
+        UPDATE Productos SET
+            nombre = ?,
+            status = COALESCE(?, status),
+            precio_inicial = COALESCE(precio_inicial, ?),
+            precio_mas_bajo = ?,
+            notificacion_objetivo_enviada = CASE WHEN ? THEN 1 ELSE notificacion_objetivo_enviada END,
+            precio_anterior = ultimo_precio,
+            ultimo_precio = ?,
+            ultima_actualizacion = ?,
+            volatilidad = ?,
+            fallos_consecutivos = 0,
+            proxima_revision = ?
+        WHERE id = ?
+    """, (result.titulo, nuevo_status, precio_actual, precio_mas_bajo, notificar_objetivo,
+          precio_actual, fecha, volatilidad, proxima, result.producto_id))
+
+    precio_mas_bajo_str = f"S/ {precio_mas_bajo}" if precio_mas_bajo else "N/A"
+    status_str = result.status.capitalize() if result.status else "Ninguno"
+
+    if notificar_objetivo:
+        return [(
+            f"🎯 **¡PRECIO OBJETIVO ALCANZADO!** 🎯\n\n"
+            f"Producto: *{result.titulo}*\n"
+            f"Status: *{status_str}*\n\n"
+            f"Precio Objetivo: S/ {precio_objetivo}\n"
+            f"**Precio Nuevo: S/ {precio_actual}**\n"
+            f"Precio Más Bajo: {precio_mas_bajo_str}\n\n"
+            f"[Ver Producto]({result.url})"
+        )]
+    if notify_drops and not objetivo_alcanzado and precio_anterior is not None and precio_actual < precio_anterior:
+        # Las bajadas pueden resumirse en un solo mensaje si llegan muchas en el mismo ciclo
+        return [notifier.Notification(
+            text=(
                 f"📉 **¡Bajó de precio!**\n\n"
-                f"Producto: *{nombre_producto}*\n"
+                f"Producto: *{result.titulo}*\n"
                 f"Status: *{status_str}*\n\n"
                 f"Precio Anterior: S/ {precio_anterior}\n"
                 f"**Precio Nuevo: S/ {precio_actual}**\n"
-                f"Precio Más Bajo: {precio_mas_bajo_str}\n\n"
-                f"[Ver Producto]({producto_url})"
-            )
-            send_telegram_notification(mensaje)
+                f"Precio Más Bajo: {precio_mas_bajo_str}\n"
+                f"Mínimo 30 días: S/ {stats['minimo_30d']}\n\n"
+                f"[Ver Producto]({result.url})"
+            ),
+            digest_line=f"• *{result.titulo}*: S/ {precio_anterior} → **S/ {precio_actual}** ([ver]({result.url}))",
+        )]
+    return []
+
+
+def _apply_with_aliases(cursor, result):
+    """
+    Aplica el resultado al producto y a sus alias: otros productos del mismo ítem de la
+    tienda registrados con otra URL (ver stores.canonicalize). Un solo scraping los
+    actualiza a todos; cada alias conserva su meta y su aviso de precio objetivo, y la
+    bajada de precio se avisa una sola vez.
+    """
+    mensajes = _apply_scrape_result(cursor, result)
+    aliases = cursor.execute("""
+        SELECT A.id, A.url FROM Productos P
+        JOIN Productos A ON A.tienda = P.tienda AND A.item_id = P.item_id AND A.id != P.id
+        WHERE P.id = ?
+    """, (result.producto_id,)).fetchall()
+    for alias_id, alias_url in aliases:
+        mensajes += _apply_scrape_result(cursor, replace(result, producto_id=alias_id, url=alias_url),
+                                         notify_drops=False)
+    return mensajes
+
+
+def _dispatch_notifications(mensajes):
+    for mensaje in mensajes:
+        send_telegram_notification(mensaje)
+
+
+def _on_result_committed(future):
+    """Callback del escritor en segundo plano: notifica solo lo que ya está confirmado."""
+    error = future.exception()
+    if error:
+        log.error(f"No se pudo guardar el resultado del scraping: {error}")
+        return
+    _dispatch_notifications(future.result())
+
+
+def get_writer():
+    """Devuelve el escritor con group commit (o None si GROUP_COMMIT está desactivado)."""
+    global _writer
+    if not GROUP_COMMIT:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = database.GroupCommitWriter(_apply_with_aliases)
+        return _writer
+
+
+def persist_scrape_result(result, wait=False):
+    """
+    Guarda un ScrapeResult en una sola transacción.
+    Con el escritor en segundo plano activo solo se encola; wait=True bloquea hasta el COMMIT.
+    """
+    writer = get_writer()
+    if writer is None:
+        with metrics.timed("bd"):
+            mensajes = database.run_in_transaction(_apply_with_aliases, result)
+        if result.titulo and result.precio:
+            log.info(f"Nuevo precio guardado: S/ {result.precio}")
+        _dispatch_notifications(mensajes)
+        return
+
+    future = writer.submit(result)
+    if wait:
+        # En este hilo: las notificaciones quedan encoladas antes de volver
+        _on_result_committed(future)
+        future.result()
+        return
+    future.add_done_callback(_on_result_committed)
+
+
+def flush_writes():
+    """Espera a que el escritor en segundo plano confirme todo lo encolado."""
+    writer = get_writer()
+    if writer is not None:
+        writer.flush()
 
 
 # --- Funciones de Scraping (El "Motor") ---
 
-def create_driver():
-    """Crea y retorna una nueva instancia de Chrome Driver."""
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-extensions")
-    options.add_argument("--remote-debugging-pipe")
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+# --- Perfiles de Navegador por Tienda ---
+# Los scrapers solo leen título, precio y stock: imágenes, fuentes, trackers y anuncios
+# sobran. Cada perfil define:
+#   page_load_strategy: "normal" | "eager" | "none" (el WebDriverWait del scraper decide cuándo está lista)
+#   block_resource_types: tipos de recurso a bloquear (se traducen a patrones de URL)
+#   block_url_patterns: patrones extra para Network.setBlockedURLs (CDP)
+#   disable_images: además bloquea imágenes a nivel de contenido de Chrome
+# LEAN_PROFILES=0 usa el perfil "default" para todo (útil para medir el ahorro).
+LEAN_PROFILES_ENABLED = os.getenv("LEAN_PROFILES", "1") == "1"
+
+RESOURCE_TYPE_PATTERNS = {
+    "Image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*", "*.avif*"],
+    "Font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "Media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+    "Stylesheet": ["*.css*"],
+}
 
-from threading import Lock
+TRACKER_URL_PATTERNS = [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*clarity.ms*", "*tiktok.com*",
+    "*criteo.*", "*taboola.com*", "*newrelic.com*", "*nr-data.net*",
+]
+
+LEAN_CHROME_ARGS = [
+    "--blink-settings=imagesEnabled=false",
+    "--mute-audio",
+    "--no-first-run",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--disable-component-update",
+    "--disable-background-networking",
+    "--disable-notifications",
+    "--disable-features=Translate,MediaRouter,OptimizationHints",
+]
+
+DRIVER_PROFILES = {
+    "default": {
+        "page_load_strategy": "normal",
+        "block_resource_types": [],
+        "block_url_patterns": [],
+        "disable_images": False,
+    },
+    # CSS no se bloquea: el botón "Comprar ahora" y los precios se buscan en el DOM,
+    # pero algunos componentes de MercadoLibre dependen del layout para hidratarse.
+    "MercadoLibre": {
+        "page_load_strategy": "eager",
+        "block_resource_types": ["Image", "Font", "Media"],
+        "block_url_patterns": TRACKER_URL_PATTERNS,
+        "disable_images": True,
+    },
+    "LaCuracao": {
+        "page_load_strategy": "eager",
+        "block_resource_types": ["Image", "Font", "Media", "Stylesheet"],
+        "block_url_patterns": TRACKER_URL_PATTERNS,
+        "disable_images": True,
+    },
+}
 
-# ... (existing imports)
+# Bytes y tiempo por página de cada perfil (ver driver_pool.ProfileStats.report)
+profile_stats = driver_pool.ProfileStats(baseline="default")
 
-# --- Global Lock for Driver Installation ---
-DRIVER_INSTALL_LOCK = Lock()
 
-# ... (rest of code)
+def get_profile_name(key):
+    """Perfil que usa el driver de una tienda."""
+    if not LEAN_PROFILES_ENABLED or key not in DRIVER_PROFILES:
+        return "default"
+    return key
+
+
+def _blocked_url_patterns(profile):
+    patterns = []
+    for resource_type in profile.get("block_resource_types", []):
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+    patterns.extend(profile.get("block_url_patterns", []))
+    return patterns
+
+
+def create_driver(key=None):
+    """
+    Crea y retorna una nueva instancia de Chrome Driver con el perfil de la tienda 'key'
+    (el pool la reutiliza entre ciclos).
+    """
+    profile_name = get_profile_name(key)
+    profile = DRIVER_PROFILES[profile_name]
 
-def create_driver():
-    """Crea y retorna una nueva instancia de Chrome Driver."""
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--disable-gpu")
@@ -204,120 +452,425 @@ def create_driver():
     options.add_argument(
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
     options.binary_location = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
+    options.page_load_strategy = profile.get("page_load_strategy", "normal")
+    if profile.get("disable_images"):
+        for arg in LEAN_CHROME_ARGS:
+            options.add_argument(arg)
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
 
     try:
-        # Synchronize driver installation to avoid race conditions
-        with DRIVER_INSTALL_LOCK:
-            try:
-                service = Service(ChromeDriverManager().install())
-            except Exception as e:
-                log.warning(f"Fallo al actualizar driver (red). Reintentando en 5s... Error: {e}")
-                time.sleep(5)
-                service = Service(ChromeDriverManager().install())
-
-        driver = webdriver.Chrome(service=service, options=options)
-        return driver
+        # La ruta de chromedriver se resuelve una sola vez por proceso
+        service = Service(driver_pool.resolve_chromedriver_path())
+        with metrics.timed("driver_creacion", key):
+            driver = webdriver.Chrome(service=service, options=options)
     except Exception as e:
         log.error(f"Error fatal creando el driver: {e}")
         return None
 
+    patterns = _blocked_url_patterns(profile)
+    if patterns:
+        try:
+            # Bloqueo a nivel de red vía Chrome DevTools Protocol
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        except Exception as e:
+            log.warning(f"No se pudo aplicar el bloqueo CDP del perfil '{profile_name}': {e}")
+
+    driver.profile_name = profile_name
+    return driver
+
+
+# --- Pool Global de Drivers (se mantiene caliente entre ciclos del tracker) ---
+webdriver_pool = driver_pool.DriverPool(
+    create_driver, max_idle_per_key=max(STORE_CONCURRENCY.values(), default=DEFAULT_STORE_CONCURRENCY))
+atexit.register(webdriver_pool.close_all)
+
+
+def _is_session_dead(error):
+    """True si la excepción indica que Chrome/la sesión murió (y el driver debe reemplazarse)."""
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException)):
+        return True
+    message = str(error).lower()
+    return any(s in message for s in ("chrome not reachable", "disconnected", "session deleted",
+                                      "no such session", "target window already closed"))
+
 
 def _navigate_to_product(url, driver):
-    """Navega a la URL usando el driver existente."""
+    """
+    Navega a la URL usando el driver existente.
+    Si la sesión de Chrome está caída relanza la excepción para que se reemplace el driver.
+    """
     try:
         log.info(f"Navegando a: {url}...")
-        driver.get(url)
+        with metrics.timed("navegacion"):
+            driver.get(url)
+        webdriver_pool.record_page_load(driver)
         # Ya no esperamos aquí. El scraper específico esperará lo que necesite.
         return True
 
     except Exception as e:
+        if _is_session_dead(e):
+            raise
         log.error(f"Error al navegar a la página {url}: {e}")
         return False
 
 
-def _scrape_and_save(p_id, p_url, p_tienda, driver):
-    """Procesa un producto usando un driver específico."""
-    log.info(f"---[ Procesando Producto ID: {p_id} (Tienda: {p_tienda}) ]---")
+def _classify_page(html, title=""):
+    """Tipo de fallo que delata el contenido de la página (bloqueo / no existe) o None."""
+    if html and any(marker in html.lower() for marker in BLOCK_MARKERS):
+        return FAIL_BLOCKED
+    if title and any(marker in title.lower() for marker in NOT_FOUND_MARKERS):
+        return FAIL_NOT_FOUND
+    return None
 
-    if p_tienda not in SCRAPER_DISPATCH:
-        log.error(f"ERROR: No se encontró un scraper para la tienda '{p_tienda}'.")
-        return False
-    
-    parser_func = SCRAPER_DISPATCH[p_tienda]
-    if parser_func is None:
-        log.warning(f"Scraper para {p_tienda} aún no implementado.")
-        return False
 
-    if not _navigate_to_product(p_url, driver):
-        log.error(f"ERROR: No se pudo navegar al producto ID {p_id}.")
-        return False
+def _classify_driver_page(driver):
+    try:
+        return _classify_page(driver.page_source, driver.title)
+    except Exception:
+        return None
+
+
+def _scrape_static(p_url, scraper):
+    """
+    Intenta extraer (titulo, precio, status) sin navegador: HTTP keep-alive + parse del HTML estático.
+    Devuelve None si la tienda no lo soporta o si el resultado no es concluyente (hay que escalar a Selenium).
+    Lanza ScrapeFailure si la respuesta ya es definitiva (la publicación no existe).
+    """
+    if not STATIC_FETCH_ENABLED or not getattr(scraper, "SUPPORTS_STATIC_HTML", False):
+        return None
+
+    with metrics.timed("http"):
+        status_code, html = http_fetcher.fetch_page(p_url)
+    if status_code in (404, 410):
+        raise ScrapeFailure(FAIL_NOT_FOUND, f"HTTP {status_code}")
+    if not html:
+        # 403/429 o error de red: el navegador a veces pasa donde el cliente HTTP no
+        return None
+
+    try:
+        titulo, precio, status = scraper.parse_html(html)
+    except Exception as e:
+        log.warning(f"El parse estático falló ({e}). Se usará Selenium.")
+        return None
+
+    # Solo un resultado completo evita el navegador; un "no disponible" sin precio
+    # se confirma con la página renderizada.
+    if titulo and precio:
+        log.info("Producto resuelto por HTTP (sin navegador).")
+        metrics.inc("ruta", ruta="http")
+        return titulo, precio, status
+    log.info("El HTML estático no alcanzó. Escalando a Selenium...")
+    return None
+
+
+def _scrape_with_driver(p_id, p_url, p_tienda, scraper, get_driver):
+    """
+    Ruta con navegador: navega con Selenium y deja que el scraper espere lo que necesite.
+    Lanza ScrapeFailure con el tipo de fallo si no se obtiene un resultado utilizable.
+    """
+    metrics.inc("ruta", ruta="selenium")
+    for attempt in range(2):
+        with metrics.timed("driver_prestamo"):
+            driver = get_driver()
+        if not driver:
+            raise ScrapeFailure(FAIL_DRIVER, "no hay driver disponible")
+
+        t0 = time.monotonic()
+        try:
+            navegado = _navigate_to_product(p_url, driver)
+        except Exception as e:
+            # Sesión caída: se descarta el driver y se reintenta una vez con uno nuevo
+            log.warning(f"Sesión de Chrome caída ({e.__class__.__name__}). Reemplazando driver...")
+            get_driver.invalidate()
+            if attempt == 0:
+                continue
+            raise ScrapeFailure(FAIL_DRIVER, f"sesión de Chrome caída ({e.__class__.__name__})")
+
+        if not navegado:
+            raise ScrapeFailure(_classify_driver_page(driver) or FAIL_TIMEOUT, "no se pudo navegar")
+        break
 
     try:
         # AHORA PASAMOS EL DRIVER, NO EL HTML
-        titulo, precio, status = parser_func(driver)
+        titulo, precio, status = scraper.parse(driver)
     except Exception as e:
-        log.critical(f"El scraper '{p_tienda}' falló con una excepción: {e}")
-        titulo, precio, status = None, None, None
+        if _is_session_dead(e):
+            get_driver.invalidate()
+            raise ScrapeFailure(FAIL_DRIVER, f"sesión de Chrome caída ({e.__class__.__name__})")
+        # Una página de captcha tampoco tiene el elemento clave: mirar qué cargó antes de llamarlo timeout
+        kind = _classify_driver_page(driver) or (FAIL_TIMEOUT if isinstance(e, TimeoutException) else FAIL_PARSE)
+        raise ScrapeFailure(kind, f"el scraper '{p_tienda}' falló: {e.__class__.__name__}")
+    finally:
+        # Navegación + espera del scraper: lo que de verdad cuesta cada perfil
+        metrics.observe("selenium_total", time.monotonic() - t0)
+        profile_stats.measure(getattr(driver, "profile_name", "default"), driver, time.monotonic() - t0)
+
+    if not (titulo and precio) and status != "no disponible":
+        raise ScrapeFailure(_classify_driver_page(driver) or FAIL_PARSE, "sin título o precio")
+    return titulo, precio, status
+
+
+def _scrape_and_save(p_id, p_url, p_tienda, get_driver, wait_for_write=False):
+    """
+    Procesa un producto: primero por HTTP (si la tienda lo permite) y, si no alcanza, con Selenium.
+    get_driver es un DriverLease: devuelve el driver del pool solo si hace falta.
+    wait_for_write=True espera a que el resultado esté confirmado en la BD (group commit).
+    Devuelve OUTCOME_OK o el tipo de fallo (FAIL_*).
+    Las fases se miden en metrics con la tienda del producto; cada tanto se perfila entero.
+    """
+    with metrics.store_context(p_tienda), metrics.sampled_profile(f"{p_tienda}_{p_id}", p_id):
+        with metrics.timed("producto"):
+            outcome = _process_product(p_id, p_url, p_tienda, get_driver, wait_for_write)
+        metrics.inc("resultados", resultado=outcome)
+    return outcome
+
+
+def _process_product(p_id, p_url, p_tienda, get_driver, wait_for_write):
+    log.info(f"---[ Procesando Producto ID: {p_id} (Tienda: {p_tienda}) ]---")
+
+    scraper = SCRAPER_DISPATCH.get(p_tienda)
+    if scraper is None:
+        if p_tienda not in SCRAPER_DISPATCH:
+            log.error(f"ERROR: No se encontró un scraper para la tienda '{p_tienda}'.")
+        else:
+            log.warning(f"Scraper para {p_tienda} aún no implementado.")
+        # Se registra como fallo para que el scheduler lo espacie (back-off)
+        persist_scrape_result(ScrapeResult(p_id, p_url, None, None, None), wait=wait_for_write)
+        return FAIL_UNSUPPORTED
+
+    try:
+        resultado = _scrape_static(p_url, scraper)
+        if resultado is None:
+            resultado = _scrape_with_driver(p_id, p_url, p_tienda, scraper, get_driver)
+    except ScrapeFailure as e:
+        log.error(f"--- ERROR [{e.kind}]: No se pudo extraer el producto ID {p_id}: {e} ---")
+        # El fallo cuenta para el back-off del scheduler (fallos_consecutivos)
+        persist_scrape_result(ScrapeResult(p_id, p_url, None, None, None), wait=wait_for_write)
+        return e.kind
+    titulo, precio, status = resultado
 
     if titulo and precio:
-        save_price(p_id, precio)
-        update_product_name(p_id, titulo)
-        update_product_status(p_id, status)
-        check_and_notify(p_id, titulo, precio, p_url, status)
+        persist_scrape_result(ScrapeResult(p_id, p_url, titulo, precio, status), wait=wait_for_write)
         log.info("--- Producto procesado exitosamente ---")
-        return True
-    elif status == "no disponible":
+    else:
         # Caso especial: Producto no disponible (precio puede ser None)
         # El usuario solicitó explícitamente SOLO actualizar el status, sin tocar precio ni nombre.
-        update_product_status(p_id, status)
+        persist_scrape_result(ScrapeResult(p_id, p_url, None, None, status), wait=wait_for_write)
         log.info(f"--- Producto ID {p_id} marcado como NO DISPONIBLE. (Precio/Nombre intactos) ---")
-        return True
-    else:
-        log.error(f"--- ERROR: No se pudo extraer título o precio del producto ID {p_id} ---")
-        return False
+    return OUTCOME_OK
 
 
-async def process_store_products(store_name, products):
+def _batch_chunks(backend, products):
     """
-    Procesa una lista de productos de una misma tienda de forma SECUENCIAL.
-    Se ejecuta en paralelo con otras tiendas.
+    Agrupa [(id, url, tienda)] por ítem y los reparte en lotes de hasta MULTIGET_MAX ítems.
+    Devuelve (lotes [{item_id: [productos]}], productos sin ítem consultable).
     """
-    log.info(f"[Worker: {store_name}] Iniciando. {len(products)} productos en cola.")
-    
-    # Crear driver dedicado para esta tienda
-    driver = await asyncio.to_thread(create_driver)
-    if not driver:
-        log.error(f"[Worker: {store_name}] No se pudo crear el driver. Abortando.")
-        return
+    by_item, rest = {}, []
+    for product in products:
+        item = backend.item_id(product[1])
+        if item:
+            by_item.setdefault(item, []).append(product)
+        else:
+            rest.append(product)
+    items = list(by_item.items())
+    chunks = [dict(items[i:i + backend.MULTIGET_MAX]) for i in range(0, len(items), backend.MULTIGET_MAX)]
+    return chunks, rest
+
+
+def _scrape_batch(store_name, backend, chunk, wait_for_write=False):
+    """
+    Una llamada a la fuente por lotes para los productos de 'chunk' ({item_id: [productos]}).
+    Persiste lo resuelto como lo haría _process_product y devuelve (status HTTP, {producto_id: outcome});
+    los productos que no aparecen quedan para la ruta normal (HTML / Selenium).
+    """
+    with metrics.store_context(store_name):
+        try:
+            status_code, results = backend.fetch_items(list(chunk))
+        except Exception as e:
+            log.warning(f"[API: {store_name}] Falló la consulta por lotes ({e}). Se usará la ruta normal.")
+            return None, {}
+
+        outcomes = {}
+        for item, result in results.items():
+            for p_id, p_url, _ in chunk.get(item, []):
+                if result == backend.NOT_FOUND:
+                    persist_scrape_result(ScrapeResult(p_id, p_url, None, None, None), wait=wait_for_write)
+                    outcome = FAIL_NOT_FOUND
+                else:
+                    titulo, precio, status = result
+                    persist_scrape_result(ScrapeResult(p_id, p_url, titulo, precio, status), wait=wait_for_write)
+                    outcome = OUTCOME_OK
+                metrics.inc("ruta", ruta="api")
+                metrics.inc("resultados", resultado=outcome)
+                outcomes[p_id] = outcome
+        return status_code, outcomes
+
+
+def _scrape_api(store_name, products, wait_for_write=False):
+    """
+    Versión síncrona (sin limitador) para pocos productos, p. ej. track_single_product.
+    Devuelve {producto_id: outcome} de los que resolvió la API.
+    """
+    backend = BATCH_BACKENDS.get(store_name)
+    if not ITEMS_API_ENABLED or backend is None:
+        return {}
+    outcomes = {}
+    for chunk in _batch_chunks(backend, products)[0]:
+        outcomes.update(_scrape_batch(store_name, backend, chunk, wait_for_write)[1])
+    return outcomes
+
+
+async def _prefetch_batch(store_name, products, progress=None):
+    """
+    Resuelve por la fuente por lotes de la tienda todo lo que pueda: una llamada por cada
+    MULTIGET_MAX ítems, con su propio limitador (la API es otro host que el sitio).
+    Devuelve los productos que quedan para los workers por producto.
+    """
+    backend = BATCH_BACKENDS.get(store_name)
+    if not ITEMS_API_ENABLED or backend is None:
+        return products
+
+    limiter = rate_limiter.get_limiter(f"{store_name}-api", **backend.RATE_LIMIT)
+    chunks, remaining = _batch_chunks(backend, products)
+    resolved = calls = 0
+    for n, chunk in enumerate(chunks):
+        await limiter.acquire()
+        t0 = time.monotonic()
+        status_code, outcomes = await asyncio.to_thread(_scrape_batch, store_name, backend, chunk)
+        latency = time.monotonic() - t0
+        calls += 1
+        if status_code in (401, 403):
+            # Sin credenciales válidas ninguna llamada va a andar: el resto del ciclo va por la página
+            log.warning(f"[API: {store_name}] HTTP {status_code}. Se usará la ruta normal en este ciclo.")
+            remaining.extend(p for later in chunks[n:] for ps in later.values() for p in ps)
+            break
+        limiter.record(latency, status_code == 200)
+        resolved += len(outcomes)
+        for item_products in chunk.values():
+            for product in item_products:
+                outcome = outcomes.get(product[0])
+                if outcome is None:
+                    remaining.append(product)
+                elif progress is not None:
+                    progress(store_name, product[0], outcome == OUTCOME_OK, latency / len(outcomes), outcome)
+
+    if chunks:
+        log.info(f"[API: {store_name}] {resolved}/{len(products)} productos resueltos en {calls} "
+                 f"llamadas; {len(remaining)} siguen por HTML/Selenium.")
+    return remaining
+
+
+def _defer_products(product_ids, until):
+    """Mueve la próxima revisión de productos saltados por un circuito abierto al fin del cooldown."""
+    proxima = timestamps.to_ms(until)
+    with database.db_pool.get_conn() as conn:
+        conn.executemany("UPDATE Productos SET proxima_revision = ? WHERE id = ?",
+                         [(proxima, p_id) for p_id in product_ids])
+        conn.commit()
+
+
+async def _store_worker(store_name, worker_num, queue, limiter, breaker, progress=None):
+    """
+    Un worker de la tienda: toma productos de la cola respetando el limitador del dominio
+    y el circuit breaker de la tienda (con el circuito abierto los productos se saltan).
+    progress(store_name, p_id, ok, latency, outcome), si se pasa, se llama al terminar cada producto.
+    Devuelve los IDs saltados por el circuito.
+    """
+    tag = f"[Worker: {store_name}#{worker_num}]"
+    skipped = []
+    # Driver propio de este worker, pedido al pool solo si algún producto lo necesita
+    get_driver = driver_pool.DriverLease(webdriver_pool, store_name)
+    try:
+        while True:
+            try:
+                p_id, p_url, p_tienda = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return skipped
+
+            if not breaker.allow():
+                # Ni limitador ni navegador: el producto se reprograma al final del cooldown
+                skipped.append(p_id)
+                metrics.inc("resultados", tienda=store_name, resultado=FAIL_CIRCUIT_OPEN)
+                if progress is not None:
+                    progress(store_name, p_id, False, 0.0, FAIL_CIRCUIT_OPEN)
+                continue
+
+            t_wait = time.monotonic()
+            await limiter.acquire()
+            metrics.observe("limitador", time.monotonic() - t_wait, store_name)
+            t0 = time.monotonic()
+            # Usamos to_thread para las operaciones de Selenium/HTTP que son bloqueantes
+            work = asyncio.ensure_future(asyncio.to_thread(_scrape_and_save, p_id, p_url, p_tienda, get_driver))
+            try:
+                outcome = await asyncio.shield(work)
+            except asyncio.CancelledError:
+                # Cancelación: el hilo sigue usando el driver; esperar a que termine antes de soltarlo
+                await asyncio.wait([work])
+                breaker.release()
+                raise
+            except Exception as e:
+                log.error(f"{tag} Error procesando ID {p_id}: {e}", exc_info=True)
+                outcome = FAIL_ERROR
+            latency = time.monotonic() - t0
+            ok = outcome == OUTCOME_OK
+            # Un producto inexistente o mal parseado no dice nada de la salud de la tienda
+            limiter.record(latency, outcome not in STORE_FAILURES)
+            if ok or outcome in STORE_FAILURES:
+                breaker.record(ok, outcome)
+            else:
+                breaker.release()
+            if progress is not None:
+                progress(store_name, p_id, ok, latency, outcome)
+    finally:
+        log.info(f"{tag} Finalizado. Devolviendo driver al pool.")
+        get_driver.release()
+
+
+async def process_store_products(store_name, products, progress=None):
+    """
+    Procesa los productos de una misma tienda con STORE_CONCURRENCY workers.
+    La cortesía con el sitio la impone un token bucket adaptativo por tienda (dominio); si la
+    tienda bloquea o no responde, su circuit breaker corta el resto del ciclo. Se ejecuta en paralelo con otras tiendas.
+    Si la tienda tiene una fuente por lotes (BATCH_BACKENDS), antes se resuelve por ahí todo lo posible.
+    """
+    concurrency = max(1, min(STORE_CONCURRENCY.get(store_name, DEFAULT_STORE_CONCURRENCY), len(products)))
+    limiter = rate_limiter.get_limiter(store_name, **STORE_RATE_LIMITS.get(store_name, {}))
+    breaker = circuit_breaker.get_breaker(store_name, **STORE_BREAKERS.get(store_name, {}))
+    log.info(f"[Worker: {store_name}] Iniciando. {len(products)} productos en cola, "
+             f"{concurrency} workers, {limiter.rate:.2f} req/s.")
 
     try:
-        for i, prod in enumerate(products):
-            p_id, p_url, p_tienda = prod
-            
-            # Procesar producto (bloqueante para este worker, pero ok porque es su propio hilo lógico)
-            # Usamos to_thread para las operaciones de Selenium que son bloqueantes
-            await asyncio.to_thread(_scrape_and_save, p_id, p_url, p_tienda, driver)
-            
-            # Si no es el último, esperar un tiempo aleatorio
-            if i < len(products) - 1:
-                wait_time = random.uniform(5, 15)
-                log.info(f"[Worker: {store_name}] Esperando {wait_time:.1f}s antes del siguiente...")
-                await asyncio.sleep(wait_time)
-                
+        products = await _prefetch_batch(store_name, products, progress)
+        if not products:
+            log.info(f"[Worker: {store_name}] Finalizado. Todo resuelto por la API.")
+            return
+        concurrency = min(concurrency, len(products))
+
+        queue = asyncio.Queue()
+        for prod in products:
+            queue.put_nowait(prod)
+
+        results = await asyncio.gather(*(_store_worker(store_name, n + 1, queue, limiter, breaker, progress)
+                                         for n in range(concurrency)))
+        skipped = [p_id for worker_skipped in results for p_id in worker_skipped]
+        retry_at = breaker.retry_at
+        if skipped and retry_at is not None:
+            log.warning(f"[Worker: {store_name}] Circuito abierto: {len(skipped)} productos saltados, "
+                        f"reprogramados para dentro de {retry_at - time.time():.0f}s.")
+            await asyncio.to_thread(_defer_products, skipped, retry_at)
     except Exception as e:
         log.error(f"[Worker: {store_name}] Error en el ciclo: {e}", exc_info=True)
-    finally:
-        log.info(f"[Worker: {store_name}] Finalizado. Cerrando driver.")
-        try:
-            driver.quit()
-        except:
-            pass
+    log.info(f"[Worker: {store_name}] Finalizado. Tasa final: {limiter.rate:.2f} req/s.")
 
 
 # --- Funciones Públicas ---
 
 def track_single_product(product_id):
-    """Rastrea un solo producto (crea su propio driver efímero)."""
+    """
+    Rastrea un solo producto (usa un driver del pool si hace falta Selenium).
+    Devuelve OUTCOME_OK, el tipo de fallo (FAIL_*) o None si el producto no existe.
+    """
     log.info(f"Solicitud de tracking para UN solo producto: ID {product_id}")
     
     producto = None
@@ -328,79 +881,82 @@ def track_single_product(product_id):
 
     if producto:
         url, tienda = producto
-        driver = create_driver()
-        if driver:
-            try:
-                _scrape_and_save(product_id, url, tienda, driver)
-            finally:
-                driver.quit()
-    else:
-        log.error(f"ERROR: No se encontró el producto ID {product_id} para el tracking individual.")
-
-
-def get_product_count():
-    with database.db_pool.get_conn() as conn:
-        count = conn.execute("SELECT COUNT(*) FROM Productos").fetchone()[0]
-    return count
+        outcome = _scrape_api(tienda, [(product_id, url, tienda)], wait_for_write=True).get(product_id)
+        if outcome is not None:
+            get_notifier().release_digest()
+            return outcome
+        get_driver = driver_pool.DriverLease(webdriver_pool, tienda)
+        try:
+            return _scrape_and_save(product_id, url, tienda, get_driver, wait_for_write=True)
+        finally:
+            get_driver.release()
+            get_notifier().release_digest()
+    log.error(f"ERROR: No se encontró el producto ID {product_id} para el tracking individual.")
+    return None
 
 
-async def track_all_products():
+async def track_products(products, progress=None):
     """
-    Rastrea TODOS los productos usando paralelismo por tienda.
+    Rastrea una lista de productos [(id, url, tienda)] usando paralelismo por tienda.
+    La usan los workers de job_queue (cada lote reclamado de la cola Jobs) y el barrido
+    completo de prueba. La coordinación entre procesos la hacen los leases de Jobs.
+    Si la tarea se cancela, los productos en curso terminan y no se empiezan más.
     """
-    log.info("Solicitud de tracking para TODOS los productos (Modo Paralelo por Tienda)...")
-
-    # --- LÓGICA DEL CANDADO ---
-    if LOCK_FILE.exists():
-        try:
-            file_age = time.time() - LOCK_FILE.stat().st_mtime
-            if file_age > 7200:
-                log.warning(f"⚠️ Eliminando candado zombie ({int(file_age / 60)} mins).")
-                LOCK_FILE.unlink()
-            else:
-                log.warning("Ya hay un proceso de tracking reciente. Omitiendo.")
-                return False
-        except Exception as e:
-            if LOCK_FILE.exists(): LOCK_FILE.unlink()
-
     try:
-        LOCK_FILE.touch()
-        
-        all_products = []
-        with database.db_pool.get_conn() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, url, tienda FROM Productos")
-            all_products = cursor.fetchall()
-
-        if not all_products:
-            log.info("No hay productos en la BD.")
+        if not products:
+            log.info("No hay productos para rastrear.")
             return True
 
         # Agrupar por tienda
         store_queues = {}
-        for prod in all_products:
+        for prod in products:
             tienda = prod[2]
             if tienda not in store_queues:
                 store_queues[tienda] = []
             store_queues[tienda].append(prod)
 
-        log.info(f"Plan de ejecución: {len(store_queues)} tiendas detectadas.")
+        log.info(f"Plan de ejecución: {len(products)} productos, {len(store_queues)} tiendas detectadas.")
 
         # Crear tareas asíncronas (una por tienda)
         tasks = []
-        for store_name, products in store_queues.items():
-            tasks.append(process_store_products(store_name, products))
+        for store_name, store_products in store_queues.items():
+            tasks.append(process_store_products(store_name, store_products, progress))
 
         # Ejecutar todas las tiendas en paralelo
         await asyncio.gather(*tasks)
+        await asyncio.to_thread(flush_writes)
+        # Fin del ciclo: las bajadas de precio retenidas salen juntas (resumen si son muchas)
+        get_notifier().release_digest()
 
         log.info("\n---[ TRACKING COMPLETO (PARALELO) ]---")
+        log.info(f"Estadísticas del pool de BD: {database.db_pool.stats()}")
+        log.info(f"Estadísticas del pool de drivers: {webdriver_pool.stats()}")
+        log.info(f"Perfiles de carga (por página): {profile_stats.report()}")
+        log.info(f"Tiempos por fase (acumulado del proceso): {metrics.summary()}")
+        log.info(f"Circuitos por tienda: {circuit_breaker.snapshot_all()}")
+        log.info(f"Notificaciones: {get_notifier().stats()}")
         return True
 
     except Exception as e:
-        log.critical(f"Error fatal en track_all_products: {e}", exc_info=True)
+        log.critical(f"Error fatal en track_products: {e}", exc_info=True)
         return False
 
-    finally:
-        if LOCK_FILE.exists():
-            LOCK_FILE.unlink()
+
+async def track_all_products(progress=None):
+    """
+    Rastrea TODOS los productos usando paralelismo por tienda.
+    Los alias (mismo ítem de la tienda) no se scrapean aparte: _apply_with_aliases les copia
+    el resultado del producto principal.
+    """
+    log.info("Solicitud de tracking para TODOS los productos (Modo Paralelo por Tienda)...")
+
+    with database.db_pool.get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT id, url, tienda FROM Productos P WHERE {database.PRIMARY_PRODUCT_SQL.format(p='P')}")
+        all_products = cursor.fetchall()
+
+    if not all_products:
+        log.info("No hay productos en la BD.")
+        return True
+
+    return await track_products(all_products, progress)
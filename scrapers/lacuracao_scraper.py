@@ -1,30 +1,59 @@
 import re
-from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+import metrics
+from scrapers import parsing
+
+# El título, el precio (meta[itemprop=price]) y el stock vienen en el HTML del servidor:
+# el motor puede descargarlo por HTTP y usar Selenium solo como respaldo.
+SUPPORTS_STATIC_HTML = True
+
+# --- Selectores (compilados una sola vez) ---
+# Solo estos elementos se materializan al parsear; el resto de la página se descarta.
+_STRAINER = parsing.TargetedStrainer(
+    "span[itemprop=name]", "meta[itemprop=price]", "span[data-price-amount]", "div.stock",
+)
+_SEL = parsing.compile_selectors(
+    title="span[itemprop=name]",
+    price_meta="meta[itemprop=price]",
+    price_span="span[data-price-amount]",
+    stock="div.stock",
+)
+
 
 def parse(driver):
     """
     Analiza la página de La Curacao usando Selenium y WebDriverWait.
-    Devuelve (titulo, precio, status).
+    Devuelve (titulo, precio, status). Si el elemento clave no aparece, propaga la excepción.
     """
     print("\n--- [Scraper: LaCuracao V3 (Smart Wait)] Iniciando Análisis ---")
     
     try:
         # Esperar inteligentemente a que cargue el título
         # Selector CSS: span[itemprop='name']
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "span[itemprop='name']"))
-        )
+        with metrics.timed("espera"):
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "span[itemprop='name']"))
+            )
         print("Elemento clave encontrado. Procesando HTML...")
     except Exception as e:
+        # El motor clasifica el fallo (timeout, bloqueo/captcha o driver caído) según la excepción y la página
         print(f"Timeout esperando carga de página: {e}")
-        return None, None, "ninguno"
+        raise
 
     # Obtenemos el HTML ya cargado
-    html = driver.page_source
-    soup = BeautifulSoup(html, 'html.parser')
+    with metrics.timed("page_source"):
+        html = driver.page_source
+    return parse_html(html)
+
+
+def parse_html(html):
+    """
+    Extrae (titulo, precio, status) de un HTML de La Curacao ya descargado
+    (por Selenium o por el cliente HTTP, sin navegador).
+    """
+    soup = parsing.parse_targeted(html, _STRAINER)
 
     product_title = None
     product_price = None
@@ -32,7 +61,7 @@ def parse(driver):
 
     # --- 1. Extraer el Título ---
     try:
-        title_element = soup.find('span', itemprop='name')
+        title_element = _SEL['title'].select_one(soup)
         if title_element:
             product_title = title_element.get_text().strip()
             print(f"TÍTULO ENCONTRADO: {product_title}")
@@ -43,14 +72,14 @@ def parse(driver):
 
     # --- 2. Extraer el Precio ---
     try:
-        price_element = soup.find('meta', itemprop='price')
+        price_element = _SEL['price_meta'].select_one(soup)
         if price_element and price_element.get('content'):
             price_text = price_element.get('content')
             print(f"Info: 'content' de meta-tag encontrado: '{price_text}'")
             product_price = int(float(price_text))
         else:
             print("Info: No se encontró 'meta[itemprop=price]'. Buscando 'data-price-amount'...")
-            price_span = soup.find('span', {'data-price-amount': True})
+            price_span = _SEL['price_span'].select_one(soup)
             if price_span:
                 price_text = price_span['data-price-amount']
                 print(f"Info: 'data-price-amount' encontrado: '{price_text}'")
@@ -67,7 +96,7 @@ def parse(driver):
     # --- 3. Extraer el Status (NUEVO) ---
     try:
         # Buscamos el div con clase 'stock'
-        stock_div = soup.find('div', class_='stock')
+        stock_div = _SEL['stock'].select_one(soup)
 
         if stock_div:
             # Obtenemos la lista de clases del div
@@ -0,0 +1,89 @@
+"""
+Fuente de MercadoLibre por su API pública de ítems (JSON), sin navegador.
+
+GET /items?ids=MPE1,MPE2,...&attributes=... devuelve título, precio, estado y stock de
+hasta MULTIGET_MAX publicaciones en una sola respuesta ({code, body} por ID, en el mismo
+orden). El motor junta los ítems de todos los productos de la tienda del lote y hace
+pocas llamadas por la sesión HTTP compartida (http_fetcher); lo que la API no resuelve
+(páginas de catálogo sin publicación fijada, errores, respuestas incompletas) sigue por
+la ruta de siempre: HTML estático y, si no alcanza, Selenium.
+
+ML_API_URL cambia el host (p. ej. el stub local de bench/api_stub.py) y ML_ACCESS_TOKEN,
+si está definido, se envía como Bearer.
+"""
+import os
+import logging
+from dotenv import load_dotenv
+
+import http_fetcher
+import metrics
+import stores
+
+# Configurar un logger para este módulo
+log = logging.getLogger(__name__)
+
+load_dotenv()
+API_BASE_URL = os.getenv("ML_API_URL", "https://api.mercadolibre.com").rstrip("/")
+ACCESS_TOKEN = os.getenv("ML_ACCESS_TOKEN")
+MULTIGET_MAX = 20  # IDs por llamada que acepta /items
+ATTRIBUTES = "id,title,price,status,available_quantity"
+# Limitador propio del host de la API (ver rate_limiter); cada llamada trae hasta MULTIGET_MAX ítems
+RATE_LIMIT = {"rate": 1.0, "burst": 3, "max_rate": 5.0}
+
+# Resultado de un ítem que la API confirma que no existe
+NOT_FOUND = "no_encontrado"
+
+
+def item_id(url):
+    """ID de publicación consultable en /items, o None (tienda distinta, catálogo sin publicación fijada)."""
+    identity = stores.canonicalize(url)
+    if identity.tienda != "MercadoLibre" or not identity.item_id or identity.item_id.startswith("p/"):
+        return None
+    return identity.item_id
+
+
+def parse_item(body):
+    """
+    (titulo, precio, status) de un ítem de la API, con los mismos valores que el scraper
+    de la página: precio entero (la página muestra los centavos aparte) y 'disponible'
+    solo si la publicación está activa y tiene stock. None si faltan título o precio.
+    """
+    titulo = (body.get("title") or "").strip()
+    precio = body.get("price")
+    if not titulo or precio is None:
+        return None
+    disponible = body.get("status") == "active" and (body.get("available_quantity") or 0) > 0
+    return titulo, int(precio), "disponible" if disponible else "no disponible"
+
+
+def fetch_items(item_ids):
+    """
+    Una llamada multi-get para hasta MULTIGET_MAX IDs.
+    Devuelve (status HTTP, {item_id: (titulo, precio, status) | NOT_FOUND}); los IDs que
+    no aparecen en el dict no se pudieron resolver (el motor los procesa por la ruta normal).
+    """
+    if len(item_ids) > MULTIGET_MAX:
+        raise ValueError(f"Multi-get de {len(item_ids)} ítems (máximo {MULTIGET_MAX})")
+    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"} if ACCESS_TOKEN else None
+    with metrics.timed("api"):
+        status_code, data = http_fetcher.fetch_json(
+            f"{API_BASE_URL}/items", params={"ids": ",".join(item_ids), "attributes": ATTRIBUTES},
+            headers=headers)
+    metrics.inc("api_llamadas", estado=status_code or "error")
+    if not isinstance(data, list):
+        return status_code, {}
+
+    results = {}
+    for requested, entry in zip(item_ids, data):
+        if not isinstance(entry, dict):
+            continue
+        body = entry.get("body") or {}
+        if entry.get("code") in (404, 410):
+            results[requested] = NOT_FOUND
+        elif entry.get("code") == 200:
+            parsed = parse_item(body)
+            if parsed is not None:
+                results[requested] = parsed
+            else:
+                log.info(f"Ítem {requested}: la API no trae título o precio. Se usará la página.")
+    return status_code, results
@@ -1,30 +1,82 @@
 import re
-from bs4 import BeautifulSoup
+import json
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+import metrics
+from scrapers import parsing
+
+# El HTML estático de MercadoLibre trae el título/precio renderizados por el servidor
+# y un bloque JSON-LD (schema.org/Product) como respaldo: no hace falta navegador.
+SUPPORTS_STATIC_HTML = True
+
+# --- Selectores (compilados una sola vez) ---
+# Solo estos elementos se materializan al parsear; el resto de la página se descarta.
+_STRAINER = parsing.TargetedStrainer(
+    "h1.ui-pdp-title",
+    "div.ui-pdp-price__second-line",
+    "div.ui-pdp-price__part__container",
+    "button.ui-pdp-action--primary",
+    "script[type=application/ld+json]",
+)
+_SEL = parsing.compile_selectors(
+    title="h1.ui-pdp-title",
+    discount_price="div.ui-pdp-price__second-line span.andes-money-amount__fraction",
+    normal_price="div.ui-pdp-price__part__container span.andes-money-amount__fraction",
+    buy_button="button.andes-button.andes-spinner__icon-base.ui-pdp-action--primary.andes-button--loud",
+    json_ld="script[type='application/ld+json']",
+)
+
 
 def parse(driver):
     """
     Analiza la página de MercadoLibre usando Selenium y WebDriverWait.
-    Devuelve (titulo, precio, status).
+    Devuelve (titulo, precio, status). Si el elemento clave no aparece, propaga la excepción.
     """
     print("\n--- [Scraper: MercadoLibre V3 (Smart Wait)] Iniciando Análisis ---")
     
     try:
         # Esperar inteligentemente a que cargue el título (elemento clave)
         # Máximo 10 segundos
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "ui-pdp-title"))
-        )
+        with metrics.timed("espera"):
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.CLASS_NAME, "ui-pdp-title"))
+            )
         print("Elemento clave encontrado. Procesando HTML...")
     except Exception as e:
+        # El motor clasifica el fallo (timeout, bloqueo/captcha o driver caído) según la excepción y la página
         print(f"Timeout esperando carga de página: {e}")
-        return None, None, "ninguno"
+        raise
 
-    # Obtenemos el HTML ya cargado
-    html = driver.page_source
-    soup = BeautifulSoup(html, 'html.parser')
+    # Obtenemos el HTML ya cargado (renderizado: no hace falta el respaldo JSON-LD)
+    with metrics.timed("page_source"):
+        html = driver.page_source
+    return parse_html(html, use_json_ld=False)
+
+
+def _find_json_ld_product(soup):
+    """Busca el objeto schema.org 'Product' dentro de los <script type=application/ld+json>."""
+    for script in _SEL['json_ld'].select(soup):
+        try:
+            data = json.loads(script.string or "")
+        except (TypeError, ValueError):
+            continue
+        if isinstance(data, dict):
+            candidates = data.get('@graph', [data])
+        else:
+            candidates = data if isinstance(data, list) else []
+        for item in candidates:
+            if isinstance(item, dict) and item.get('@type') == 'Product':
+                return item
+    return None
+
+
+def parse_html(html, use_json_ld=True):
+    """
+    Extrae (titulo, precio, status) de un HTML de MercadoLibre ya descargado.
+    Con use_json_ld=True (HTML estático) completa lo que falte con el bloque JSON-LD.
+    """
+    soup = parsing.parse_targeted(html, _STRAINER)
 
     product_title = None
     product_price = None
@@ -33,7 +85,7 @@ def parse(driver):
 
     # --- 1. Extraer el Título ---
     try:
-        title_element = soup.find('h1', class_='ui-pdp-title')
+        title_element = _SEL['title'].select_one(soup)
         if title_element:
             product_title = title_element.get_text().strip()
             print(f"TÍTULO ENCONTRADO: {product_title}")
@@ -44,19 +96,14 @@ def parse(driver):
 
     # --- 2. Extraer el Precio ---
     try:
-        price_element = None
-        discount_container = soup.find('div', class_='ui-pdp-price__second-line')
-        if discount_container:
-            price_element = discount_container.find('span', class_='andes-money-amount__fraction')
-            if price_element:
-                print("Info: Precio de DESCUENTO encontrado.")
+        price_element = _SEL['discount_price'].select_one(soup)
+        if price_element:
+            print("Info: Precio de DESCUENTO encontrado.")
 
         if not price_element:
-            normal_container = soup.find('div', class_='ui-pdp-price__part__container')
-            if normal_container:
-                price_element = normal_container.find('span', class_='andes-money-amount__fraction')
-                if price_element:
-                    print("Info: Precio NORMAL encontrado.")
+            price_element = _SEL['normal_price'].select_one(soup)
+            if price_element:
+                print("Info: Precio NORMAL encontrado.")
 
         if price_element:
             price_text = price_element.get_text().strip()
@@ -71,7 +118,7 @@ def parse(driver):
     # --- 3. Extraer el Status (NUEVO) ---
     try:
         # Caso 1: Hay varias unidades (ej: "+10 disponibles")
-        stock_span = soup.find('button', class_='andes-button andes-spinner__icon-base ui-pdp-action--primary andes-button--loud')
+        stock_span = _SEL['buy_button'].select_one(soup)
 
         if stock_span and "Comprar ahora" in stock_span.get_text():
             product_status = "disponible"
@@ -86,6 +133,31 @@ def parse(driver):
         # En caso de error, es más seguro asumir "no disponible"
         product_status = "no disponible"
 
+    # --- 4. Respaldo JSON-LD (HTML estático sin JavaScript) ---
+    if use_json_ld and (not product_title or not product_price or product_status != "disponible"):
+        try:
+            ld_product = _find_json_ld_product(soup)
+            if ld_product:
+                offers = ld_product.get('offers') or {}
+                if isinstance(offers, list):
+                    offers = offers[0] if offers else {}
+
+                if not product_title and ld_product.get('name'):
+                    product_title = ld_product['name'].strip()
+                    print(f"TÍTULO (JSON-LD) ENCONTRADO: {product_title}")
+
+                if not product_price and offers.get('price') is not None:
+                    product_price = int(float(offers['price']))
+                    print(f"PRECIO (JSON-LD) ENCONTRADO: S/ {product_price}")
+
+                if 'InStock' in str(offers.get('availability', '')):
+                    product_status = "disponible"
+                    print("STATUS (JSON-LD) ENCONTRADO: Disponible")
+            else:
+                print("Info: No se encontró bloque JSON-LD de producto.")
+        except Exception as e:
+            print(f"Error al procesar el JSON-LD: {e}")
+
     print("--- [Scraper: MercadoLibre V3] Análisis Terminado ---")
 
     # Devolver los 3 valores
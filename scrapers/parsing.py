@@ -0,0 +1,107 @@
+"""
+Capa de parseo compartida por los scrapers.
+
+En lugar de construir el árbol completo de una página de producto (cientos de KB de
+HTML para leer tres elementos), cada scraper declara qué elementos le interesan y solo
+esos subárboles se materializan (SoupStrainer). Si lxml está instalado se usa su parser
+en C; si no, el 'html.parser' de la librería estándar. Los selectores se compilan una
+sola vez al importar el módulo del scraper.
+"""
+import re
+import soupsieve as sv
+from bs4 import BeautifulSoup, SoupStrainer
+
+import metrics
+
+try:
+    import lxml  # noqa: F401  (dependencia opcional)
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+# Selector simple: tag, .clase y/o [atributo] / [atributo=valor]
+_SIMPLE_SELECTOR = re.compile(r"^(?P<tag>[a-zA-Z0-9]+)?(?P<rest>(?:\.[\w-]+|\[[^\]]+\])*)$")
+_PART = re.compile(r"\.(?P<cls>[\w-]+)|\[(?P<attr>[\w-]+)(?:=['\"]?(?P<val>[^'\"\]]*)['\"]?)?\]")
+
+
+def _compile_rule(selector):
+    """Convierte un selector simple en (tag, clases requeridas, {atributo: valor o None})."""
+    m = _SIMPLE_SELECTOR.match(selector.strip())
+    if not m:
+        raise ValueError(f"Selector no soportado por el filtro de parseo: '{selector}'")
+    classes, attrs = set(), {}
+    for part in _PART.finditer(m.group("rest") or ""):
+        if part.group("cls"):
+            classes.add(part.group("cls"))
+        else:
+            attrs[part.group("attr")] = part.group("val")
+    return (m.group("tag") or "").lower() or None, frozenset(classes), attrs
+
+
+class TargetedStrainer(SoupStrainer):
+    """
+    Filtro de parseo: solo se crean los elementos (y sus descendientes) que cumplan
+    alguno de los selectores simples dados; el resto del documento se descarta.
+    Implementa los ganchos de bs4 >= 4.13 (allow_tag_creation) y de versiones
+    anteriores (search_tag).
+    """
+
+    def __init__(self, *selectors):
+        super().__init__()
+        self.selectors = selectors
+        self.rules = [_compile_rule(s) for s in selectors]
+
+    def wants(self, name, attrs):
+        attrs = attrs or {}
+        for tag, classes, required in self.rules:
+            if tag and tag != name:
+                continue
+            if classes:
+                value = attrs.get("class") or ""
+                tokens = set(value.split() if isinstance(value, str) else value)
+                if not classes <= tokens:
+                    continue
+            if any(attr not in attrs or (val is not None and attrs[attr] != val) for attr, val in required.items()):
+                continue
+            return True
+        return False
+
+    # --- bs4 >= 4.13 ---
+    @property
+    def includes_everything(self):
+        return False
+
+    @property
+    def excludes_everything(self):
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.wants(name, attrs)
+
+    def allow_string_creation(self, string):
+        return False
+
+    # --- bs4 < 4.13 ---
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        if hasattr(markup_name, "name"):  # Se llamó con un Tag
+            markup_name, markup_attrs = markup_name.name, markup_name.attrs
+        return self.wants(markup_name, dict(markup_attrs))
+
+    def __repr__(self):
+        return f"TargetedStrainer({', '.join(self.selectors)})"
+
+
+def compile_selectors(**selectors):
+    """Compila selectores CSS (soupsieve) una sola vez. Devuelve {nombre: selector compilado}."""
+    return {name: sv.compile(css) for name, css in selectors.items()}
+
+
+def parse_targeted(html, strainer):
+    """Parsea solo los subárboles que acepta 'strainer' con el parser más rápido disponible."""
+    with metrics.timed("parse"):
+        return BeautifulSoup(html, PARSER, parse_only=strainer)
+
+
+def parse_full(html):
+    """Árbol completo con html.parser (el comportamiento anterior; se usa para comparar)."""
+    return BeautifulSoup(html, "html.parser")
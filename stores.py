@@ -0,0 +1,106 @@
+"""
+Tiendas soportadas: detección por dominio e identidad de un producto a partir de su URL.
+
+La misma publicación puede llegar con URLs distintas (parámetros de tracking, fragmentos
+de "compartir", host móvil o de escritorio, otro slug). canonicalize() las reduce a una
+URL canónica y a un item_id estable de la tienda; los productos con el mismo
+(tienda, item_id) son alias del mismo ítem y se scrapean una sola vez (ver
+scraper_engine._apply_with_aliases).
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Publicación de MercadoLibre (/MPE-123...-slug): sitio (MPE, MLA, MLM...) + número, con o sin guion
+ML_ITEM_PATTERN = re.compile(r"/(M[A-Z]{2})-?(\d{6,})", re.IGNORECASE)
+# Página de catálogo (/p/MPE123...): muestra la mejor oferta; pdp_filters=item_id:... fija una publicación
+ML_CATALOG_PATTERN = re.compile(r"/p/(M[A-Z]{2}\d+)", re.IGNORECASE)
+ML_PINNED_ITEM_PATTERN = re.compile(r"item_id:(M[A-Z]{2})-?(\d+)", re.IGNORECASE)
+
+MOBILE_HOST_PREFIXES = ("m.", "mobile.")
+# Parámetros de tracking que se descartan en las tiendas sin una regla propia
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|msclkid|ref|sid|tracking_id|origin|source)$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class ProductIdentity:
+    """Tienda, URL canónica e ID estable del ítem (None si la tienda no tiene uno reconocible)."""
+    tienda: Optional[str]
+    url: str
+    item_id: Optional[str]
+
+    @property
+    def key(self):
+        """Clave para detectar duplicados: el ítem si se conoce, si no la URL canónica."""
+        return (self.tienda, self.item_id) if self.item_id else (self.tienda, self.url)
+
+
+def detect_store(url):
+    """Tienda de una URL según su dominio (None si no es una tienda soportada)."""
+    domain = urlparse(url).netloc.lower()
+    if 'mercadolibre' in domain: return 'MercadoLibre'
+    if 'lacuracao' in domain: return 'LaCuracao'
+    if 'falabella' in domain: return 'Falabella'
+    if 'ripley' in domain: return 'Ripley'
+    return None
+
+
+def _desktop_host(netloc, keep_subdomains=()):
+    """Host en minúsculas, sin puerto ni prefijo móvil; 'www.' salvo subdominios propios."""
+    host = netloc.lower().split(":")[0]
+    for prefix in MOBILE_HOST_PREFIXES + ("www.",):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if any(host.startswith(sub + ".") for sub in keep_subdomains):
+        return host
+    return "www." + host
+
+
+def _canonical_mercadolibre(parts):
+    catalog = ML_CATALOG_PATTERN.search(parts.path)
+    if catalog:
+        # El slug antes de /p/ es decorativo; solo se conserva la publicación fijada, si la hay
+        pinned = ML_PINNED_ITEM_PATTERN.search(parts.query)
+        path = f"/p/{catalog.group(1).upper()}"
+        if pinned:
+            item_id = f"{pinned.group(1).upper()}{pinned.group(2)}"
+            url = urlunparse(("https", _desktop_host(parts.netloc), path, "", f"pdp_filters=item_id:{item_id}", ""))
+        else:
+            item_id = "p/" + catalog.group(1).upper()
+            url = urlunparse(("https", _desktop_host(parts.netloc), path, "", "", ""))
+        return url, item_id
+
+    item = ML_ITEM_PATTERN.match(parts.path)
+    host = _desktop_host(parts.netloc, keep_subdomains=("articulo",))
+    url = urlunparse(("https", host, parts.path, "", "", ""))
+    return url, (f"{item.group(1).upper()}{item.group(2)}" if item else None)
+
+
+def _canonical_lacuracao(parts):
+    # La URL no trae un SKU aparte: la clave de la página (<slug>.html) es el ID estable
+    path = parts.path.lower().rstrip("/")
+    url = urlunparse(("https", _desktop_host(parts.netloc), path, "", "", ""))
+    key = path.rsplit("/", 1)[-1]
+    return url, (key[:-len(".html")] if key.endswith(".html") else None)
+
+
+def _canonical_generic(parts):
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)])
+    return urlunparse(("https", _desktop_host(parts.netloc), parts.path, "", query, "")), None
+
+
+CANONICALIZERS = {
+    "MercadoLibre": _canonical_mercadolibre,
+    "LaCuracao": _canonical_lacuracao,
+}
+
+
+def canonicalize(url):
+    """ProductIdentity de una URL. Para tiendas no soportadas: tienda None y la URL tal cual."""
+    url = url.strip()
+    tienda = detect_store(url)
+    if tienda is None:
+        return ProductIdentity(None, url, None)
+    canonical, item_id = CANONICALIZERS.get(tienda, _canonical_generic)(urlparse(url))
+    return ProductIdentity(tienda, canonical, item_id)
@@ -0,0 +1,54 @@
+"""
+Fechas del historial como enteros: milisegundos desde epoch (UTC).
+
+Desde la migración 1 (ver database.MIGRATIONS) todas las fechas guardadas en la BD
+(HistorialPrecios, HistorialDiario, ProductStats, Productos) son epoch ms: se ordenan y
+filtran por rango como números, sin parsear texto. Los días (columnas 'dia', buckets
+diarios, retención) siguen siendo 'YYYY-MM-DD' en hora local.
+"""
+import time
+import datetime
+
+# Zona local del proceso (para mostrar fechas y agrupar por día)
+LOCAL_TZ = datetime.datetime.now().astimezone().tzinfo
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def to_ms(value):
+    """datetime (naive = hora local) o epoch en segundos -> epoch ms."""
+    if isinstance(value, datetime.datetime):
+        value = value.timestamp()
+    return int(value * 1000)
+
+
+def from_ms(ms):
+    """Epoch ms -> datetime local (naive)."""
+    return datetime.datetime.fromtimestamp(ms / 1000)
+
+
+def day(ms):
+    """Día local (YYYY-MM-DD) de un epoch ms."""
+    return datetime.date.fromtimestamp(ms / 1000).isoformat()
+
+
+def day_start_ms(dia):
+    """Epoch ms de la medianoche local de un día (YYYY-MM-DD)."""
+    return to_ms(datetime.datetime.combine(datetime.date.fromisoformat(dia), datetime.time()))
+
+
+def sql_day(column):
+    """Expresión SQL del día local (YYYY-MM-DD) de una columna epoch ms."""
+    return f"date({column} / 1000, 'unixepoch', 'localtime')"
+
+
+def sql_from_iso(column):
+    """
+    Expresión SQL que convierte una fecha ISO en texto (hora local, como la guardaba
+    datetime.now().isoformat()) a epoch ms. Los valores que ya son números no se tocan.
+    """
+    return (f"CASE WHEN typeof({column}) = 'text' "
+            f"THEN CAST(round((julianday({column}, 'utc') - 2440587.5) * 86400000) AS INTEGER) "
+            f"ELSE {column} END")
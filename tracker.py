@@ -1,13 +1,73 @@
+import os
 import time
 import asyncio
-import scraper_engine
+import socket
+import scheduler
 import database
+import http_fetcher
+import job_queue
 import log_setup
+import metrics
+import retention
 
 # --- Configurar Logger ---
 log = log_setup.setup_logging('tracker')
 
-HOURS_BETWEEN_RUNS = 1
+MAX_IDLE_SLEEP = job_queue.POLL_INTERVAL  # Volver a mirar la cola (y los pedidos del bot) a menudo
+
+
+def _enqueue_due(product_ids):
+    with database.db_pool.get_conn() as conn:
+        return job_queue.enqueue(conn, product_ids, "scheduler", job_queue.PRIORITY_SCHEDULED)
+
+
+async def main():
+    log.info("Iniciando servicio de Tracker en segundo plano (scheduler adaptativo + cola de trabajos)...")
+
+    metrics.serve()
+    cola = scheduler.ProductScheduler()
+    worker = job_queue.JobWorker(f"tracker-{socket.gethostname()}-{os.getpid()}")
+    proxima_retencion = 0.0
+
+    try:
+        while True:
+            try:
+                if cola.resync_due():
+                    cola.resync()
+
+                # Retención del historial (una vez al día, también al arrancar)
+                if time.time() >= proxima_retencion:
+                    proxima_retencion = time.time() + retention.RUN_INTERVAL
+                    await asyncio.to_thread(retention.run)
+
+                # Los productos vencidos se convierten en trabajos; la cola también recibe
+                # los pedidos del bot (más prioritarios) y los reparte entre los workers.
+                vencidos = cola.pop_due()
+                if vencidos:
+                    await asyncio.to_thread(_enqueue_due, [p[0] for p in vencidos])
+                    log.info(f"--- {len(vencidos)} productos vencidos encolados ---")
+
+                procesados = await worker.run_once()
+                if procesados:
+                    # Reencolar con la próxima revisión que calculó el motor
+                    cola.reschedule(procesados)
+                    log.info(f"--- Lote finalizado: {len(procesados)} productos ---")
+                    continue
+
+                # Dormir hasta el próximo vencimiento, sin dejar de atender la cola
+                espera = cola.seconds_until_next()
+                sleep_seconds = MAX_IDLE_SLEEP if espera is None else min(espera, MAX_IDLE_SLEEP)
+                await asyncio.sleep(max(1, sleep_seconds))
+
+            except Exception as e:
+                log.error(f"Error en el bucle principal: {e}", exc_info=True)
+                log.warning("Esperando 5 minutos antes de reintentar...")
+                await asyncio.sleep(300)
+    finally:
+        with database.db_pool.get_conn() as conn:
+            job_queue.unregister(conn, worker.name)
+        http_fetcher.close_session()
+
 
 if __name__ == "__main__":
     try:
@@ -16,23 +76,7 @@ if __name__ == "__main__":
         log.critical(f"No se pudo inicializar la base de datos: {e}", exc_info=True)
         exit(1)
 
-    log.info("Iniciando servicio de Tracker en segundo plano...")
-
-    while True:
-        try:
-            log.info("--- Iniciando ciclo de rastreo ---")
-            
-            # Ejecutar el tracking asíncrono
-            asyncio.run(scraper_engine.track_all_products())
-            
-            log.info("--- Ciclo finalizado ---")
-
-            # Dormir
-            sleep_seconds = HOURS_BETWEEN_RUNS * 60 * 60
-            log.info(f"Durmiendo por {sleep_seconds} segundos hasta el próximo ciclo...")
-            time.sleep(sleep_seconds)
-
-        except Exception as e:
-            log.error(f"Error en el bucle principal: {e}", exc_info=True)
-            log.warning("Esperando 5 minutos antes de reintentar...")
-            time.sleep(300)
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        log.info("Tracker detenido.")